@@ -1,95 +1,230 @@
 #!/usr/bin/env python3
 import os
-import cv2
-import numpy as np
-from pdf2image import convert_from_path
-from PIL import Image
-import tkinter as tk
-from tkinter import filedialog, messagebox
+import queue
 import sys
+import threading
+import time
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+import multiprocessing
+
+from bovigenese.instrumentacao import PERFIL_INATIVO, Perfil
+from calibration import load_or_calibrate
+# O processamento fica em watermark_remover (sem Tk), usado também pela linha de comando
+from watermark_remover import (LOWER_GRAY, UPPER_GRAY, PDFProcessingError, ProcessingCancelled,
+                               clean_page, process_pdf, remove_gray_watermark,
+                               remove_gray_watermark_rgb)
+
+# Os nomes de watermark_remover continuam exportados para scripts que os importavam de app.py,
+# onde eram definidos antes da separação
+__all__ = ["LOWER_GRAY", "UPPER_GRAY", "PDFProcessingError", "ProcessingCancelled", "clean_page",
+           "process_pdf", "remove_gray_watermark", "remove_gray_watermark_rgb", "output_path_for",
+           "ProcessingWorker", "PDFWatermarkRemoverApp"]
+
+POLL_INTERVAL_MS = 100  # Intervalo de leitura das mensagens do worker
+OUTPUT_NAME = "PDF_sem_marca.pdf"  # Nome da saída ao lado do original
 
-def remove_gray_watermark(image):
+def output_path_for(pdf_path, queued=()):
     """
-    Remove marcas d'água cinzentas substituindo por branco puro.
-    Converte a imagem para escala de cinza, cria uma máscara para tons de cinza
-    e substitui as áreas detectadas por branco.
+    Caminho do PDF gerado, ao lado do original: PDF_sem_marca.pdf, como sempre foi. Se outro PDF
+    da fila estiver na mesma pasta, usa o nome do original ({nome}_sem_marca.pdf) para não sobrescrever.
     """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    lower_gray = 180  # Valor mínimo para detecção de cinza (ajuste se necessário)
-    upper_gray = 250  # Valor máximo para detecção de cinza (ajuste se necessário)
-    mask = cv2.inRange(gray, lower_gray, upper_gray)
-    image[mask > 0] = [255, 255, 255]
-    return image
-
-def process_pdf(pdf_path, output_pdf):
+    folder = os.path.dirname(pdf_path)
+    if not any(other != pdf_path and os.path.dirname(other) == folder for other in queued):
+        return os.path.join(folder, OUTPUT_NAME)
+    base = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(folder, f"{base}_sem_marca.pdf")
+
+class ProcessingWorker(threading.Thread):
     """
-    Converte um PDF em imagens com 300 DPI, processa cada página para remover marcas d'água e
-    gera um novo PDF com as páginas processadas.
+    Processa a fila de PDFs em segundo plano, um arquivo por vez.
+    Toda comunicação com a interface passa pela fila `events`, pois o Tk só pode
+    ser acessado pela thread principal.
     """
-    # Define o caminho do poppler se o sistema for Windows e se a pasta estiver incluída localmente
-    poppler_path = None
-    if os.name == 'nt':
-        # Em um executável gerado pelo PyInstaller, use sys._MEIPASS para localizar arquivos adicionados
-        base_path = getattr(sys, '_MEIPASS', os.path.abspath("."))
-        poppler_path = os.path.join(base_path, "poppler", "bin")
-    
-    try:
-        # Converter PDF para imagens (300 DPI para alta qualidade)
-        if poppler_path:
-            images = convert_from_path(pdf_path, dpi=300, poppler_path=poppler_path)
-        else:
-            images = convert_from_path(pdf_path, dpi=300)
-    except Exception as e:
-        messagebox.showerror("Erro", f"Erro ao converter PDF: {e}")
-        return
 
-    processed_images = []
-    for i, image in enumerate(images):
-        img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        cleaned_img = remove_gray_watermark(img_cv)
-        processed_images.append(Image.fromarray(cv2.cvtColor(cleaned_img, cv2.COLOR_BGR2RGB)))
+    def __init__(self, pdf_paths, events, cancel_event, calibrate=False, locate=False, profile=False):
+        """
+        :param calibrate: Detecta a faixa de cinza de cada PDF em vez de usar LOWER_GRAY/UPPER_GRAY
+        :param locate: Com calibrate, limpa só a região da marca em vez da página inteira
+        """
+        super().__init__(daemon=True)
+        self.pdf_paths = pdf_paths
+        self.calibrate = calibrate
+        self.locate = locate
+        self.profile = profile
+        self.events = events
+        self.cancel_event = cancel_event
 
-    try:
-        processed_images[0].save(output_pdf, save_all=True, append_images=processed_images[1:])
-    except Exception as e:
-        messagebox.showerror("Erro", f"Erro ao salvar o PDF: {e}")
-        return
+    def run(self):
+        for pdf_path in self.pdf_paths:
+            if self.cancel_event.is_set():
+                self.events.put(("cancelled", pdf_path))
+                continue
+            output_pdf = output_path_for(pdf_path, self.pdf_paths)
+            started = time.perf_counter()
+            self.events.put(("started", pdf_path))
 
-    messagebox.showinfo("Concluído", f"Processo concluído!\nO PDF sem marca d'água foi salvo como:\n{output_pdf}")
+            def progress(done, total):
+                self.events.put(("progress", pdf_path, done, total, time.perf_counter() - started))
+
+            # Com --profile, o relatório de etapas de cada PDF é gravado ao lado da saída
+            profile = Perfil() if self.profile else PERFIL_INATIVO
+            try:
+                calibration = None
+                if self.calibrate:
+                    self.events.put(("calibrating", pdf_path))
+                    with profile.etapa("calibrar"):
+                        calibration = load_or_calibrate(pdf_path, f"{output_pdf}.calibration.json",
+                                                        locate=self.locate)
+                process_pdf(pdf_path, output_pdf, workers=None,
+                            progress=progress, cancel_event=self.cancel_event,
+                            calibration=calibration, profile=profile)
+                if profile.ativo:
+                    profile.salvar(f"{output_pdf}.profile.json")
+            except ProcessingCancelled:
+                self.events.put(("cancelled", pdf_path))
+            except Exception as e:  # PDFProcessingError ou falha na calibração
+                self.events.put(("error", pdf_path, str(e)))
+            else:
+                self.events.put(("done", pdf_path, output_pdf))
+        self.events.put(("finished",))
 
 class PDFWatermarkRemoverApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, profile=False):
         super().__init__()
+        self.profile = profile
         self.title("Remover Marca d'Água de PDF")
-        self.geometry("500x150")
-        self.pdf_path = None
+        self.geometry("560x430")
+        self.pdf_paths = []
+        self.worker = None
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.results = []
 
-        self.btn_select = tk.Button(self, text="Selecionar PDF", command=self.select_pdf, width=20)
+        self.btn_select = tk.Button(self, text="Selecionar PDFs", command=self.select_pdf, width=20)
         self.btn_select.pack(pady=10)
 
         self.label_file = tk.Label(self, text="Nenhum arquivo selecionado")
         self.label_file.pack(pady=5)
 
-        self.btn_process = tk.Button(self, text="Processar PDF", command=self.process_pdf_gui, width=20, state=tk.DISABLED)
-        self.btn_process.pack(pady=10)
+        self.list_files = tk.Listbox(self, height=6, width=80)
+        self.list_files.pack(padx=10, pady=5)
+
+        # Desmarcadas, a limpeza é a de sempre: faixa fixa de cinza na página inteira
+        self.calibrate = tk.BooleanVar(value=False)
+        self.locate = tk.BooleanVar(value=False)
+        self.check_calibrate = tk.Checkbutton(self, text="Detectar a faixa de cinza automaticamente",
+                                              variable=self.calibrate, command=self.update_locate)
+        self.check_calibrate.pack()
+        self.check_locate = tk.Checkbutton(self, text="Limpar só a região da marca (detectada nas páginas)",
+                                           variable=self.locate, state=tk.DISABLED)
+        self.check_locate.pack()
+
+        self.progress_bar = ttk.Progressbar(self, orient=tk.HORIZONTAL, length=500, mode="determinate")
+        self.progress_bar.pack(pady=5)
+
+        self.label_status = tk.Label(self, text="")
+        self.label_status.pack(pady=5)
+
+        buttons = tk.Frame(self)
+        buttons.pack(pady=10)
+        self.btn_process = tk.Button(buttons, text="Processar PDFs", command=self.process_pdf_gui, width=20, state=tk.DISABLED)
+        self.btn_process.pack(side=tk.LEFT, padx=5)
+        self.btn_cancel = tk.Button(buttons, text="Cancelar", command=self.cancel, width=20, state=tk.DISABLED)
+        self.btn_cancel.pack(side=tk.LEFT, padx=5)
+
+    def update_locate(self):
+        """A região da marca é localizada pela calibração, então só vale com ela ativa."""
+        if self.calibrate.get():
+            self.check_locate.config(state=tk.NORMAL)
+        else:
+            self.locate.set(False)
+            self.check_locate.config(state=tk.DISABLED)
 
     def select_pdf(self):
         filetypes = [("PDF Files", "*.pdf")]
-        selected_file = filedialog.askopenfilename(title="Selecione um arquivo PDF", filetypes=filetypes)
-        if selected_file:
-            self.pdf_path = selected_file
-            self.label_file.config(text=f"Selecionado: {os.path.basename(self.pdf_path)}")
-            self.btn_process.config(state=tk.NORMAL)
+        selected_files = filedialog.askopenfilenames(title="Selecione arquivos PDF", filetypes=filetypes)
+        for selected_file in selected_files:
+            if selected_file not in self.pdf_paths:
+                self.pdf_paths.append(selected_file)
+                self.list_files.insert(tk.END, os.path.basename(selected_file))
+        if self.pdf_paths:
+            self.label_file.config(text=f"{len(self.pdf_paths)} arquivo(s) na fila")
+            if self.worker is None:
+                self.btn_process.config(state=tk.NORMAL)
 
     def process_pdf_gui(self):
-        if not self.pdf_path:
+        if not self.pdf_paths:
             messagebox.showwarning("Aviso", "Por favor, selecione um arquivo PDF primeiro.")
             return
 
-        output_pdf = os.path.join(os.path.dirname(self.pdf_path), "PDF_sem_marca.pdf")
-        os.makedirs("processed_pages", exist_ok=True)
-        process_pdf(self.pdf_path, output_pdf)
+        self.cancel_event = threading.Event()
+        self.results = []
+        self.worker = ProcessingWorker(list(self.pdf_paths), self.events, self.cancel_event,
+                                       calibrate=self.calibrate.get(), locate=self.locate.get(),
+                                       profile=self.profile)
+        self.btn_process.config(state=tk.DISABLED)
+        self.btn_select.config(state=tk.DISABLED)
+        self.btn_cancel.config(state=tk.NORMAL)
+        self.worker.start()
+        self.after(POLL_INTERVAL_MS, self.poll_events)
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.btn_cancel.config(state=tk.DISABLED)
+        self.label_status.config(text="Cancelando...")
+
+    def poll_events(self):
+        """Aplica na interface as mensagens enviadas pelo worker."""
+        try:
+            while True:
+                self.handle_event(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        if self.worker is not None:
+            self.after(POLL_INTERVAL_MS, self.poll_events)
+
+    def handle_event(self, event):
+        kind = event[0]
+        if kind == "calibrating":
+            self.label_status.config(text=f"Calibrando {os.path.basename(event[1])}...")
+        elif kind == "started":
+            self.progress_bar.config(value=0, maximum=1)
+            self.label_status.config(text=f"Processando {os.path.basename(event[1])}...")
+        elif kind == "progress":
+            _, pdf_path, done, total, elapsed = event
+            pages_per_second = done / elapsed if elapsed > 0 else 0.0
+            eta = (total - done) / pages_per_second if pages_per_second > 0 else 0.0
+            self.progress_bar.config(value=done, maximum=total)
+            self.label_status.config(
+                text=f"{os.path.basename(pdf_path)}: página {done}/{total} — "
+                     f"{pages_per_second:.2f} páginas/s — restante ~{eta:.0f}s")
+        elif kind == "done":
+            self.results.append(f"OK: {event[2]}")
+            self.dequeue(event[1])
+        elif kind == "error":
+            self.results.append(f"Erro: {event[2]}")
+            self.dequeue(event[1])
+        elif kind == "cancelled":
+            self.results.append(f"Cancelado: {os.path.basename(event[1])}")
+        elif kind == "finished":
+            self.worker = None
+            self.btn_select.config(state=tk.NORMAL)
+            self.btn_cancel.config(state=tk.DISABLED)
+            self.btn_process.config(state=tk.NORMAL if self.pdf_paths else tk.DISABLED)
+            self.label_file.config(text=f"{len(self.pdf_paths)} arquivo(s) na fila")
+            self.label_status.config(text="")
+            messagebox.showinfo("Concluído", "Processo concluído!\n" + "\n".join(self.results))
+
+    def dequeue(self, pdf_path):
+        """Remove da fila exibida um arquivo que terminou de ser processado."""
+        if pdf_path in self.pdf_paths:
+            index = self.pdf_paths.index(pdf_path)
+            self.pdf_paths.pop(index)
+            self.list_files.delete(index)
 
 if __name__ == "__main__":
-    app = PDFWatermarkRemoverApp()
+    # Necessário para o pool de processos no executável do PyInstaller
+    multiprocessing.freeze_support()
+    app = PDFWatermarkRemoverApp(profile="--profile" in sys.argv[1:])
     app.mainloop()
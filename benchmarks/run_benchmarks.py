@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de remoção (PDF), inserção de marca d'água (imagem, PDF, DOCX, Excel) e vídeo.
+
+As cargas de trabalho são geradas localmente, sem rede: PDFs de N páginas com marca d'água
+cinza, DOCX com muitas seções, XLSX com muitas planilhas e MP4 curtos. O PDF_BASE.pdf do
+repositório também é medido. As cargas são geradas antes de cada caso, fora da medição, e cada
+caso roda em um subprocesso novo para que o tempo e o pico de memória (RSS) sejam só os dele.
+
+    python benchmarks/run_benchmarks.py -o resultados.json
+    python benchmarks/run_benchmarks.py --cases remove_kernel process_pdf_seq --pages 20
+    python benchmarks/run_benchmarks.py --compare antes.json depois.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+MARCA_PATH = os.path.join(RAIZ, "bovigenese", "marca.png")
+PDF_BASE = os.path.join(RAIZ, "PDF_BASE.pdf")
+
+
+# ---------------------------------------------------------------------------
+# Geração das cargas sintéticas
+# ---------------------------------------------------------------------------
+
+def gerar_pagina(numero, dpi=150):
+    """Página A4 com linhas de texto preto e uma marca d'água cinza em diagonal"""
+    from PIL import Image, ImageDraw
+
+    largura, altura = int(8.27 * dpi), int(11.69 * dpi)
+    pagina = Image.new("RGB", (largura, altura), "white")
+    desenho = ImageDraw.Draw(pagina)
+    for linha in range(60, altura - 60, max(12, dpi // 8)):
+        desenho.text((60, linha), f"Página {numero} - linha {linha} do documento de teste", fill=(0, 0, 0))
+
+    marca = Image.new("L", (largura, altura), 0)
+    ImageDraw.Draw(marca).text((largura // 4, altura // 2), "CONFIDENCIAL " * 3, fill=255)
+    marca = marca.rotate(35).resize((largura, altura))
+    pagina.paste((200, 200, 200), (0, 0), marca)
+    return pagina
+
+
+def gerar_pdf(caminho, paginas, dpi=150):
+    """PDF gerado direto pelo Pillow, sem passar pelo código medido"""
+    imagens = [gerar_pagina(n, dpi) for n in range(1, paginas + 1)]
+    imagens[0].save(caminho, format="PDF", save_all=True, append_images=imagens[1:], resolution=dpi)
+
+
+def gerar_docx(caminho, secoes):
+    from docx import Document
+    from docx.enum.section import WD_SECTION
+
+    documento = Document()
+    for numero in range(secoes):
+        if numero:
+            documento.add_section(WD_SECTION.NEW_PAGE)
+        documento.add_heading(f"Seção {numero + 1}", level=1)
+        for paragrafo in range(5):
+            documento.add_paragraph(f"Parágrafo {paragrafo} da seção {numero + 1}. " * 8)
+    documento.save(caminho)
+
+
+def gerar_xlsx(caminho, planilhas, linhas):
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    for numero in range(planilhas):
+        sheet = workbook.create_sheet(f"Planilha{numero + 1}")
+        for linha in range(linhas):
+            sheet.append([linha, f"item {linha}", linha * 1.5, "texto de exemplo"])
+    workbook.save(caminho)
+
+
+def gerar_mp4(caminho, quadros, largura=1280, altura=720, fps=30):
+    import cv2
+    import numpy as np
+
+    writer = cv2.VideoWriter(caminho, cv2.VideoWriter_fourcc(*"mp4v"), fps, (largura, altura))
+    base = np.linspace(0, 255, largura, dtype=np.uint8)[None, :, None].repeat(altura, 0).repeat(3, 2)
+    for numero in range(quadros):
+        writer.write(np.roll(base, numero * 8, axis=1))
+    writer.release()
+
+
+# ---------------------------------------------------------------------------
+# Casos de benchmark. A carga de trabalho é gerada antes, no processo principal,
+# por preparar(pasta, args); o caso roda em um subprocesso novo, lê a carga da pasta
+# e devolve (unidades processadas, nome da unidade, arquivo de saída ou None, segundos),
+# medindo só o processamento
+# ---------------------------------------------------------------------------
+
+def preparar_remove_kernel(pasta, args):
+    import numpy as np
+    np.save(os.path.join(pasta, "pagina.npy"), np.asarray(gerar_pagina(1, dpi=300)))
+
+
+def caso_remove_kernel(pasta, args):
+    import numpy as np
+    from watermark_remover import remove_gray_watermark_rgb
+
+    pagina = np.load(os.path.join(pasta, "pagina.npy"))
+    inicio = time.perf_counter()
+    for _ in range(args.repeticoes):
+        remove_gray_watermark_rgb(pagina.copy())
+    return args.repeticoes, "paginas", None, time.perf_counter() - inicio
+
+
+def preparar_pdf(pasta, args):
+    gerar_pdf(os.path.join(pasta, "sintetico.pdf"), args.pages)
+
+
+def _process_pdf(pasta, args, workers, entrada=None):
+    from watermark_remover import process_pdf
+
+    entrada = entrada or os.path.join(pasta, "sintetico.pdf")
+    saida = os.path.join(pasta, "saida.pdf")
+    inicio = time.perf_counter()
+    paginas = len(process_pdf(entrada, saida, workers=workers))
+    return paginas, "paginas", saida, time.perf_counter() - inicio
+
+
+def caso_process_pdf_seq(pasta, args):
+    return _process_pdf(pasta, args, workers=1)
+
+
+def caso_process_pdf_paralelo(pasta, args):
+    return _process_pdf(pasta, args, workers=None)
+
+
+def caso_process_pdf_base(pasta, args):
+    return _process_pdf(pasta, args, workers=1, entrada=PDF_BASE)
+
+
+def _processador():
+    from bovigenese.adicionar_marca import AdicionarMarcaDagua
+    return AdicionarMarcaDagua(MARCA_PATH, opacidade=0.3)
+
+
+def preparar_imagem(pasta, args):
+    gerar_pagina(1, dpi=300).save(os.path.join(pasta, "imagem.png"))
+
+
+def caso_marca_imagem(pasta, args):
+    entrada = os.path.join(pasta, "imagem.png")
+    saida = os.path.join(pasta, "imagem_marca.jpg")
+    processador = _processador()
+    inicio = time.perf_counter()
+    for _ in range(args.repeticoes):
+        processador.adicionar_marca_imagem(entrada, saida)
+    return args.repeticoes, "imagens", saida, time.perf_counter() - inicio
+
+
+def caso_marca_pdf(pasta, args):
+    entrada = os.path.join(pasta, "sintetico.pdf")
+    saida = os.path.join(pasta, "sintetico_marca.pdf")
+    processador = _processador()
+    inicio = time.perf_counter()
+    processador.adicionar_marca_pdf(entrada, saida)
+    return args.pages, "paginas", saida, time.perf_counter() - inicio
+
+
+def preparar_docx(pasta, args):
+    gerar_docx(os.path.join(pasta, "sintetico.docx"), args.secoes)
+
+
+def caso_marca_docx(pasta, args):
+    entrada = os.path.join(pasta, "sintetico.docx")
+    saida = os.path.join(pasta, "sintetico_marca.docx")
+    processador = _processador()
+    inicio = time.perf_counter()
+    processador.adicionar_marca_doc(entrada, saida)
+    return args.secoes, "secoes", saida, time.perf_counter() - inicio
+
+
+def preparar_xlsx(pasta, args):
+    gerar_xlsx(os.path.join(pasta, "sintetico.xlsx"), args.planilhas, args.linhas)
+
+
+def caso_marca_xlsx(pasta, args):
+    entrada = os.path.join(pasta, "sintetico.xlsx")
+    saida = os.path.join(pasta, "sintetico_marca.xlsx")
+    processador = _processador()
+    inicio = time.perf_counter()
+    processador.adicionar_marca_excel(entrada, saida)
+    return args.planilhas, "planilhas", saida, time.perf_counter() - inicio
+
+
+def preparar_mp4(pasta, args):
+    gerar_mp4(os.path.join(pasta, "sintetico.mp4"), args.quadros)
+
+
+def caso_marca_video(pasta, args):
+    from bovigenese.adicionar_marca_video import AdicionarMarcaVideo
+
+    entrada = os.path.join(pasta, "sintetico.mp4")
+    saida = os.path.join(pasta, "sintetico_marca.mp4")
+    processador = AdicionarMarcaVideo(MARCA_PATH, opacidade=0.3)
+    inicio = time.perf_counter()
+    processador.processar_video(entrada, saida)
+    return args.quadros, "quadros", saida, time.perf_counter() - inicio
+
+
+def sem_preparo(pasta, args):
+    pass
+
+
+# Nome do caso: (geração da carga de trabalho, caso medido)
+CASOS = {
+    "remove_kernel": (preparar_remove_kernel, caso_remove_kernel),
+    "process_pdf_seq": (preparar_pdf, caso_process_pdf_seq),
+    "process_pdf_paralelo": (preparar_pdf, caso_process_pdf_paralelo),
+    "process_pdf_base": (sem_preparo, caso_process_pdf_base),
+    "marca_imagem": (preparar_imagem, caso_marca_imagem),
+    "marca_pdf": (preparar_pdf, caso_marca_pdf),
+    "marca_docx": (preparar_docx, caso_marca_docx),
+    "marca_xlsx": (preparar_xlsx, caso_marca_xlsx),
+    "marca_video": (preparar_mp4, caso_marca_video),
+}
+
+
+# ---------------------------------------------------------------------------
+# Execução e medição
+# ---------------------------------------------------------------------------
+
+def _pico_proprio_kb():
+    """
+    Pico de memória residente deste processo em KB. No Linux vem do VmHWM, que recomeça no exec;
+    o ru_maxrss herda o pico do processo que criou este (o gerador das cargas)
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return pico // 1024 if sys.platform == "darwin" else pico
+
+
+def pico_rss_mb():
+    """Pico de memória residente deste processo e dos filhos (ex.: poppler), em MB"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == "darwin":
+        filhos //= 1024
+    return round(max(_pico_proprio_kb(), filhos) / 1024, 1)
+
+
+def executar_caso(nome, args, pasta):
+    """Roda um caso no processo atual, com a carga já gerada na pasta, e devolve o resultado medido"""
+    unidades, nome_unidade, saida, tempo = CASOS[nome][1](pasta, args)
+    return {
+        "caso": nome,
+        "segundos": round(tempo, 4),
+        "unidades": unidades,
+        "unidade": nome_unidade,
+        "unidades_por_segundo": round(unidades / tempo, 3) if tempo > 0 else None,
+        "pico_rss_mb": pico_rss_mb(),
+        "bytes_saida": os.path.getsize(saida) if saida and os.path.exists(saida) else None,
+    }
+
+
+def executar_em_subprocesso(nome, args):
+    """
+    Gera a carga de trabalho no processo atual e roda o caso em um subprocesso novo, para que o
+    pico de memória medido seja só o do caso (sem a geração nem os casos anteriores)
+    """
+    with tempfile.TemporaryDirectory(prefix=f"bench_{nome}_") as pasta:
+        CASOS[nome][0](pasta, args)
+        comando = [sys.executable, os.path.abspath(__file__), "--caso-interno", nome, "--pasta", pasta,
+                   "--pages", str(args.pages), "--secoes", str(args.secoes),
+                   "--planilhas", str(args.planilhas), "--linhas", str(args.linhas),
+                   "--quadros", str(args.quadros), "--repeticoes", str(args.repeticoes)]
+        processo = subprocess.run(comando, capture_output=True, text=True)
+    if processo.returncode != 0:
+        return {"caso": nome, "erro": processo.stderr.strip().splitlines()[-1:] or ["falha"]}
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+
+def versao_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def comparar(antes_path, depois_path):
+    """Compara dois relatórios e imprime a variação de tempo, memória e tamanho por caso"""
+    with open(antes_path, encoding="utf-8") as f:
+        antes = {r["caso"]: r for r in json.load(f)["resultados"]}
+    with open(depois_path, encoding="utf-8") as f:
+        depois = {r["caso"]: r for r in json.load(f)["resultados"]}
+
+    print(f"{'caso':<24}{'tempo':>12}{'pico RSS':>12}{'saída':>12}")
+    for caso in sorted(set(antes) & set(depois)):
+        linha = f"{caso:<24}"
+        for campo in ("segundos", "pico_rss_mb", "bytes_saida"):
+            a, d = antes[caso].get(campo), depois[caso].get(campo)
+            linha += f"{(d / a):>11.2f}x" if a and d else f"{'-':>12}"
+        print(linha)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de remoção e inserção de marca d'água")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASOS), default=sorted(CASOS),
+                        help="Casos a executar (padrão: todos)")
+    parser.add_argument("-o", "--output", help="Arquivo JSON de resultados (padrão: saída padrão)")
+    parser.add_argument("--pages", type=int, default=10, help="Páginas dos PDFs sintéticos")
+    parser.add_argument("--secoes", type=int, default=50, help="Seções do DOCX sintético")
+    parser.add_argument("--planilhas", type=int, default=20, help="Planilhas do XLSX sintético")
+    parser.add_argument("--linhas", type=int, default=2000, help="Linhas por planilha do XLSX sintético")
+    parser.add_argument("--quadros", type=int, default=150, help="Quadros do MP4 sintético")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Repetições dos casos de imagem única")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"),
+                        help="Compara dois arquivos de resultados em vez de executar")
+    parser.add_argument("--caso-interno", help=argparse.SUPPRESS)
+    parser.add_argument("--pasta", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        comparar(*args.compare)
+        return
+    if args.caso_interno:
+        print(json.dumps(executar_caso(args.caso_interno, args, args.pasta)))
+        return
+
+    resultados = []
+    for nome in args.cases:
+        resultado = executar_em_subprocesso(nome, args)
+        print(f"{nome}: {resultado}", file=sys.stderr)
+        resultados.append(resultado)
+
+    relatorio = {
+        "commit": versao_git(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": {"pages": args.pages, "secoes": args.secoes, "planilhas": args.planilhas,
+                       "linhas": args.linhas, "quadros": args.quadros, "repeticoes": args.repeticoes},
+        "resultados": resultados,
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
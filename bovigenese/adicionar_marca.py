@@ -1,26 +1,73 @@
+import io
 import os
-import cv2
+import sys
+import threading
+import zipfile
+from collections import OrderedDict
+
 import numpy as np
-from PIL import Image
-from pdf2image import convert_from_path
+import openpyxl
 from docx import Document
 from docx.shared import Inches
-from PIL import Image, ImageDraw, ImageFont
-import tempfile
-import openpyxl
 from openpyxl.drawing.image import Image as XLImage
-import sys
+from openpyxl.writer.excel import ExcelWriter
+from PIL import Image
+from pypdf import PdfReader
+
+try:
+    from .cache_disco import hash_arquivo
+    from .cache_saida import CacheSaida, com_cache_saida
+    from .carimbo_pdf import carimbar_pdf
+    from .instrumentacao import PERFIL_INATIVO, Perfil, medir_etapa, separar_perfil
+    from .ooxml_marca import FormatoNaoSuportado, marcar_docx, marcar_xlsx
+    from .paginas_pdf import processar_paginas_pdf
+    from .trabalho_pdf import intervalo_paginas
+except ImportError:
+    from cache_disco import hash_arquivo
+    from cache_saida import CacheSaida, com_cache_saida
+    from carimbo_pdf import carimbar_pdf
+    from instrumentacao import PERFIL_INATIVO, Perfil, medir_etapa, separar_perfil
+    from ooxml_marca import FormatoNaoSuportado, marcar_docx, marcar_xlsx
+    from paginas_pdf import processar_paginas_pdf
+    from trabalho_pdf import intervalo_paginas
+
+# Versão da composição; altere quando o resultado mudar para invalidar o cache de páginas e de saída
+VERSAO_COMPOSICAO = 1
+
+# Quantidade de marcas prontas (por tamanho, opacidade e tipo) mantidas em memória
+TAMANHO_CACHE_MARCAS = 16
+
+# DOCX/XLSX a partir deste tamanho são marcados reescrevendo só as partes necessárias do zip
+LIMITE_OOXML_RAPIDO = 20 * 1024 * 1024
 
 class AdicionarMarcaDagua:
-    def __init__(self, marca_dagua_path, opacidade=0.3):
+    def __init__(self, marca_dagua_path, opacidade=0.3, cache_paginas=None, cache_saida=None, perfil=None):
         """
         Inicializa o objeto para adicionar marca d'água
         :param marca_dagua_path: Caminho para a imagem da marca d'água
         :param opacidade: Valor de 0 a 1 para a opacidade da marca
+        :param cache_paginas: CachePaginas opcional para reaproveitar páginas de PDF já renderizadas
+        :param cache_saida: CacheSaida opcional para reaproveitar arquivos já gerados
+        :param perfil: instrumentacao.Perfil opcional que mede as etapas de cada arquivo
         """
         self.marca_dagua = Image.open(marca_dagua_path).convert('RGBA')
         self.opacidade = opacidade
         self.marca_dagua_path = marca_dagua_path
+        self.cache_paginas = cache_paginas
+        self.cache_saida = cache_saida
+        self.perfil = perfil or PERFIL_INATIVO
+        self._marcas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Permite enviar o processador aos processos do pool de páginas
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
         
     def redimensionar_marca(self, tamanho_desejado):
         """
@@ -32,169 +79,249 @@ class AdicionarMarcaDagua:
                        int(self.marca_dagua.size[1] * ratio))
         return self.marca_dagua.resize(novo_tamanho, Image.LANCZOS)
         
-    def adicionar_marca_imagem(self, imagem_path, output_path):
-        """Adiciona marca d'água em uma imagem"""
-        # Abrir a imagem
-        img = Image.open(imagem_path).convert('RGBA')
-        
+    def obter_marca(self, tamanho_desejado, tipo="marca"):
+        """
+        Marca d'água redimensionada e com a opacidade aplicada, guardada em cache
+        :param tamanho_desejado: (largura, altura) máxima da marca
+        :param tipo: "marca" (imagem com transparência), "png" (a marca já codificada em PNG, usada
+                     em DOCX e Excel) ou "sobreposicao" (pronta para alpha_composite sobre imagens e páginas)
+        """
+        chave = (tamanho_desejado, self.opacidade, tipo)
+        with self._lock:
+            if chave in self._marcas:
+                self._marcas.move_to_end(chave)
+                return self._marcas[chave]
+
+        if tipo == "png":
+            saida = io.BytesIO()
+            self.obter_marca(tamanho_desejado, "marca").save(saida, format="PNG")
+            pronta = saida.getvalue()
+        elif tipo == "sobreposicao":
+            marca = self.obter_marca(tamanho_desejado, "marca")
+            # Mesmo resultado de colar a marca usando ela própria como máscara sobre uma tela transparente
+            pronta = Image.new('RGBA', marca.size, (0,0,0,0))
+            pronta.paste(marca, (0, 0), marca)
+        else:
+            # Ajustar opacidade da marca d'água
+            marca_array = np.array(self.redimensionar_marca(tamanho_desejado))
+            marca_array[:, :, 3] = marca_array[:, :, 3] * self.opacidade
+            pronta = Image.fromarray(marca_array)
+
+        with self._lock:
+            self._marcas[chave] = pronta
+            # Descarta as marcas usadas há mais tempo
+            while len(self._marcas) > TAMANHO_CACHE_MARCAS:
+                self._marcas.popitem(last=False)
+        return pronta
+
+    def _aplicar_marca(self, img_rgba):
+        """Compõe a marca centralizada na imagem RGBA, alterando apenas a região da marca"""
         # Redimensionar marca d'água para 30% do tamanho da imagem
-        tamanho_desejado = (int(img.size[0] * 0.3), int(img.size[1] * 0.3))
-        marca_redimensionada = self.redimensionar_marca(tamanho_desejado)
-        
-        # Criar uma nova imagem com a marca d'água
-        watermark = Image.new('RGBA', img.size, (0,0,0,0))
+        tamanho_desejado = (int(img_rgba.size[0] * 0.3), int(img_rgba.size[1] * 0.3))
+        sobreposicao = self.obter_marca(tamanho_desejado, "sobreposicao")
         
         # Calcular posição para centralizar
-        x = (img.size[0] - marca_redimensionada.size[0]) // 2
-        y = (img.size[1] - marca_redimensionada.size[1]) // 2
-        
-        # Ajustar opacidade da marca d'água
-        marca_array = np.array(marca_redimensionada)
-        marca_array[:, :, 3] = marca_array[:, :, 3] * self.opacidade
-        marca_redimensionada = Image.fromarray(marca_array)
-        
-        # Colar a marca d'água
-        watermark.paste(marca_redimensionada, (x, y), marca_redimensionada)
-        
-        # Combinar imagens
-        combined = Image.alpha_composite(img, watermark)
-        combined.convert('RGB').save(output_path)
+        x = (img_rgba.size[0] - sobreposicao.size[0]) // 2
+        y = (img_rgba.size[1] - sobreposicao.size[1]) // 2
         
-    def adicionar_marca_pdf(self, pdf_path, output_path):
-        """Adiciona marca d'água em um PDF"""
-        # Converter PDF para imagens
-        images = convert_from_path(pdf_path)
+        # Combinar imagens (fora da região da marca a página não muda)
+        with self.perfil.etapa("compor"):
+            img_rgba.alpha_composite(sobreposicao, dest=(x, y))
+        return img_rgba
         
-        # Processar cada página
-        processed_images = []
-        for img in images:
-            # Converter para RGBA
-            img_rgba = img.convert('RGBA')
-            
-            # Redimensionar marca d'água para 30% do tamanho da página
-            tamanho_desejado = (int(img_rgba.size[0] * 0.3), int(img_rgba.size[1] * 0.3))
-            marca_redimensionada = self.redimensionar_marca(tamanho_desejado)
-            
-            # Criar uma nova imagem com a marca d'água
-            watermark = Image.new('RGBA', img_rgba.size, (0,0,0,0))
-            
-            # Calcular posição para centralizar
-            x = (img_rgba.size[0] - marca_redimensionada.size[0]) // 2
-            y = (img_rgba.size[1] - marca_redimensionada.size[1]) // 2
-            
-            # Ajustar opacidade da marca d'água
-            marca_array = np.array(marca_redimensionada)
-            marca_array[:, :, 3] = marca_array[:, :, 3] * self.opacidade
-            marca_redimensionada = Image.fromarray(marca_array)
-            
-            # Colar a marca d'água
-            watermark.paste(marca_redimensionada, (x, y), marca_redimensionada)
-            
-            # Combinar imagens
-            combined = Image.alpha_composite(img_rgba, watermark)
-            processed_images.append(combined.convert('RGB'))
+    @medir_etapa("marca_imagem")
+    @com_cache_saida(VERSAO_COMPOSICAO)
+    def adicionar_marca_imagem(self, imagem_path, output_path):
+        """Adiciona marca d'água em uma imagem"""
+        # Abrir a imagem
+        img = Image.open(imagem_path).convert('RGBA')
+        self._aplicar_marca(img).convert('RGB').save(output_path)
         
-        # Salvar PDF
-        processed_images[0].save(output_path, save_all=True, 
-                               append_images=processed_images[1:])
+    def adicionar_marca_pagina(self, img):
+        """Adiciona marca d'água em uma página renderizada do PDF"""
+        return self._aplicar_marca(img.convert('RGBA')).convert('RGB')
         
-    def adicionar_marca_doc(self, doc_path, output_path):
-        """Adiciona marca d'água em um documento Word"""
-        doc = Document(doc_path)
+    @medir_etapa("marca_pdf")
+    @com_cache_saida(VERSAO_COMPOSICAO, ignorar=("diretorio_trabalho",))
+    def adicionar_marca_pdf(self, pdf_path, output_path, vetorial=False, primeira_pagina=None,
+                            ultima_pagina=None, diretorio_trabalho=None):
+        """
+        Adiciona marca d'água em um PDF
+        :param vetorial: Com True, desenha a marca sobre o conteúdo original sem rasterizar as páginas
+                         (texto e vetores continuam selecionáveis; PDFs criptografados seguem rasterizados).
+                         Por padrão cada página é renderizada e recomposta como imagem, uma por vez
+        :param primeira_pagina, ultima_pagina: Intervalo de páginas (base 1, inclusivo) levado à saída
+        :param diretorio_trabalho: Pasta de checkpoints da recomposição página a página; um PDF
+                                   interrompido continua das páginas que faltam (trabalho_pdf).
+                                   O carimbo vetorial não renderiza páginas e não usa checkpoints
+        """
+        if vetorial:
+            reader = PdfReader(pdf_path)
+            if not reader.is_encrypted:
+                intervalo_paginas(len(reader.pages), primeira_pagina, ultima_pagina)
+                # A marca é incorporada uma vez e reduzida ao maior tamanho em que é desenhada
+                with self.perfil.etapa("carimbar"):
+                    carimbar_pdf(reader, output_path, self.obter_marca(self.marca_dagua.size, "sobreposicao"),
+                                 primeira_pagina=primeira_pagina, ultima_pagina=ultima_pagina)
+                return
+
+        chave_processamento = None
+        if self.cache_paginas is not None or diretorio_trabalho is not None:
+            hash_marca = (self.cache_paginas.hash_arquivo(self.marca_dagua_path) if self.cache_paginas is not None
+                          else hash_arquivo(self.marca_dagua_path))
+            chave_processamento = ("adicionar_marca_pagina", VERSAO_COMPOSICAO, hash_marca, self.opacidade)
+        processar_paginas_pdf(pdf_path, output_path, self.adicionar_marca_pagina,
+                              cache=self.cache_paginas, chave_processamento=chave_processamento,
+                              perfil=self.perfil, primeira_pagina=primeira_pagina,
+                              ultima_pagina=ultima_pagina, diretorio_trabalho=diretorio_trabalho)
         
+    @medir_etapa("marca_doc")
+    @com_cache_saida(VERSAO_COMPOSICAO)
+    def adicionar_marca_doc(self, doc_path, output_path, rapido=None):
+        """
+        Adiciona marca d'água em um documento Word
+        :param rapido: Reescreve só cabeçalhos e relações no zip, sem carregar o documento;
+                       None ativa automaticamente para arquivos a partir de LIMITE_OOXML_RAPIDO
+        """
         # Redimensionar marca d'água para um tamanho adequado para o documento
         tamanho_desejado = (600, 400)  # Tamanho base para documentos
-        marca_redimensionada = self.redimensionar_marca(tamanho_desejado)
-        
-        # Ajustar opacidade
-        marca_array = np.array(marca_redimensionada)
-        marca_array[:, :, 3] = marca_array[:, :, 3] * self.opacidade
-        marca_redimensionada = Image.fromarray(marca_array)
-        
-        # Salvar temporariamente
-        temp_img_path = "temp_watermark.png"
-        marca_redimensionada.save(temp_img_path)
+        marca_png = self.obter_marca(tamanho_desejado, "png")
+
+        if _usar_rapido(rapido, doc_path):
+            try:
+                marcar_docx(doc_path, output_path, marca_png, self.obter_marca(tamanho_desejado).size,
+                            Inches(8))
+                return
+            except (FormatoNaoSuportado, zipfile.BadZipFile):
+                pass
+
+        doc = Document(doc_path)
         
-        # Adicionar marca d'água em cada seção
+        # Adicionar marca d'água em cada seção; o python-docx reconhece a mesma imagem (SHA-1)
+        # e todos os cabeçalhos passam a referenciar uma única parte de mídia
         for section in doc.sections:
             section.header.is_linked_to_previous = False
             header = section.header
             paragraph = header.paragraphs[0] if header.paragraphs else header.add_paragraph()
             run = paragraph.add_run()
-            run.add_picture(temp_img_path, width=Inches(8))
+            run.add_picture(io.BytesIO(marca_png), width=Inches(8))
         
         # Salvar documento
         doc.save(output_path)
-        
-        # Remover arquivo temporário
-        if os.path.exists(temp_img_path):
-            os.remove(temp_img_path)
 
-    def adicionar_marca_excel(self, excel_path, output_path):
-        """Adiciona marca d'água em uma planilha Excel"""
-        # Carregar o arquivo Excel
-        workbook = openpyxl.load_workbook(excel_path)
-        
+    @medir_etapa("marca_excel")
+    @com_cache_saida(VERSAO_COMPOSICAO)
+    def adicionar_marca_excel(self, excel_path, output_path, rapido=None):
+        """
+        Adiciona marca d'água em uma planilha Excel
+        :param rapido: Reescreve só desenhos e relações no zip, sem carregar a pasta de trabalho;
+                       None ativa automaticamente para arquivos a partir de LIMITE_OOXML_RAPIDO
+        """
         # Redimensionar marca d'água
         tamanho_desejado = (300, 200)  # Tamanho base para Excel
-        marca_redimensionada = self.redimensionar_marca(tamanho_desejado)
-        
-        # Ajustar opacidade
-        marca_array = np.array(marca_redimensionada)
-        marca_array[:, :, 3] = marca_array[:, :, 3] * self.opacidade
-        marca_redimensionada = Image.fromarray(marca_array)
-        
-        # Salvar temporariamente
-        temp_img_path = "temp_watermark.png"
-        marca_redimensionada.save(temp_img_path)
+        marca_png = self.obter_marca(tamanho_desejado, "png")
+
+        if _usar_rapido(rapido, excel_path):
+            try:
+                marcar_xlsx(excel_path, output_path, marca_png, self.obter_marca(tamanho_desejado).size)
+                return
+            except (FormatoNaoSuportado, zipfile.BadZipFile):
+                pass
+
+        # Carregar o arquivo Excel
+        workbook = openpyxl.load_workbook(excel_path)
         
-        # Adicionar marca d'água em cada planilha
+        # Uma única imagem ancorada em todas as planilhas, gravada como uma única parte de mídia
+        img = _ImagemCompartilhada(io.BytesIO(marca_png))
         for sheet in workbook.sheetnames:
             ws = workbook[sheet]
             
-            # Carregar a imagem
-            img = XLImage(temp_img_path)
-            
             # Calcular posição central (célula B2 como padrão)
             ws.add_image(img, 'B2')
         
-        # Salvar arquivo
-        workbook.save(output_path)
-        
-        # Remover arquivo temporário
-        if os.path.exists(temp_img_path):
-            os.remove(temp_img_path)
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as destino:
+            _EscritorExcel(workbook, destino).write_data()
+
+def _usar_rapido(rapido, caminho):
+    if rapido is None:
+        return os.path.getsize(caminho) >= LIMITE_OOXML_RAPIDO
+    return rapido
+
+class _ImagemCompartilhada(XLImage):
+    """Imagem do openpyxl que mantém o primeiro número de mídia recebido, mesmo ancorada em várias planilhas"""
+    _numero = None
+
+    @property
+    def _id(self):
+        return self._numero
+
+    @_id.setter
+    def _id(self, numero):
+        # O ExcelWriter numera a imagem de novo a cada desenho; as relações ficam na primeira parte
+        if self._numero is None:
+            self._numero = numero
+
+class _EscritorExcel(ExcelWriter):
+    """ExcelWriter que grava cada imagem uma única vez no pacote"""
+
+    def _write_images(self):
+        gravadas = set()
+        for img in self._images:
+            if img.path not in gravadas:
+                gravadas.add(img.path)
+                self._archive.writestr(img.path[1:], img._data())
+
+# Extensões aceitas por processar_arquivo
+EXTENSOES_IMAGEM = ('.jpg', '.jpeg', '.png')
+EXTENSOES_DOC = ('.doc', '.docx')
+
+def processar_arquivo(processador, arquivo_entrada, arquivo_saida):
+    """
+    Adiciona a marca d'água escolhendo o método pela extensão do arquivo de entrada
+    :raises ValueError: Formato de arquivo não suportado
+    """
+    extensao = os.path.splitext(arquivo_entrada)[1].lower()
+    
+    if extensao in EXTENSOES_IMAGEM:
+        processador.adicionar_marca_imagem(arquivo_entrada, arquivo_saida)
+    elif extensao == '.pdf':
+        processador.adicionar_marca_pdf(arquivo_entrada, arquivo_saida)
+    elif extensao in EXTENSOES_DOC:
+        processador.adicionar_marca_doc(arquivo_entrada, arquivo_saida)
+    elif extensao == '.xlsx':
+        processador.adicionar_marca_excel(arquivo_entrada, arquivo_saida)
+    else:
+        raise ValueError(f"Formato de arquivo não suportado: {extensao}")
 
 def main():
-    # Verificar argumentos da linha de comando
-    if len(sys.argv) != 4:
-        print("Uso: python script.py arquivo_entrada arquivo_saida marca_dagua")
+    # Verificar argumentos da linha de comando ("--profile arquivo.json" é opcional)
+    argumentos, arquivo_perfil = separar_perfil(sys.argv)
+    if len(argumentos) != 4:
+        print("Uso: python script.py arquivo_entrada arquivo_saida marca_dagua [--profile perfil.json]")
         sys.exit(1)
         
-    arquivo_entrada = sys.argv[1]
-    arquivo_saida = sys.argv[2]
-    marca_dagua = sys.argv[3]
+    arquivo_entrada = argumentos[1]
+    arquivo_saida = argumentos[2]
+    marca_dagua = argumentos[3]
     
     # Instanciar o processador
+    perfil = Perfil() if arquivo_perfil else None
     processador = AdicionarMarcaDagua(
         marca_dagua_path=marca_dagua,
-        opacidade=0.3
+        opacidade=0.3,
+        cache_saida=CacheSaida.do_ambiente(),
+        perfil=perfil
     )
     
     # Processar o arquivo baseado na extensão
-    extensao = os.path.splitext(arquivo_entrada)[1].lower()
-    
-    if extensao in ['.jpg', '.jpeg', '.png']:
-        processador.adicionar_marca_imagem(arquivo_entrada, arquivo_saida)
-    elif extensao == '.pdf':
-        processador.adicionar_marca_pdf(arquivo_entrada, arquivo_saida)
-    elif extensao in ['.doc', '.docx']:
-        processador.adicionar_marca_doc(arquivo_entrada, arquivo_saida)
-    elif extensao == '.xlsx':
-        processador.adicionar_marca_excel(arquivo_entrada, arquivo_saida)
-    else:
-        print(f"Formato de arquivo não suportado: {extensao}")
+    try:
+        processar_arquivo(processador, arquivo_entrada, arquivo_saida)
+    except ValueError as e:
+        print(e)
         sys.exit(1)
+    finally:
+        if perfil is not None:
+            perfil.salvar(arquivo_perfil)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,21 +1,82 @@
 import cv2
 import numpy as np
 from PIL import Image
+import copy
 import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    from .cache_saida import CacheSaida, com_cache_saida
+    from .instrumentacao import PERFIL_INATIVO, Perfil, medir_etapa, separar_perfil
+except ImportError:
+    from cache_saida import CacheSaida, com_cache_saida
+    from instrumentacao import PERFIL_INATIVO, Perfil, medir_etapa, separar_perfil
+
+# Versão do resultado; altere quando a composição mudar para invalidar o cache de saída
+VERSAO_COMPOSICAO = 1
+FILA_PADRAO = 32  # Frames em andamento entre as etapas do pipeline
+SEGMENTO_MINIMO_SEGUNDOS = 2  # Duração mínima de cada segmento processado em paralelo
+
+class MarcaPreparada:
+    def __init__(self, marca_bgra, opacidade, frame_size):
+        """
+        Marca d'água pronta para ser aplicada em frames de um tamanho fixo
+        :param marca_bgra: Marca redimensionada em BGRA
+        :param opacidade: Valor de 0 a 1 para a opacidade da marca
+        :param frame_size: (largura, altura) do frame do vídeo
+        """
+        # Posição centralizada da marca completa no frame
+        x = (frame_size[0] - marca_bgra.shape[1]) // 2
+        y = (frame_size[1] - marca_bgra.shape[0]) // 2
+
+        # Alfa final em 0..255, já com a opacidade
+        alfa = np.rint(marca_bgra[:, :, 3].astype(np.float32) * opacidade).astype(np.uint16)
+
+        # Descarta as bordas totalmente transparentes para reduzir a região processada
+        linhas = np.flatnonzero(alfa.any(axis=1))
+        colunas = np.flatnonzero(alfa.any(axis=0))
+        if linhas.size == 0:
+            self.x, self.y, self.largura, self.altura = x, y, 0, 0
+            self.cor_premultiplicada = self.alfa_inverso = None
+            return
+        topo, base = linhas[0], linhas[-1] + 1
+        esquerda, direita = colunas[0], colunas[-1] + 1
+        alfa = alfa[topo:base, esquerda:direita, None]
+
+        self.x, self.y = x + esquerda, y + topo
+        self.altura, self.largura = alfa.shape[:2]
+        self.cor_premultiplicada = marca_bgra[topo:base, esquerda:direita, :3].astype(np.uint16) * alfa
+        self.alfa_inverso = 255 - alfa
 
 class AdicionarMarcaVideo:
-    def __init__(self, marca_dagua_path, opacidade=0.3):
+    def __init__(self, marca_dagua_path, opacidade=0.3, cache_saida=None, perfil=None):
         """
         Inicializa o objeto para adicionar marca d'água em vídeos
-        :param marca_dagua_path: Caminho para a imagem da marca d'água
+        :param marca_dagua_path: Caminho para a imagem da marca d'água (None nas subclasses que
+                                 não aplicam uma imagem, como RemoverMarcaVideo)
         :param opacidade: Valor de 0 a 1 para a opacidade da marca
+        :param cache_saida: CacheSaida opcional para reaproveitar vídeos já gerados
+        :param perfil: instrumentacao.Perfil opcional; mede cada frame (decodificação, mistura e
+                       codificação) e cada vídeo
         """
         # Carregar a marca d'água
-        self.marca_dagua = cv2.cvtColor(
-            np.array(Image.open(marca_dagua_path).convert('RGBA')), 
-            cv2.COLOR_RGBA2BGRA
-        )
+        self.marca_dagua = None
+        if marca_dagua_path is not None:
+            self.marca_dagua = cv2.cvtColor(
+                np.array(Image.open(marca_dagua_path).convert('RGBA')),
+                cv2.COLOR_RGBA2BGRA
+            )
         self.opacidade = opacidade
+        self.marca_dagua_path = marca_dagua_path
+        self.cache_saida = cache_saida
+        self.perfil = perfil or PERFIL_INATIVO
 
     def redimensionar_marca(self, frame_size):
         """
@@ -41,37 +102,70 @@ class AdicionarMarcaVideo:
         
         return cv2.resize(self.marca_dagua, novo_tamanho, interpolation=cv2.INTER_LANCZOS4)
 
-    def adicionar_marca_frame(self, frame, marca_redimensionada):
+    def preparar_marca(self, frame_size):
         """
-        Adiciona marca d'água em um frame do vídeo
+        Redimensiona e pré-calcula a marca d'água para um tamanho de frame
+        :param frame_size: (largura, altura) do frame do vídeo
         """
-        # Criar uma cópia do frame
-        frame_rgba = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
-        
-        # Calcular posição para centralizar
-        x = (frame.shape[1] - marca_redimensionada.shape[1]) // 2
-        y = (frame.shape[0] - marca_redimensionada.shape[0]) // 2
-        
-        # Criar máscara da marca d'água
-        marca_alpha = marca_redimensionada[:, :, 3] / 255.0 * self.opacidade
-        
-        # Região onde a marca será aplicada
-        roi = frame_rgba[y:y+marca_redimensionada.shape[0], 
-                        x:x+marca_redimensionada.shape[1]]
-        
-        # Aplicar marca d'água com transparência
-        for c in range(3):  # BGR channels
-            roi[:, :, c] = roi[:, :, c] * (1 - marca_alpha) + \
-                          marca_redimensionada[:, :, c] * marca_alpha
-        
-        return cv2.cvtColor(frame_rgba, cv2.COLOR_BGRA2BGR)
+        return MarcaPreparada(self.redimensionar_marca(frame_size), self.opacidade, frame_size)
 
-    def processar_video(self, video_path, output_path):
+    def adicionar_marca_frame(self, frame, marca):
         """
-        Adiciona marca d'água em todo o vídeo
+        Adiciona marca d'água em um frame do vídeo, alterando o próprio frame (BGR)
+        :param marca: MarcaPreparada ou a marca redimensionada em BGRA
+        """
+        if not isinstance(marca, MarcaPreparada):
+            marca = MarcaPreparada(marca, self.opacidade, (frame.shape[1], frame.shape[0]))
+        if marca.alfa_inverso is None:
+            return frame
+
+        # Apenas a região coberta pela marca é tocada, sem converter o frame inteiro
+        roi = frame[marca.y:marca.y + marca.altura, marca.x:marca.x + marca.largura]
+
+        # roi * (255 - a) + cor * a, em inteiros de 16 bits, dividido por 255 com arredondamento
+        mistura = roi * marca.alfa_inverso
+        mistura += marca.cor_premultiplicada
+        mistura += 128
+        mistura += mistura >> 8
+        mistura >>= 8
+        roi[...] = mistura
+        return frame
+
+    def _aplicar_frame(self, frame, marca):
+        # Operação de cada frame no pipeline (RemoverMarcaVideo a substitui pela remoção)
+        return self.adicionar_marca_frame(frame, marca)
+
+    def _preparar_video(self, video_path, frame_size):
+        # Pré-cálculo feito uma vez por vídeo e passado a _aplicar_frame
+        return self.preparar_marca(frame_size)
+
+    def _misturar_medindo(self, frame, marca):
+        # Executado nas threads de mistura; devolve também o tempo gasto
+        inicio = time.perf_counter()
+        with self.perfil.etapa("misturar_frame"):
+            self._aplicar_frame(frame, marca)
+        return frame, time.perf_counter() - inicio
+
+    @medir_etapa("marca_video")
+    @com_cache_saida(VERSAO_COMPOSICAO, ignorar=("pipeline", "workers", "fila", "mostrar_progresso"))
+    def processar_video(self, video_path, output_path, pipeline=True, workers=None, fila=FILA_PADRAO,
+                        inicio=0, fim=None, mostrar_progresso=True):
+        """
+        Adiciona marca d'água em todo o vídeo (ou no trecho [inicio, fim) de frames)
         :param video_path: Caminho do vídeo de entrada
         :param output_path: Caminho para salvar o vídeo processado
+        :param pipeline: Sobrepõe decodificação, mistura e codificação em etapas separadas
+        :param workers: Threads de mistura no pipeline (padrão: núcleos disponíveis, até 4)
+        :param fila: Máximo de frames em andamento entre as etapas (limita a memória)
+        :param inicio: Primeiro frame processado
+        :param fim: Frame em que o processamento para (None = até o final do vídeo)
+        :param mostrar_progresso: Exibe o progresso e o resumo no terminal
+        :return: Dicionário com frames, tempo, fps e a utilização de cada etapa (None se veio do cache)
         """
+        return self._processar_video(video_path, output_path, pipeline, workers, fila, inicio, fim,
+                                     mostrar_progresso)
+
+    def _processar_video(self, video_path, output_path, pipeline, workers, fila, inicio, fim, mostrar_progresso):
         # Abrir o vídeo
         video = cv2.VideoCapture(video_path)
         if not video.isOpened():
@@ -82,9 +176,15 @@ class AdicionarMarcaVideo:
         altura = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = video.get(cv2.CAP_PROP_FPS)
         total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        if fim is not None:
+            total_frames = min(total_frames, fim)
+        if inicio:
+            video.set(cv2.CAP_PROP_POS_FRAMES, inicio)
+            total_frames = max(0, total_frames - inicio)
+        limite = None if fim is None else fim - inicio
         
-        # Redimensionar marca d'água uma única vez
-        marca_redimensionada = self.redimensionar_marca((largura, altura))
+        # Redimensionar e pré-calcular a marca d'água uma única vez
+        marca = self._preparar_video(video_path, (largura, altura))
         
         # Configurar o writer do vídeo
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
@@ -92,30 +192,337 @@ class AdicionarMarcaVideo:
             output_path, fourcc, fps, (largura, altura)
         )
         
-        # Processar cada frame
+        try:
+            if pipeline:
+                estatisticas = self._processar_pipeline(video, writer, marca, total_frames,
+                                                        workers or min(4, os.cpu_count() or 1), fila,
+                                                        limite, mostrar_progresso)
+            else:
+                estatisticas = self._processar_serial(video, writer, marca, total_frames, limite,
+                                                      mostrar_progresso)
+        finally:
+            # Liberar recursos
+            video.release()
+            writer.release()
+        
+        if mostrar_progresso:
+            print("\nProcessamento concluído!")
+            utilizacao = ", ".join(f"{etapa} {uso:.0%}" for etapa, uso in estatisticas["utilizacao"].items())
+            print(f"{estatisticas['fps']:.1f} frames/s — utilização: {utilizacao}")
+        return estatisticas
+
+    def _processar_serial(self, video, writer, marca, total_frames, limite=None, mostrar_progresso=True):
+        """Lê, mistura e grava cada frame em sequência na thread atual (até `limite` frames)"""
+        tempos = {"decodificacao": 0.0, "mistura": 0.0, "codificacao": 0.0}
+        inicio = time.perf_counter()
         frames_processados = 0
-        while True:
-            ret, frame = video.read()
+        while limite is None or frames_processados < limite:
+            t = time.perf_counter()
+            with self.perfil.etapa("decodificar_frame"):
+                ret, frame = video.read()
+            tempos["decodificacao"] += time.perf_counter() - t
             if not ret:
                 break
-                
-            # Adicionar marca d'água no frame
-            frame_com_marca = self.adicionar_marca_frame(frame, marca_redimensionada)
-            writer.write(frame_com_marca)
-            
-            # Atualizar progresso
+
+            frame, duracao = self._misturar_medindo(frame, marca)
+            tempos["mistura"] += duracao
+
+            t = time.perf_counter()
+            with self.perfil.etapa("codificar_frame"):
+                writer.write(frame)
+            tempos["codificacao"] += time.perf_counter() - t
+
             frames_processados += 1
-            progresso = (frames_processados / total_frames) * 100
-            print(f"Progresso: {progresso:.1f}%", end='\r')
-        
-        print("\nProcessamento concluído!")
-        
-        # Liberar recursos
-        video.release()
-        writer.release()
+            if mostrar_progresso:
+                _mostrar_progresso(frames_processados, total_frames)
+        return _estatisticas(frames_processados, time.perf_counter() - inicio, tempos, 1)
+
+    def _processar_pipeline(self, video, writer, marca, total_frames, workers, fila, limite=None,
+                            mostrar_progresso=True):
+        """
+        Decodificação em uma thread, mistura em um pool de threads e codificação na thread atual.
+        A fila guarda os futuros na ordem de leitura, então a ordem dos frames é preservada e no
+        máximo `fila` frames ficam em memória entre as etapas.
+        """
+        pendentes = queue.Queue(maxsize=fila)
+        parar = threading.Event()
+        tempos = {"decodificacao": 0.0, "mistura": 0.0, "codificacao": 0.0}
+        erros = []
+        inicio = time.perf_counter()
+        frames_processados = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def decodificar():
+                lidos = 0
+                try:
+                    while not parar.is_set() and (limite is None or lidos < limite):
+                        t = time.perf_counter()
+                        with self.perfil.etapa("decodificar_frame"):
+                            ret, frame = video.read()
+                        tempos["decodificacao"] += time.perf_counter() - t
+                        if not ret:
+                            break
+                        lidos += 1
+                        if not _colocar(pendentes, pool.submit(self._misturar_medindo, frame, marca), parar):
+                            break
+                except Exception as e:
+                    erros.append(e)
+                finally:
+                    # Sinaliza o fim para a codificação
+                    _colocar(pendentes, None, parar)
+
+            decodificador = threading.Thread(target=decodificar, daemon=True)
+            decodificador.start()
+            try:
+                while True:
+                    futuro = pendentes.get()
+                    if futuro is None:
+                        break
+                    frame, duracao = futuro.result()
+                    tempos["mistura"] += duracao
+
+                    t = time.perf_counter()
+                    with self.perfil.etapa("codificar_frame"):
+                        writer.write(frame)
+                    tempos["codificacao"] += time.perf_counter() - t
+
+                    frames_processados += 1
+                    if mostrar_progresso:
+                        _mostrar_progresso(frames_processados, total_frames)
+            finally:
+                # Em caso de erro na codificação, a decodificação para na próxima volta
+                parar.set()
+                decodificador.join()
+
+        if erros:
+            raise erros[0]
+        return _estatisticas(frames_processados, time.perf_counter() - inicio, tempos, workers)
+
+    def processar_videos(self, trabalhos, workers=None, segmentos=None):
+        """
+        Adiciona marca d'água em vários vídeos, dividindo cada um em segmentos processados em paralelo
+        :param trabalhos: Lista de (video_path, output_path)
+        :param workers: Processos compartilhados por todos os vídeos (padrão: núcleos disponíveis)
+        :param segmentos: Segmentos já planejados (planejar_segmentos) de cada trabalho, na mesma
+                          ordem; None planeja aqui
+        :return: Lista com o resumo de cada vídeo, na ordem dos trabalhos
+        """
+        workers = workers or os.cpu_count() or 1
+        segmentar = pode_segmentar(workers)
+        resumos = [None] * len(trabalhos)
+
+        # Os processos do pool geram segmentos, que não passam pelo cache de saída; as medições
+        # de cada segmento voltam com o resultado e são somadas ao perfil deste processo
+        trabalhador = copy.copy(self)
+        trabalhador.cache_saida = None
+        trabalhador.perfil = Perfil() if self.perfil.ativo else PERFIL_INATIVO
+
+        planos = []
+        for indice, (video_path, output_path) in enumerate(trabalhos):
+            chave = None
+            if self.cache_saida is not None:
+                chave = AdicionarMarcaVideo.processar_video.chave_cache(self, video_path, output_path)
+                if self.cache_saida.copiar(chave, output_path):
+                    resumos[indice] = {"entrada": video_path, "saida": output_path, "cache": True}
+                    print(f"Concluído: {output_path} (cache)")
+                    continue
+            if segmentos is not None:
+                plano_video = segmentos[indice]
+            else:
+                plano_video = planejar_segmentos(video_path, workers if segmentar else 1)
+            pasta = None
+            if len(plano_video) > 1:
+                pasta = tempfile.mkdtemp(prefix="segmentos_", dir=os.path.dirname(os.path.abspath(output_path)))
+                saidas = [os.path.join(pasta, f"{numero:05d}.mp4") for numero in range(len(plano_video))]
+            else:
+                saidas = [output_path]
+            planos.append({"indice": indice, "chave": chave, "entrada": video_path, "saida": output_path,
+                           "pasta": pasta, "segmentos": plano_video, "saidas": saidas})
+
+        erros = []
+        # Um único pool para todos os vídeos mantém o total de processos dentro do orçamento
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for plano in planos:
+                plano["futuros"] = [pool.submit(_processar_segmento, trabalhador, plano["entrada"], saida, *segmento)
+                                    for segmento, saida in zip(plano["segmentos"], plano["saidas"])]
+            for plano in planos:
+                # A falha de um vídeo não interrompe os demais
+                try:
+                    frames = 0
+                    # Os vídeos dividem o pool: o tempo de cada um conta a partir do seu primeiro segmento
+                    inicio = None
+                    for futuro in plano["futuros"]:
+                        resultado = futuro.result()
+                        frames += resultado["frames"]
+                        inicio = resultado["inicio"] if inicio is None else min(inicio, resultado["inicio"])
+                        self.perfil.mesclar(resultado.get("perfil"))
+                    if plano["pasta"] is not None:
+                        with self.perfil.etapa("concatenar"):
+                            concatenar_segmentos(plano["saidas"], plano["saida"])
+                    self.perfil.contar_arquivos(plano["entrada"], plano["saida"])
+                    if plano["chave"] is not None:
+                        self.cache_saida.guardar(plano["chave"], plano["saida"])
+                except Exception as e:
+                    erros.append(e)
+                    print(f"Erro ao processar {plano['entrada']}: {e}")
+                    continue
+                finally:
+                    if plano["pasta"] is not None:
+                        shutil.rmtree(plano["pasta"], ignore_errors=True)
+                segundos = time.time() - inicio
+                resumo = {"entrada": plano["entrada"], "saida": plano["saida"],
+                          "segmentos": len(plano["segmentos"]), "frames": frames,
+                          "segundos": round(segundos, 3),
+                          "fps": frames / segundos if segundos > 0 else 0.0}
+                resumos[plano["indice"]] = resumo
+                print(f"Concluído: {plano['saida']} ({len(plano['segmentos'])} segmentos, "
+                      f"{resumo['fps']:.1f} frames/s)")
+        if erros:
+            raise erros[0]
+        return resumos
+
+def _processar_segmento(processador, video_path, output_path, inicio, fim):
+    # Executado nos processos do pool; cada segmento usa um núcleo. O início vai no relógio de
+    # parede, comparável entre processos, para medir cada vídeo desde o seu primeiro segmento
+    comeco = time.time()
+    estatisticas = processador.processar_video(video_path, output_path, pipeline=False, inicio=inicio, fim=fim,
+                                               mostrar_progresso=False)
+    estatisticas["inicio"] = comeco
+    if processador.perfil.ativo:
+        medicoes = processador.perfil.exportar()
+        # Os bytes do vídeo inteiro são contados uma vez pelo processo principal
+        medicoes["bytes"] = {"lidos": 0, "gravados": 0}
+        estatisticas["perfil"] = medicoes
+    return estatisticas
+
+def pode_segmentar(workers):
+    """Sem ffmpeg não há como juntar os segmentos; cada vídeo vira um único segmento"""
+    return workers > 1 and shutil.which("ffmpeg") is not None
+
+def listar_keyframes(video_path):
+    """
+    Instantes (em segundos) dos keyframes do vídeo, lidos dos pacotes pelo ffprobe sem decodificar
+    :return: Lista ordenada, ou None se o ffprobe não estiver disponível
+    """
+    if shutil.which("ffprobe") is None:
+        return None
+    comando = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path]
+    try:
+        saida = subprocess.run(comando, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    instantes = []
+    for linha in saida.splitlines():
+        partes = linha.strip().split(",")
+        if len(partes) >= 2 and "K" in partes[1]:
+            try:
+                instantes.append(float(partes[0]))
+            except ValueError:
+                continue
+    return sorted(instantes)
+
+def planejar_segmentos(video_path, partes):
+    """
+    Divide o vídeo em até `partes` trechos de frames com tamanhos parecidos, começando em keyframes
+    (ou em cortes uniformes quando os keyframes não podem ser lidos)
+    :return: Lista de (inicio, fim); o último fim é None (até o final do vídeo)
+    """
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise ValueError("Não foi possível abrir o vídeo")
+    fps = video.get(cv2.CAP_PROP_FPS)
+    total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    video.release()
+
+    # Segmentos curtos demais custam mais em abertura e busca do que ganham em paralelismo
+    if fps > 0:
+        partes = min(partes, int(total_frames // (fps * SEGMENTO_MINIMO_SEGUNDOS)))
+    if partes <= 1 or total_frames <= 0:
+        return [(0, None)]
+
+    alvos = [round(total_frames * numero / partes) for numero in range(1, partes)]
+    keyframes = listar_keyframes(video_path) if fps > 0 else None
+    if keyframes:
+        frames_chave = [round(instante * fps) for instante in keyframes]
+        cortes = {min(frames_chave, key=lambda frame: abs(frame - alvo)) for alvo in alvos}
+    else:
+        cortes = set(alvos)
+    cortes = sorted(corte for corte in cortes if 0 < corte < total_frames)
+    limites = [0] + cortes
+    return list(zip(limites, limites[1:] + [None]))
+
+def concatenar_segmentos(segmentos, output_path):
+    """Junta os segmentos (mesmo codec e parâmetros) sem recodificar, pelo concat do ffmpeg"""
+    lista = os.path.join(os.path.dirname(segmentos[0]), "segmentos.txt")
+    with open(lista, "w", encoding="utf-8") as f:
+        for segmento in segmentos:
+            caminho = os.path.abspath(segmento).replace("'", "'\\''")
+            f.write(f"file '{caminho}'\n")
+    comando = ["ffmpeg", "-v", "error", "-y", "-f", "concat", "-safe", "0", "-i", lista,
+               "-c", "copy", output_path]
+    processo = subprocess.run(comando, capture_output=True, text=True)
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao juntar os segmentos: {processo.stderr.strip()}")
+
+def _colocar(fila, item, parar):
+    """Coloca o item na fila limitada, desistindo se o pipeline for interrompido"""
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _mostrar_progresso(frames_processados, total_frames):
+    if total_frames > 0:
+        progresso = (frames_processados / total_frames) * 100
+        print(f"Progresso: {progresso:.1f}%", end='\r')
+
+def _estatisticas(frames, segundos, tempos, workers):
+    """Utilização = tempo ocupado da etapa / (tempo total × threads da etapa)"""
+    threads = {"decodificacao": 1, "mistura": workers, "codificacao": 1}
+    return {
+        "frames": frames,
+        "segundos": round(segundos, 3),
+        "fps": frames / segundos if segundos > 0 else 0.0,
+        "workers": workers,
+        "utilizacao": {etapa: (ocupado / (segundos * threads[etapa]) if segundos > 0 else 0.0)
+                       for etapa, ocupado in tempos.items()},
+    }
 
 def main():
-    # Criar pasta de saída se não existir
+    # Chamado pela integração com o Laravel: entrada, saída e marca d'água ("--profile arquivo.json" é opcional)
+    argumentos, arquivo_perfil = separar_perfil(sys.argv)
+    perfil = Perfil() if arquivo_perfil else None
+    if len(argumentos) == 4:
+        processador = AdicionarMarcaVideo(
+            marca_dagua_path=argumentos[3],
+            opacidade=0.3,
+            cache_saida=CacheSaida.do_ambiente(),
+            perfil=perfil
+        )
+        entrada, saida = argumentos[1], argumentos[2]
+        workers = os.cpu_count() or 1
+        try:
+            # O plano é feito uma vez (uma chamada ao ffprobe) e repassado a processar_videos
+            segmentos = planejar_segmentos(entrada, workers) if pode_segmentar(workers) else [(0, None)]
+            if len(segmentos) > 1:
+                processador.processar_videos([(entrada, saida)], workers, segmentos=[segmentos])
+            else:
+                # Um único segmento rende mais no pipeline de threads do que em um processo do pool
+                processador.processar_video(entrada, saida, pipeline=True)
+        finally:
+            if perfil is not None:
+                perfil.salvar(arquivo_perfil)
+        return
+    if len(argumentos) != 1:
+        print("Uso: python adicionar_marca_video.py [arquivo_entrada arquivo_saida marca_dagua] "
+              "[--profile perfil.json]")
+        sys.exit(1)
+
+    # Sem argumentos: processa todos os vídeos MP4 da pasta atual
     output_dir = "videos_com_marca"
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
@@ -123,16 +530,21 @@ def main():
     # Instanciar o processador de vídeo
     processador = AdicionarMarcaVideo(
         marca_dagua_path="marca.png",
-        opacidade=0.3
+        opacidade=0.3,
+        cache_saida=CacheSaida.do_ambiente(),
+        perfil=perfil
     )
     
-    # Processar todos os vídeos MP4 na pasta
-    for arquivo in os.listdir("."):
+    # Processar todos os vídeos MP4 na pasta, ao mesmo tempo
+    trabalhos = []
+    for arquivo in sorted(os.listdir(".")):
         if arquivo.lower().endswith(".mp4"):
-            print(f"\nProcessando: {arquivo}")
             nome_base = os.path.splitext(arquivo)[0]
-            output_path = os.path.join(output_dir, f"{nome_base}_marca.mp4")
-            processador.processar_video(arquivo, output_path)
+            trabalhos.append((arquivo, os.path.join(output_dir, f"{nome_base}_marca.mp4")))
+    if trabalhos:
+        processador.processar_videos(trabalhos)
+    if perfil is not None:
+        perfil.salvar(arquivo_perfil)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,101 @@
+"""
+Base dos caches em disco endereçados pelo conteúdo (cache_paginas, cache_saida): chaves SHA-256,
+arquivos em subpastas pelos 2 primeiros caracteres da chave e remoção dos arquivos usados há
+mais tempo (LRU, pela data de modificação, atualizada a cada acesso) quando o limite é ultrapassado.
+"""
+import hashlib
+import os
+import threading
+
+
+def hash_arquivo(caminho):
+    """SHA-256 do conteúdo do arquivo"""
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+class CacheDisco:
+    def __init__(self, diretorio, tamanho_maximo):
+        """
+        :param diretorio: Pasta onde os arquivos são guardados (criada se não existir)
+        :param tamanho_maximo: Limite em bytes; os arquivos usados há mais tempo são removidos primeiro
+        """
+        self.diretorio = diretorio
+        self.tamanho_maximo = tamanho_maximo
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._tamanho_atual = None
+
+    def __getstate__(self):
+        # Permite enviar o cache aos processos de um pool (a trava fica no processo atual)
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def hash_arquivo(self, caminho):
+        """SHA-256 do conteúdo do arquivo, memorizado enquanto tamanho e data de modificação não mudarem"""
+        info = os.stat(caminho)
+        assinatura = (os.path.abspath(caminho), info.st_size, info.st_mtime_ns)
+        if assinatura not in self._hashes:
+            self._hashes[assinatura] = hash_arquivo(caminho)
+        return self._hashes[assinatura]
+
+    @staticmethod
+    def chave(*partes):
+        """Chave de uma entrada a partir das partes que determinam o seu conteúdo"""
+        return hashlib.sha256(repr(partes).encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave, extensao):
+        return os.path.join(self.diretorio, chave[:2], chave + extensao)
+
+    def _guardado(self, raiz, nome):
+        """Indica se o arquivo conta para o tamanho do cache (gravações em andamento não contam)"""
+        return ".tmp" not in nome
+
+    def _entradas(self):
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                if not self._guardado(raiz, nome):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                try:
+                    info = os.stat(caminho)
+                except OSError:
+                    continue
+                yield caminho, info.st_size, info.st_mtime
+
+    def tamanho(self):
+        """Bytes ocupados pelos arquivos guardados"""
+        return sum(tamanho for _, tamanho, _ in self._entradas())
+
+    def _adicionar_tamanho(self, tamanho):
+        with self._lock:
+            if self._tamanho_atual is None:
+                self._tamanho_atual = self.tamanho()
+            else:
+                self._tamanho_atual += tamanho
+            if self._tamanho_atual <= self.tamanho_maximo:
+                return
+            self._tamanho_atual = self._remover_antigos()
+
+    def _remover_antigos(self):
+        """Remove os arquivos usados há mais tempo até o cache voltar a caber no limite"""
+        entradas = sorted(self._entradas(), key=lambda entrada: entrada[2])
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for caminho, tamanho, _ in entradas:
+            if total <= self.tamanho_maximo:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                continue
+            total -= tamanho
+        return total
@@ -0,0 +1,130 @@
+import json
+import os
+import uuid
+from PIL import Image
+
+try:
+    from .cache_disco import CacheDisco
+except ImportError:
+    from cache_disco import CacheDisco
+
+# Tamanho máximo padrão do cache em disco
+TAMANHO_MAXIMO_PADRAO = 2 * 1024 ** 3
+
+# As páginas são guardadas em PNG (sem perdas) com compressão rápida: uma página de documento a
+# 300 DPI cai de ~25 MB (RGB sem compressão) para algumas centenas de KB, ao custo de ~0,2 s por
+# página para comprimir e ~0,1 s para ler, bem menos que renderizar de novo com o poppler
+EXTENSAO_PAGINA = ".png"
+NIVEL_COMPRESSAO = 1
+# Páginas guardadas sem compressão por versões anteriores; só contam para o limite e são removidas
+EXTENSAO_ANTIGA = ".npy"
+
+# Camadas do cache: páginas como saem do poppler e páginas já processadas
+CAMADA_RENDERIZADAS = "renderizadas"
+CAMADA_PROCESSADAS = "processadas"
+
+
+class CachePaginas(CacheDisco):
+    def __init__(self, diretorio, tamanho_maximo=TAMANHO_MAXIMO_PADRAO):
+        """
+        Cache em disco de páginas renderizadas e processadas, endereçado pelo conteúdo
+        :param diretorio: Pasta onde as páginas são guardadas (criada se não existir)
+        :param tamanho_maximo: Limite em bytes; as páginas usadas há mais tempo são removidas primeiro
+        """
+        super().__init__(diretorio, tamanho_maximo)
+        # Na cópia enviada a um processo do pool, bytes gravados que o processo principal contabiliza
+        self._bytes_novos = None
+        self.estatisticas = self._estatisticas_vazias()
+
+    @staticmethod
+    def _estatisticas_vazias():
+        return {camada: {"acertos": 0, "falhas": 0} for camada in (CAMADA_RENDERIZADAS, CAMADA_PROCESSADAS)}
+
+    def __getstate__(self):
+        # Permite enviar o cache aos processos do pool. A cópia começa com os contadores zerados,
+        # para refletir só a tarefa, e não remove páginas antigas (teria de percorrer o diretório a
+        # cada tarefa): só soma os bytes gravados, que o processo principal contabiliza
+        estado = super().__getstate__()
+        estado["estatisticas"] = self._estatisticas_vazias()
+        estado["_bytes_novos"] = 0
+        return estado
+
+    @property
+    def bytes_novos(self):
+        """Bytes gravados por esta cópia do cache em um processo do pool (ver contabilizar)"""
+        return self._bytes_novos or 0
+
+    def contabilizar(self, tamanho):
+        """Soma os bytes gravados por um processo do pool, removendo as páginas antigas se preciso"""
+        if tamanho:
+            self._adicionar_tamanho(tamanho)
+
+    def chave_renderizada(self, pdf_path, numero, dpi, grayscale):
+        return self.chave(CAMADA_RENDERIZADAS, self.hash_arquivo(pdf_path), numero, dpi, grayscale)
+
+    def chave_processada(self, pdf_path, numero, dpi, grayscale, chave_processamento):
+        return self.chave(CAMADA_PROCESSADAS, self.hash_arquivo(pdf_path), numero, dpi, grayscale,
+                          chave_processamento)
+
+    def _caminho(self, chave, extensao=EXTENSAO_PAGINA):
+        return super()._caminho(chave, extensao)
+
+    def registrar(self, camada, acerto):
+        with self._lock:
+            self.estatisticas[camada]["acertos" if acerto else "falhas"] += 1
+
+    def obter(self, chave, camada=CAMADA_PROCESSADAS):
+        """Retorna a página guardada (PIL) ou None, contabilizando acerto ou falha"""
+        caminho = self._caminho(chave)
+        try:
+            with Image.open(caminho) as guardada:
+                pagina = guardada.copy()
+            # Marca o acesso para a remoção por tempo sem uso (LRU)
+            os.utime(caminho)
+        except (OSError, ValueError):
+            self.registrar(camada, False)
+            return None
+        self.registrar(camada, True)
+        return pagina
+
+    def guardar(self, chave, pagina):
+        """Guarda a página; a gravação é atômica para ser segura entre processos"""
+        if pagina.mode not in ("L", "RGB"):
+            pagina = pagina.convert("RGB")
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        pagina.save(temporario, format="PNG", compress_level=NIVEL_COMPRESSAO)
+        os.replace(temporario, caminho)
+        self._adicionar_tamanho(os.path.getsize(caminho))
+
+    def obter_total_paginas(self, pdf_path):
+        """Número de páginas guardado para o PDF, ou None"""
+        try:
+            with open(self._caminho(self.hash_arquivo(pdf_path), ".json"), encoding="utf-8") as f:
+                return json.load(f)["paginas"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def guardar_total_paginas(self, pdf_path, total):
+        caminho = self._caminho(self.hash_arquivo(pdf_path), ".json")
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"paginas": total}, f)
+        os.replace(temporario, caminho)
+
+    def _guardado(self, raiz, nome):
+        return nome.endswith((EXTENSAO_PAGINA, EXTENSAO_ANTIGA)) and super()._guardado(raiz, nome)
+
+    def _adicionar_tamanho(self, tamanho):
+        with self._lock:
+            if self._bytes_novos is not None:
+                self._bytes_novos += tamanho
+                return
+        super()._adicionar_tamanho(tamanho)
+
+    def relatorio(self):
+        """Acertos e falhas por camada e ocupação atual do cache"""
+        return {"camadas": {camada: dict(contagem) for camada, contagem in self.estatisticas.items()},
+                "bytes": self.tamanho(), "tamanho_maximo": self.tamanho_maximo}
@@ -0,0 +1,204 @@
+import functools
+import inspect
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager, suppress
+
+try:
+    import fcntl
+except ImportError:  # Windows: a exclusão fica restrita ao processo atual
+    fcntl = None
+
+try:
+    from .cache_disco import CacheDisco
+except ImportError:
+    from cache_disco import CacheDisco
+
+# Tamanho máximo padrão do cache de arquivos gerados
+TAMANHO_MAXIMO_PADRAO = 5 * 1024 ** 3
+
+# Variável de ambiente com a pasta do cache, usada pelos scripts chamados pelo Laravel
+VARIAVEL_DIRETORIO = "MARCA_CACHE_SAIDA"
+
+
+class CacheSaida(CacheDisco):
+    def __init__(self, diretorio, tamanho_maximo=TAMANHO_MAXIMO_PADRAO):
+        """
+        Cache em disco dos arquivos com marca d'água, endereçado pelo conteúdo da entrada e da marca
+        :param diretorio: Pasta onde os arquivos são guardados (criada se não existir)
+        :param tamanho_maximo: Limite em bytes; os arquivos usados há mais tempo são removidos primeiro
+        """
+        super().__init__(diretorio, tamanho_maximo)
+        os.makedirs(os.path.join(diretorio, "travas"), exist_ok=True)
+        self._travas = {}
+        self.estatisticas = {"acertos": 0, "falhas": 0, "aguardados": 0}
+
+    def __getstate__(self):
+        # Permite enviar o cache aos processos de um pool (travas e contadores ficam no processo atual)
+        estado = super().__getstate__()
+        estado["_travas"] = {}
+        return estado
+
+    @classmethod
+    def do_ambiente(cls):
+        """Cache configurado pela variável de ambiente MARCA_CACHE_SAIDA, ou None"""
+        diretorio = os.environ.get(VARIAVEL_DIRETORIO)
+        return cls(diretorio) if diretorio else None
+
+    def chave_processamento(self, metodo, versao, entrada, marca_path, opacidade, output_path,
+                            args=(), opcoes=()):
+        """Chave do arquivo gerado por um método de processamento a partir do conteúdo da entrada e da marca"""
+        return self.chave(metodo, versao, self.hash_arquivo(entrada), self.hash_arquivo(marca_path), opacidade,
+                          os.path.splitext(output_path)[1].lower(), tuple(args), list(opcoes))
+
+    def _registrar(self, evento):
+        with self._lock:
+            self.estatisticas[evento] += 1
+
+    def copiar(self, chave, output_path):
+        """Copia o arquivo guardado para output_path; retorna False se ele não estiver no cache"""
+        caminho = self._caminho(chave, os.path.splitext(output_path)[1].lower())
+        try:
+            shutil.copyfile(caminho, output_path)
+            # Marca o acesso para a remoção por tempo sem uso (LRU)
+            os.utime(caminho)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def guardar(self, chave, arquivo):
+        """Guarda uma cópia do arquivo gerado; a gravação é atômica para ser segura entre processos"""
+        caminho = self._caminho(chave, os.path.splitext(arquivo)[1].lower())
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(arquivo, temporario)
+        os.replace(temporario, caminho)
+        self._adicionar_tamanho(os.path.getsize(caminho))
+
+    @contextmanager
+    def _exclusivo(self, chave):
+        """Garante que apenas um gerador por chave execute, entre threads e (com fcntl) entre processos"""
+        with self._lock:
+            trava = self._travas.setdefault(chave, [threading.Lock(), 0])
+            trava[1] += 1
+        try:
+            with trava[0]:
+                caminho_trava = os.path.join(self.diretorio, "travas", chave + ".lock")
+                arquivo_trava = _abrir_trava(caminho_trava)
+                try:
+                    yield
+                finally:
+                    # O arquivo é removido ainda travado: quem esperava por ele percebe que foi
+                    # substituído e trava um novo, então a pasta não acumula um arquivo por chave
+                    if fcntl is not None:
+                        with suppress(OSError):
+                            os.remove(caminho_trava)
+                    arquivo_trava.close()
+                    if fcntl is None:
+                        with suppress(OSError):
+                            os.remove(caminho_trava)
+        finally:
+            with self._lock:
+                trava[1] -= 1
+                if trava[1] == 0:
+                    del self._travas[chave]
+
+    def obter_ou_gerar(self, chave, output_path, gerar):
+        """
+        Entrega o arquivo guardado em output_path ou o gera uma única vez, mesmo com pedidos simultâneos
+        :param gerar: Função que recebe o caminho onde o arquivo deve ser gerado (com a extensão da saída)
+        :return: O retorno de gerar, ou None quando o arquivo veio do cache
+        """
+        if self.copiar(chave, output_path):
+            self._registrar("acertos")
+            return None
+
+        extensao = os.path.splitext(output_path)[1].lower()
+        caminho = self._caminho(chave, extensao)
+        with self._exclusivo(chave):
+            # Outro pedido pode ter gerado o arquivo enquanto este aguardava
+            if self.copiar(chave, output_path):
+                self._registrar("aguardados")
+                return None
+            self._registrar("falhas")
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            temporario = os.path.join(os.path.dirname(caminho), f"{chave}.{uuid.uuid4().hex}.tmp{extensao}")
+            try:
+                resultado = gerar(temporario)
+                os.replace(temporario, caminho)
+            finally:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+            shutil.copyfile(caminho, output_path)
+        self._adicionar_tamanho(os.path.getsize(caminho))
+        return resultado
+
+    def _guardado(self, raiz, nome):
+        return os.path.basename(raiz) != "travas" and super()._guardado(raiz, nome)
+
+    def relatorio(self):
+        """Acertos, falhas, pedidos que aguardaram outro e ocupação atual do cache"""
+        with self._lock:
+            estatisticas = dict(self.estatisticas)
+        return {"estatisticas": estatisticas, "bytes": self.tamanho(), "tamanho_maximo": self.tamanho_maximo}
+
+
+def _abrir_trava(caminho):
+    """
+    Abre e trava (com fcntl) o arquivo de trava; se ele tiver sido removido por quem o liberou
+    enquanto este processo esperava, trava o arquivo novo
+    :return: Arquivo aberto; fechá-lo libera a trava
+    """
+    while True:
+        arquivo = open(caminho, "a+b")
+        if fcntl is None:
+            return arquivo
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            atual = os.stat(caminho)
+        except FileNotFoundError:
+            atual = None
+        aberto = os.fstat(arquivo.fileno())
+        if atual is not None and (atual.st_dev, atual.st_ino) == (aberto.st_dev, aberto.st_ino):
+            return arquivo
+        arquivo.close()
+
+
+def com_cache_saida(versao, ignorar=()):
+    """
+    Decorador para métodos (entrada, output_path, ...) de processadores com os atributos
+    cache_saida, marca_dagua_path e opacidade. A chave combina o método, a versão do resultado,
+    o conteúdo da entrada e da marca, a opacidade, a extensão da saída e os demais argumentos.
+    :param versao: Altere quando o resultado do método mudar, para invalidar o cache
+    :param ignorar: Argumentos que não alteram o arquivo gerado (ex.: exibição de progresso), passados
+                    por posição ou por nome
+    """
+    def decorador(metodo):
+        assinatura = inspect.signature(metodo)
+        # self, entrada e output_path entram na chave pelo conteúdo, não pelo valor
+        fixos = list(assinatura.parameters)[:3]
+
+        def chave(self, entrada, output_path, *args, **kwargs):
+            # Os argumentos são normalizados por nome, com os valores padrão: a mesma chamada
+            # gera a mesma chave, seja o argumento passado por posição, por nome ou omitido
+            argumentos = assinatura.bind(self, entrada, output_path, *args, **kwargs)
+            argumentos.apply_defaults()
+            opcoes = sorted((nome, valor) for nome, valor in argumentos.arguments.items()
+                            if nome not in fixos and nome not in ignorar)
+            return self.cache_saida.chave_processamento(metodo.__name__, versao, entrada, self.marca_dagua_path,
+                                                        self.opacidade, output_path, (), opcoes)
+
+        @functools.wraps(metodo)
+        def envolvido(self, entrada, output_path, *args, **kwargs):
+            cache = self.cache_saida
+            if cache is None:
+                return metodo(self, entrada, output_path, *args, **kwargs)
+            return cache.obter_ou_gerar(chave(self, entrada, output_path, *args, **kwargs), output_path,
+                                        lambda temporario: metodo(self, entrada, temporario, *args, **kwargs))
+
+        # A mesma chave, para quem gera o resultado por outro caminho (ex.: vídeo dividido em segmentos)
+        envolvido.chave_cache = chave
+        return envolvido
+    return decorador
@@ -0,0 +1,174 @@
+"""
+Carimbo vetorial da marca d'água em PDFs.
+
+A marca é incorporada uma única vez no arquivo como XObject de imagem, com a opacidade em
+uma SMask. Cada página recebe apenas um pequeno fluxo de conteúdo que desenha esse XObject
+por cima do conteúdo original (q ... cm /MarcaDagua Do Q), sem renderizar a página: texto
+e vetores são preservados e o arquivo cresce apenas o tamanho da marca, que é reduzida ao maior
+tamanho em que aparece nas páginas (na resolução DPI_MARCA).
+"""
+import math
+
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject,
+                           NumberObject)
+
+# Fração da largura e da altura visíveis da página ocupada pela marca (mesma do modo rasterizado)
+ESCALA_PADRAO = 0.3
+NOME_MARCA = "/MarcaDagua"
+# Resolução da marca incorporada (a mesma das páginas renderizadas no modo rasterizado)
+DPI_MARCA = 200
+
+
+def _stream(writer, dados, extras=None, comprimir=True):
+    stream = DecodedStreamObject()
+    stream.set_data(dados)
+    if comprimir:
+        stream = stream.flate_encode()
+    for chave, valor in (extras or {}).items():
+        stream[NameObject(chave)] = valor
+    return writer._add_object(stream)
+
+
+def incorporar_marca(writer, marca):
+    """
+    Adiciona a marca (PIL RGBA, já com a opacidade aplicada no alfa) ao PDF como XObject de imagem
+    :return: Referência indireta do XObject
+    """
+    largura, altura = marca.size
+    comuns = {"/Type": NameObject("/XObject"), "/Subtype": NameObject("/Image"),
+              "/Width": NumberObject(largura), "/Height": NumberObject(altura),
+              "/BitsPerComponent": NumberObject(8)}
+    smask = _stream(writer, marca.getchannel("A").tobytes(),
+                    dict(comuns, **{"/ColorSpace": NameObject("/DeviceGray")}))
+    return _stream(writer, marca.convert("RGB").tobytes(),
+                   dict(comuns, **{"/ColorSpace": NameObject("/DeviceRGB"), "/SMask": smask}))
+
+
+def matriz_marca(pagina, largura, altura, escala=ESCALA_PADRAO):
+    """
+    Matriz (cm) que desenha a imagem da marca centralizada na área visível da página, com a
+    mesma proporção e na posição correta mesmo em páginas com /Rotate
+    """
+    caixa = pagina.cropbox
+    rotacao = pagina.rotation % 360
+    largura_pagina, altura_pagina = float(caixa.width), float(caixa.height)
+    if rotacao in (90, 270):
+        largura_pagina, altura_pagina = altura_pagina, largura_pagina
+
+    ratio = min(largura_pagina * escala / largura, altura_pagina * escala / altura)
+    largura_marca, altura_marca = largura * ratio, altura * ratio
+
+    # A página é exibida girada no sentido horário; a marca é girada no sentido contrário
+    angulo = math.radians(rotacao)
+    cos, sen = round(math.cos(angulo)), round(math.sin(angulo))
+    a, b = largura_marca * cos, largura_marca * sen
+    c, d = -altura_marca * sen, altura_marca * cos
+    centro_x = float(caixa.left) + float(caixa.width) / 2
+    centro_y = float(caixa.bottom) + float(caixa.height) / 2
+    return a, b, c, d, centro_x - (a + c) / 2, centro_y - (b + d) / 2
+
+
+def reduzir_marca(marca, largura_pontos, dpi=DPI_MARCA):
+    """
+    Reduz a marca à largura em pixels com que ela é desenhada na resolução dpi; marcas que já
+    são menores ficam como estão
+    :param largura_pontos: Maior largura (em pontos, 1/72 pol.) em que a marca é desenhada
+    """
+    largura = max(1, math.ceil(largura_pontos * dpi / 72))
+    if largura >= marca.size[0]:
+        return marca
+    altura = max(1, round(marca.size[1] * largura / marca.size[0]))
+    # Reduz com o alfa pré-multiplicado para as bordas transparentes não escurecerem a marca
+    return marca.convert("RGBa").resize((largura, altura), Image.LANCZOS).convert("RGBA")
+
+
+def _nome_livre(xobjects, marca_ref):
+    """Nome do recurso da marca que não colide com os XObjects já existentes na página"""
+    nome, numero = NOME_MARCA, 1
+    while nome in xobjects and xobjects.raw_get(nome) != marca_ref:
+        numero += 1
+        nome = f"{NOME_MARCA}{numero}"
+    return nome
+
+
+def _numero(valor):
+    # Operandos em notação decimal (o PDF não aceita expoente)
+    texto = f"{valor:.4f}".rstrip("0").rstrip(".")
+    return "0" if texto in ("", "-0") else texto
+
+
+def _recursos(pagina):
+    """Dicionário de recursos da página, incluindo o herdado da árvore de páginas"""
+    no = pagina
+    while no is not None:
+        if "/Resources" in no:
+            return no["/Resources"].get_object()
+        pai = no.get("/Parent")
+        no = pai.get_object() if pai is not None else None
+    recursos = DictionaryObject()
+    pagina[NameObject("/Resources")] = recursos
+    return recursos
+
+
+def _conteudos(writer, pagina):
+    """Referências indiretas dos fluxos de conteúdo atuais da página"""
+    conteudo = pagina.get("/Contents")
+    if conteudo is None:
+        return []
+    resolvido = conteudo.get_object()
+    itens = list(resolvido) if isinstance(resolvido, ArrayObject) else [conteudo]
+    return [item if isinstance(item, IndirectObject) else writer._add_object(item) for item in itens]
+
+
+def carimbar_pdf(pdf, output_path, marca, escala=ESCALA_PADRAO, primeira_pagina=None, ultima_pagina=None,
+                 dpi=DPI_MARCA):
+    """
+    Desenha a marca d'água sobre todas as páginas do PDF sem rasterizá-las
+    :param pdf: Caminho do PDF ou PdfReader já aberto
+    :param marca: Imagem PIL RGBA da marca, com a opacidade já aplicada no alfa
+    :param escala: Fração da página ocupada pela marca
+    :param dpi: Resolução da marca incorporada no maior tamanho em que é desenhada
+    :param primeira_pagina, ultima_pagina: Intervalo de páginas (base 1, inclusivo) levado à saída
+    :return: Número de páginas
+    """
+    reader = pdf if isinstance(pdf, PdfReader) else PdfReader(pdf)
+    if primeira_pagina is None and ultima_pagina is None:
+        writer = PdfWriter(clone_from=reader)
+    else:
+        writer = PdfWriter()
+        primeira = 1 if primeira_pagina is None else primeira_pagina
+        writer.append(reader, pages=(primeira - 1, len(reader.pages) if ultima_pagina is None else ultima_pagina))
+    # Largura (em pontos) com que a marca é desenhada em cada página
+    larguras = [math.hypot(*matriz_marca(pagina, *marca.size, escala=escala)[:2]) for pagina in writer.pages]
+    marca = reduzir_marca(marca, max(larguras, default=0), dpi)
+    marca_ref = incorporar_marca(writer, marca)
+
+    # O conteúdo original fica entre q/Q para que mudanças de estado não afetem a marca;
+    # a abertura é a mesma para todas as páginas e os fechamentos são compartilhados por geometria
+    abertura = _stream(writer, b"q\n", comprimir=False)
+    fechamentos = {}
+
+    for pagina in writer.pages:
+        recursos = _recursos(pagina)
+        xobjects = recursos.get("/XObject")
+        if xobjects is None:
+            xobjects = DictionaryObject()
+            recursos[NameObject("/XObject")] = xobjects
+        xobjects = xobjects.get_object()
+        nome = _nome_livre(xobjects, marca_ref)
+        xobjects[NameObject(nome)] = marca_ref
+
+        matriz = tuple(round(valor, 4) for valor in matriz_marca(pagina, *marca.size, escala=escala))
+        if (matriz, nome) not in fechamentos:
+            operadores = " ".join(_numero(valor) for valor in matriz)
+            fechamentos[(matriz, nome)] = _stream(
+                writer, f"\nQ\nq {operadores} cm {nome} Do Q\n".encode("ascii"), comprimir=False)
+
+        pagina[NameObject("/Contents")] = ArrayObject(
+            [abertura] + _conteudos(writer, pagina) + [fechamentos[(matriz, nome)]])
+
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return len(writer.pages)
@@ -0,0 +1,132 @@
+"""
+Cliente do serviço de marca d'água, com a mesma linha de comando dos scripts:
+
+    python cliente_marca.py arquivo_entrada arquivo_saida marca_dagua [--profile perfil.json]
+
+Envia o trabalho para o servico_marca.py em execução; se o serviço não estiver no ar (conexão
+recusada), processa o arquivo neste mesmo processo. Com a fila do serviço cheia, tenta de novo com
+espera crescente e, se continuar cheia, termina com o código 75 (tente novamente mais tarde) em vez
+de disputar a CPU com o serviço. A URL do serviço pode ser alterada pela variável de ambiente
+MARCA_SERVICO_URL; no processamento local, MARCA_CACHE_SAIDA ativa o cache de saída.
+O --profile vale para o processamento local; no serviço, o perfil fica em /metricas.
+"""
+import http.client
+import json
+import os
+import sys
+import time
+import urllib.parse
+
+URL_PADRAO = "http://127.0.0.1:8765"
+TIMEOUT_CONEXAO = 2  # Segundos para concluir que o serviço não está no ar
+TENTATIVAS_FILA_CHEIA = 5  # Envios enquanto o serviço responde 503
+ESPERA_FILA_CHEIA = 1.0    # Espera antes do segundo envio, dobrada a cada tentativa
+CODIGO_TENTAR_NOVAMENTE = 75  # EX_TEMPFAIL: o trabalho pode ser reenviado
+
+
+class ServicoOcupado(Exception):
+    """A fila do serviço continuou cheia em todas as tentativas"""
+
+
+def _conectar(url):
+    """
+    Abre a conexão com o serviço; só a conexão tem tempo limite, o do processamento é
+    controlado pelo serviço
+    :raises OSError: Se o serviço não estiver no ar
+    """
+    partes = urllib.parse.urlsplit(url)
+    conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=TIMEOUT_CONEXAO)
+    conexao.connect()
+    conexao.sock.settimeout(None)
+    return conexao
+
+
+def _espera(retry_after, padrao):
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return padrao
+
+
+def enviar(url, entrada, saida, marca, tentativas=TENTATIVAS_FILA_CHEIA):
+    """
+    Envia o trabalho ao serviço, sem consulta prévia: a conexão recusada indica que ele não está
+    no ar. Com a fila cheia (503), reenvia após uma espera crescente (ou a do Retry-After)
+    :return: Resposta em JSON, ou None se o serviço não estiver no ar
+    :raises ServicoOcupado: Se a fila continuar cheia em todas as tentativas
+    :raises OSError, http.client.HTTPException: Se a conexão cair depois de aceita
+    """
+    corpo = json.dumps({"entrada": os.path.abspath(entrada), "saida": os.path.abspath(saida),
+                        "marca": os.path.abspath(marca)}).encode("utf-8")
+    espera = ESPERA_FILA_CHEIA
+    for tentativa in range(tentativas):
+        try:
+            conexao = _conectar(url)
+        except OSError:
+            return None
+        try:
+            conexao.request("POST", "/processar", corpo, {"Content-Type": "application/json"})
+            resposta = conexao.getresponse()
+            status, dados = resposta.status, resposta.read()
+            retry_after = resposta.getheader("Retry-After")
+        finally:
+            conexao.close()
+        if status != 503:
+            try:
+                return json.loads(dados)
+            except ValueError:
+                return {"status": "erro", "erro": f"Resposta inválida do serviço (HTTP {status})"}
+        if tentativa + 1 < tentativas:
+            time.sleep(_espera(retry_after, espera))
+            espera *= 2
+    raise ServicoOcupado("Fila do serviço cheia; tente novamente mais tarde")
+
+
+def processar_localmente(entrada, saida, marca, perfil=None):
+    from cache_saida import CacheSaida
+    cache_saida = CacheSaida.do_ambiente()
+    if entrada.lower().endswith(".mp4"):
+        from adicionar_marca_video import AdicionarMarcaVideo
+        processador = AdicionarMarcaVideo(marca_dagua_path=marca, opacidade=0.3, cache_saida=cache_saida,
+                                          perfil=perfil)
+        processador.processar_videos([(entrada, saida)])
+    else:
+        from adicionar_marca import AdicionarMarcaDagua, processar_arquivo
+        processador = AdicionarMarcaDagua(marca_dagua_path=marca, opacidade=0.3, cache_saida=cache_saida,
+                                          perfil=perfil)
+        processar_arquivo(processador, entrada, saida)
+
+
+def main():
+    from instrumentacao import Perfil, separar_perfil
+    argumentos, arquivo_perfil = separar_perfil(sys.argv)
+    if len(argumentos) != 4:
+        print("Uso: python cliente_marca.py arquivo_entrada arquivo_saida marca_dagua [--profile perfil.json]")
+        sys.exit(1)
+    entrada, saida, marca = argumentos[1:4]
+
+    try:
+        resposta = enviar(os.environ.get("MARCA_SERVICO_URL", URL_PADRAO), entrada, saida, marca)
+    except ServicoOcupado as e:
+        print(e, file=sys.stderr)
+        sys.exit(CODIGO_TENTAR_NOVAMENTE)
+    except (OSError, http.client.HTTPException) as e:
+        print(f"Falha na comunicação com o serviço: {e}", file=sys.stderr)
+        sys.exit(1)
+    if resposta is None:
+        perfil = Perfil() if arquivo_perfil else None
+        try:
+            processar_localmente(entrada, saida, marca, perfil)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if perfil is not None:
+                perfil.salvar(arquivo_perfil)
+        return
+    if resposta.get("status") != "ok":
+        print(resposta.get("erro", "Erro ao processar arquivo"), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Gravação de PDFs de imagens em uma única passada: cada página é escrita no arquivo assim que
+chega e só a tabela de referências (xref) e a árvore de páginas ficam para o final.
+
+O append=True do Pillow acrescenta uma atualização incremental por página, que regrava a árvore
+de páginas inteira a cada vez: tempo e tamanho crescem com o quadrado do número de páginas.
+O save_all do Pillow evita isso, mas exige todas as páginas em memória ao mesmo tempo.
+"""
+import io
+import zlib
+from PIL import Image, features
+from pypdf import PdfReader
+
+# Resolução usada para o tamanho da página em pontos (a mesma do Pillow sem "resolution")
+RESOLUCAO_PADRAO = 72.0
+
+
+def _dicionario(valores):
+    return "<< " + " ".join(f"/{chave} {valor}" for chave, valor in valores.items()) + " >>"
+
+
+def _texto_pdf(objeto):
+    """Objeto do pypdf na sintaxe do PDF"""
+    saida = io.BytesIO()
+    objeto.write_to_stream(saida)
+    return saida.getvalue().decode("latin-1")
+
+
+def _g4(pagina):
+    """
+    Dados CCITT G4 da página em modo "1", extraídos da faixa única do TIFF gerado pelo Pillow,
+    ou None se o libtiff não estiver disponível
+    """
+    if not features.check("libtiff"):
+        return None
+    largura, altura = pagina.size
+    tiff = io.BytesIO()
+    pagina.save(tiff, "TIFF", compression="group4", tiffinfo={278: altura})
+    with Image.open(tiff) as lida:
+        deslocamentos = lida.tag_v2.get(273)
+        tamanhos = lida.tag_v2.get(279)
+    if not deslocamentos or len(deslocamentos) != 1:
+        return None
+    dados = tiff.getvalue()
+    return dados[deslocamentos[0]:deslocamentos[0] + tamanhos[0]]
+
+
+def usa_jpeg(pagina):
+    """Indica se a página é gravada em JPEG (as páginas de 1 bit vão em CCITT G4)"""
+    return pagina.mode != "1"
+
+
+def codificar_imagem(pagina, qualidade=75):
+    """
+    Codifica a página como XObject de imagem do PDF. A qualidade só se aplica às páginas em JPEG
+    (o Pillow recusa "quality" em outras compressões)
+    :return: (dados do stream, entradas do dicionário da imagem, ProcSet)
+    """
+    largura, altura = pagina.size
+    entradas = {"Type": "/XObject", "Subtype": "/Image", "Width": largura, "Height": altura}
+    if not usa_jpeg(pagina):
+        entradas.update(ColorSpace="/DeviceGray", BitsPerComponent=1)
+        dados = _g4(pagina)
+        if dados is not None:
+            entradas.update(Filter="/CCITTFaxDecode",
+                            DecodeParms=f"<< /K -1 /BlackIs1 true /Columns {largura} /Rows {altura} >>")
+        else:
+            # 1 bit por pixel com o branco em 1, como o DeviceGray espera
+            dados = zlib.compress(pagina.tobytes())
+            entradas["Filter"] = "/FlateDecode"
+        return dados, entradas, "/ImageB"
+
+    if pagina.mode not in ("L", "RGB"):
+        pagina = pagina.convert("RGB")
+    jpeg = io.BytesIO()
+    pagina.save(jpeg, "JPEG", quality=qualidade)
+    entradas.update(ColorSpace="/DeviceGray" if pagina.mode == "L" else "/DeviceRGB",
+                    BitsPerComponent=8, Filter="/DCTDecode")
+    return jpeg.getvalue(), entradas, "/ImageB" if pagina.mode == "L" else "/ImageC"
+
+
+class EscritorPDF:
+    def __init__(self, arquivo, resolucao=RESOLUCAO_PADRAO):
+        """
+        PDF gravado página a página em um arquivo aberto em modo binário
+        :param resolucao: Pixels por polegada usados para o tamanho das páginas
+        """
+        self.arquivo = arquivo
+        self.resolucao = resolucao
+        self.posicao = 0
+        self.deslocamentos = {}
+        self.paginas = []
+        self._escrever(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        # 1 = catálogo, 2 = árvore de páginas (gravada no final, quando as páginas são conhecidas)
+        self._proximo = 3
+        self._objeto(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+    def _escrever(self, dados):
+        self.arquivo.write(dados)
+        self.posicao += len(dados)
+
+    def _objeto(self, numero, dicionario, stream=None):
+        self.deslocamentos[numero] = self.posicao
+        if stream is None:
+            self._escrever(f"{numero} 0 obj\n{dicionario}\nendobj\n".encode("latin-1"))
+            return
+        self._escrever(f"{numero} 0 obj\n{dicionario[:-2]}/Length {len(stream)} >>\nstream\n".encode("latin-1"))
+        self._escrever(stream)
+        self._escrever(b"\nendstream\nendobj\n")
+
+    def adicionar_pagina(self, pagina, qualidade=75):
+        """
+        Grava a página (imagem PIL) ocupando a página inteira do PDF
+        :return: Bytes gravados para a página
+        """
+        dados, entradas, procset = codificar_imagem(pagina, qualidade)
+        largura = pagina.size[0] * 72.0 / self.resolucao
+        altura = pagina.size[1] * 72.0 / self.resolucao
+        return self._gravar_pagina(dados, entradas, procset, largura, altura)
+
+    def copiar_pagina(self, caminho):
+        """
+        Copia a página de um PDF gravado por salvar_pagina_pdf sem decodificar a imagem: o stream
+        já codificado é repassado como está e só essa página fica em memória
+        :return: Bytes gravados para a página
+        """
+        pagina = PdfReader(caminho).pages[0]
+        recursos = pagina["/Resources"]
+        imagem = recursos["/XObject"]["/image"].get_object()
+        entradas = {chave[1:]: _texto_pdf(valor) for chave, valor in imagem.items() if chave != "/Length"}
+        procset = next(nome for nome in recursos["/ProcSet"] if nome != "/PDF")
+        return self._gravar_pagina(imagem._data, entradas, procset,
+                                   float(pagina.mediabox.width), float(pagina.mediabox.height))
+
+    def _gravar_pagina(self, dados, entradas, procset, largura, altura):
+        inicio = self.posicao
+        imagem, conteudo, numero = self._proximo, self._proximo + 1, self._proximo + 2
+        self._proximo += 3
+
+        self._objeto(imagem, _dicionario(entradas), dados)
+        self._objeto(conteudo, "<< >>", f"q {largura:g} 0 0 {altura:g} 0 0 cm /image Do Q".encode("ascii"))
+        self._objeto(numero, _dicionario({
+            "Type": "/Page", "Parent": "2 0 R", "MediaBox": f"[0 0 {largura:g} {altura:g}]",
+            "Resources": f"<< /ProcSet [/PDF {procset}] /XObject << /image {imagem} 0 R >> >>",
+            "Contents": f"{conteudo} 0 R",
+        }))
+        self.paginas.append(numero)
+        return self.posicao - inicio
+
+    def fechar(self):
+        """Grava a árvore de páginas, a tabela de referências e o trailer"""
+        kids = " ".join(f"{numero} 0 R" for numero in self.paginas)
+        self._objeto(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.paginas)} >>")
+        xref = self.posicao
+        linhas = [f"xref\n0 {self._proximo}\n", "0000000000 65535 f \n"]
+        linhas += [f"{self.deslocamentos[numero]:010d} 00000 n \n" for numero in range(1, self._proximo)]
+        linhas.append(f"trailer\n<< /Size {self._proximo} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self._escrever("".join(linhas).encode("ascii"))
+
+
+def salvar_pagina_pdf(pagina, caminho, qualidade=75):
+    """
+    Grava uma única página como PDF
+    :return: Tamanho do arquivo gravado
+    """
+    with open(caminho, "wb") as f:
+        escritor = EscritorPDF(f)
+        escritor.adicionar_pagina(pagina, qualidade)
+        escritor.fechar()
+        return escritor.posicao
@@ -0,0 +1,253 @@
+"""
+Medição por etapa do processamento: tempo de relógio e de CPU, histograma de latência por
+página ou frame, pico de memória (RSS) e bytes lidos e gravados.
+
+    perfil = Perfil()
+    with perfil.etapa("renderizar"):
+        ...
+    perfil.salvar("perfil.json")
+
+Sem um Perfil ativo os processadores usam PERFIL_INATIVO, cujas etapas são um contexto vazio
+compartilhado: o custo é o de uma chamada de método por etapa.
+"""
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows: sem pico de memória
+    resource = None
+
+# Limites superiores (ms) das faixas do histograma de latência; a última faixa é aberta
+FAIXAS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_CONTEXTO_VAZIO = nullcontext()
+
+
+def pico_rss_mb():
+    """Maior memória residente do processo e dos filhos já encerrados (poppler, ffmpeg), em MB"""
+    if resource is None:
+        return None
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(max(proprio, filhos) / divisor, 1)
+
+
+def _cpu_filhos():
+    if resource is None:
+        return 0.0
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+def _nova_etapa():
+    return {"chamadas": 0, "relogio": 0.0, "cpu": 0.0, "cpu_filhos": 0.0, "maximo": 0.0,
+            "faixas": [0] * (len(FAIXAS_MS) + 1)}
+
+
+class _Medicao:
+    __slots__ = ("perfil", "nome", "relogio_cpu", "relogio", "cpu", "cpu_filhos")
+
+    def __init__(self, perfil, nome, processo):
+        self.perfil = perfil
+        self.nome = nome
+        self.relogio_cpu = time.process_time if processo else time.thread_time
+
+    def __enter__(self):
+        self.cpu_filhos = _cpu_filhos()
+        self.cpu = self.relogio_cpu()
+        self.relogio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        relogio = time.perf_counter() - self.relogio
+        self.perfil.registrar(self.nome, relogio, self.relogio_cpu() - self.cpu,
+                              _cpu_filhos() - self.cpu_filhos)
+        return False
+
+
+class Perfil:
+    def __init__(self, ativo=True, ao_registrar=None):
+        """
+        Acumula as medições das etapas de um ou mais trabalhos
+        :param ativo: Com False, todas as operações são nulas
+        :param ao_registrar: Função chamada com um dicionário a cada etapa medida ou bytes contados
+                             (ganchos do executor de trabalhos, métricas em tempo real)
+        """
+        self.ativo = ativo
+        self.ao_registrar = ao_registrar
+        self._lock = threading.Lock()
+        self.etapas = {}
+        self.bytes = {"lidos": 0, "gravados": 0}
+        self.inicio = time.perf_counter()
+
+    def __getstate__(self):
+        # Enviado aos processos de um pool sem a trava e sem o gancho; os resultados voltam por exportar()
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        estado["ao_registrar"] = None
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def etapa(self, nome, processo=False):
+        """
+        Contexto que mede uma execução da etapa (uma página, um frame, uma gravação...)
+        :param processo: Conta a CPU de todas as threads do processo (etapas que criam threads);
+                         por padrão conta só a da thread atual, o que vale para etapas simultâneas
+        """
+        if not self.ativo:
+            return _CONTEXTO_VAZIO
+        return _Medicao(self, nome, processo)
+
+    def registrar(self, nome, relogio, cpu=0.0, cpu_filhos=0.0):
+        """Registra uma execução já medida da etapa (em segundos)"""
+        if not self.ativo:
+            return
+        milissegundos = relogio * 1000
+        faixa = next((indice for indice, limite in enumerate(FAIXAS_MS) if milissegundos <= limite),
+                     len(FAIXAS_MS))
+        with self._lock:
+            etapa = self.etapas.get(nome)
+            if etapa is None:
+                etapa = self.etapas[nome] = _nova_etapa()
+            etapa["chamadas"] += 1
+            etapa["relogio"] += relogio
+            etapa["cpu"] += cpu
+            etapa["cpu_filhos"] += cpu_filhos
+            etapa["maximo"] = max(etapa["maximo"], relogio)
+            etapa["faixas"][faixa] += 1
+        if self.ao_registrar is not None:
+            self.ao_registrar({"etapa": nome, "relogio": relogio, "cpu": cpu, "cpu_filhos": cpu_filhos})
+
+    def contar_bytes(self, lidos=0, gravados=0):
+        if not self.ativo:
+            return
+        with self._lock:
+            self.bytes["lidos"] += lidos
+            self.bytes["gravados"] += gravados
+        if self.ao_registrar is not None:
+            self.ao_registrar({"bytes_lidos": lidos, "bytes_gravados": gravados})
+
+    def contar_arquivos(self, entrada=None, saida=None):
+        """Soma o tamanho dos arquivos de entrada e de saída que existirem"""
+        if not self.ativo:
+            return
+        self.contar_bytes(os.path.getsize(entrada) if entrada and os.path.exists(entrada) else 0,
+                          os.path.getsize(saida) if saida and os.path.exists(saida) else 0)
+
+    def exportar(self):
+        """Medições acumuladas, para mesclar no Perfil de outro processo"""
+        with self._lock:
+            return {"etapas": {nome: dict(etapa, faixas=list(etapa["faixas"]))
+                               for nome, etapa in self.etapas.items()},
+                    "bytes": dict(self.bytes)}
+
+    def mesclar(self, dados):
+        """Soma as medições exportadas por um processo do pool"""
+        if not self.ativo or not dados:
+            return
+        with self._lock:
+            for nome, outra in dados["etapas"].items():
+                etapa = self.etapas.get(nome)
+                if etapa is None:
+                    etapa = self.etapas[nome] = _nova_etapa()
+                for campo in ("chamadas", "relogio", "cpu", "cpu_filhos"):
+                    etapa[campo] += outra[campo]
+                etapa["maximo"] = max(etapa["maximo"], outra["maximo"])
+                etapa["faixas"] = [a + b for a, b in zip(etapa["faixas"], outra["faixas"])]
+            for campo in ("lidos", "gravados"):
+                self.bytes[campo] += dados["bytes"][campo]
+
+    def relatorio(self):
+        """Relatório em formato serializável (JSON)"""
+        etapas = {}
+        for nome, etapa in self.exportar()["etapas"].items():
+            chamadas = etapa["chamadas"]
+            maximo_ms = etapa["maximo"] * 1000
+            etapas[nome] = {
+                "chamadas": chamadas,
+                "relogio_s": round(etapa["relogio"], 4),
+                "cpu_s": round(etapa["cpu"], 4),
+                "cpu_filhos_s": round(etapa["cpu_filhos"], 4),
+                "media_ms": round(etapa["relogio"] * 1000 / chamadas, 3) if chamadas else 0.0,
+                "maximo_ms": round(maximo_ms, 3),
+                "p50_ms": _percentil(etapa["faixas"], chamadas, 0.5, maximo_ms),
+                "p95_ms": _percentil(etapa["faixas"], chamadas, 0.95, maximo_ms),
+                "p99_ms": _percentil(etapa["faixas"], chamadas, 0.99, maximo_ms),
+                "histograma_ms": {_rotulo(indice): quantidade
+                                  for indice, quantidade in enumerate(etapa["faixas"]) if quantidade},
+            }
+        return {"total_s": round(time.perf_counter() - self.inicio, 4), "etapas": etapas,
+                "bytes": dict(self.bytes), "pico_rss_mb": pico_rss_mb()}
+
+    def salvar(self, caminho):
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(self.relatorio(), f, indent=2, ensure_ascii=False)
+
+
+def _rotulo(indice):
+    return f"<={FAIXAS_MS[indice]}" if indice < len(FAIXAS_MS) else f">{FAIXAS_MS[-1]}"
+
+
+def _percentil(faixas, total, fracao, maximo_ms):
+    """
+    Limite superior da faixa que contém o percentil (o histograma não guarda as amostras);
+    na faixa aberta, e sempre que for menor, vale o máximo observado
+    """
+    if not total:
+        return None
+    alvo = math.ceil(fracao * total)
+    acumulado = 0
+    for indice, quantidade in enumerate(faixas):
+        acumulado += quantidade
+        if acumulado >= alvo:
+            break
+    limite = FAIXAS_MS[indice] if indice < len(FAIXAS_MS) else maximo_ms
+    return round(min(limite, maximo_ms), 3)
+
+
+PERFIL_INATIVO = Perfil(ativo=False)
+
+
+def medir_etapa(nome):
+    """
+    Decorador para métodos (entrada, output_path, ...) de processadores com o atributo perfil:
+    mede a chamada como a etapa `nome` e conta os bytes da entrada e da saída
+    """
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        def envolvido(self, entrada, output_path, *args, **kwargs):
+            perfil = self.perfil
+            if not perfil.ativo:
+                return metodo(self, entrada, output_path, *args, **kwargs)
+            with perfil.etapa(nome, processo=True):
+                resultado = metodo(self, entrada, output_path, *args, **kwargs)
+            perfil.contar_arquivos(entrada, output_path)
+            return resultado
+        return envolvido
+    return decorador
+
+
+def separar_perfil(argv):
+    """
+    Retira "--profile ARQUIVO.json" dos argumentos posicionais dos scripts chamados pelo Laravel
+    :return: (argumentos restantes, caminho do relatório ou None)
+    """
+    argv = list(argv)
+    if "--profile" not in argv:
+        return argv, None
+    posicao = argv.index("--profile")
+    if posicao + 1 >= len(argv):
+        return argv[:posicao], "perfil.json"
+    return argv[:posicao] + argv[posicao + 2:], argv[posicao + 1]
@@ -0,0 +1,491 @@
+"""
+Marca d'água em DOCX e XLSX reescrevendo apenas as partes necessárias do pacote (zip).
+
+O python-docx e o openpyxl carregam o documento inteiro em objetos Python só para adicionar
+uma imagem no cabeçalho ou na planilha. Aqui o zip é percorrido em fluxo: as partes que não
+mudam são repassadas ainda comprimidas, sem descomprimir e comprimir de novo; o document.xml
+e as planilhas são copiados em fluxo até o ponto de inserção, e apenas cabeçalhos, desenhos,
+relações e tipos de conteúdo são reescritos.
+O custo cresce com o número de seções e planilhas, não com o tamanho do documento.
+
+Pacotes fora do formato esperado (prefixos de namespace incomuns, por exemplo) levantam
+FormatoNaoSuportado, para que o chamador use o caminho completo.
+"""
+import copy
+import posixpath
+import re
+import struct
+import zipfile
+
+TAMANHO_BLOCO = 1024 * 1024
+EMU_POR_PIXEL = 9525
+
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+NS_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+REL_IMAGEM = NS_R + "/image"
+REL_CABECALHO = NS_R + "/header"
+REL_DESENHO = NS_R + "/drawing"
+REL_PLANILHA = NS_R + "/worksheet"
+TIPO_CABECALHO = "application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"
+TIPO_DESENHO = "application/vnd.openxmlformats-officedocument.drawing+xml"
+
+# Elementos que vêm depois de <drawing> na ordem do esquema de CT_Worksheet
+DEPOIS_DO_DESENHO = ("legacyDrawing", "legacyDrawingHF", "drawingHF", "picture", "oleObjects",
+                     "controls", "webPublishItems", "tableParts", "extLst")
+
+_ATRIBUTO = re.compile(rb'([\w:]+)="([^"]*)"')
+_ID_DESENHO = re.compile(rb'<(?:\w+:)?(?:docPr|cNvPr)\b[^>]*?\sid="(\d+)"')
+# Partes do DOCX, além do document.xml, que podem ter desenhos (os ids de docPr são únicos no documento)
+_PARTES_COM_DESENHOS = re.compile(r"word/(?:header|footer|footnotes|endnotes|comments)[^/]*\.xml$")
+
+
+class FormatoNaoSuportado(Exception):
+    """O pacote não segue o formato esperado pela reescrita em fluxo"""
+
+
+# ---------------------------------------------------------------------------
+# Utilitários do pacote
+# ---------------------------------------------------------------------------
+
+def _sem_zip64(extra):
+    """Campos extras da entrada sem o ZIP64 (id 1), que o zipfile recria ao gravar"""
+    campos, posicao = [], 0
+    while posicao + 4 <= len(extra):
+        tipo, tamanho = struct.unpack("<HH", extra[posicao:posicao + 4])
+        if tipo != 1:
+            campos.append(extra[posicao:posicao + 4 + tamanho])
+        posicao += 4 + tamanho
+    return b"".join(campos)
+
+
+def _copiar_parte(origem, destino, info):
+    """
+    Repassa a parte sem descomprimir: os bytes comprimidos, o CRC e os tamanhos originais são
+    copiados para o destino em blocos, com um novo cabeçalho local
+    """
+    if info.flag_bits & 0x1:
+        raise FormatoNaoSuportado(f"{info.filename} criptografado")
+    copia = copy.copy(info)
+    # CRC e tamanhos já são conhecidos e vão no cabeçalho local, sem descritor de dados depois
+    copia.flag_bits &= ~0x8
+    copia.extra = _sem_zip64(info.extra)
+    with origem._lock, destino._lock:
+        origem.fp.seek(info.header_offset)
+        cabecalho = origem.fp.read(zipfile.sizeFileHeader)
+        if len(cabecalho) != zipfile.sizeFileHeader or cabecalho[:4] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Cabeçalho local inválido em {info.filename}")
+        campos = struct.unpack(zipfile.structFileHeader, cabecalho)
+        origem.fp.seek(campos[zipfile._FH_FILENAME_LENGTH] + campos[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+
+        destino.fp.seek(destino.start_dir)
+        copia.header_offset = destino.fp.tell()
+        destino.fp.write(copia.FileHeader())
+        restante = info.compress_size
+        while restante:
+            bloco = origem.fp.read(min(restante, TAMANHO_BLOCO))
+            if not bloco:
+                raise zipfile.BadZipFile(f"{info.filename} truncado")
+            destino.fp.write(bloco)
+            restante -= len(bloco)
+        destino.start_dir = destino.fp.tell()
+        destino.filelist.append(copia)
+        destino.NameToInfo[copia.filename] = copia
+        destino._didModify = True
+
+
+def _escrever(destino, nome, dados):
+    destino.writestr(zipfile.ZipInfo(nome, (1980, 1, 1, 0, 0, 0)), dados, compress_type=zipfile.ZIP_DEFLATED)
+
+
+def _caminho_rels(parte):
+    pasta, nome = posixpath.split(parte)
+    return posixpath.join(pasta, "_rels", nome + ".rels")
+
+
+def _relacoes(dados, parte):
+    """{Id: (Type, parte de destino)} de um arquivo .rels, com os destinos resolvidos a partir da parte"""
+    relacoes = {}
+    for elemento in re.findall(rb"<Relationship\b[^>]*>", dados or b""):
+        atributos = {chave.decode(): valor.decode() for chave, valor in _ATRIBUTO.findall(elemento)}
+        if atributos.get("TargetMode") == "External":
+            continue
+        alvo = atributos.get("Target", "")
+        if alvo.startswith("/"):
+            alvo = alvo.lstrip("/")
+        else:
+            alvo = posixpath.normpath(posixpath.join(posixpath.dirname(parte), alvo))
+        relacoes[atributos.get("Id")] = (atributos.get("Type"), alvo)
+    return relacoes
+
+
+def _id_livre(dados, base="rIdMarcaDagua"):
+    existentes = set(re.findall(rb'Id="([^"]*)"', dados or b""))
+    numero = 1
+    while f"{base}{numero}".encode() in existentes:
+        numero += 1
+    return f"{base}{numero}"
+
+
+def _adicionar_relacao(dados, id_relacao, tipo, alvo):
+    """Acrescenta a relação ao .rels (criando o arquivo se dados for None)"""
+    relacao = f'<Relationship Id="{id_relacao}" Type="{tipo}" Target="{alvo}"/>'.encode()
+    if dados is None:
+        return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<Relationships xmlns="{NS_RELS}">').encode() + relacao + b"</Relationships>"
+    posicao = dados.rfind(b"</Relationships>")
+    if posicao < 0:
+        raise FormatoNaoSuportado("Arquivo de relações inválido")
+    return dados[:posicao] + relacao + dados[posicao:]
+
+
+def _tipos_de_conteudo(dados, substituicoes):
+    """Garante o tipo padrão de PNG e acrescenta os Overrides das partes novas"""
+    extras = b""
+    if not re.search(rb'Extension="png"', dados, re.IGNORECASE):
+        extras += b'<Default Extension="png" ContentType="image/png"/>'
+    for parte, tipo in substituicoes:
+        extras += f'<Override PartName="/{parte}" ContentType="{tipo}"/>'.encode()
+    posicao = dados.rfind(b"</Types>")
+    if posicao < 0:
+        raise FormatoNaoSuportado("[Content_Types].xml inválido")
+    return dados[:posicao] + extras + dados[posicao:]
+
+
+def _nome_livre(nomes, modelo):
+    numero = 1
+    while modelo.format(numero) in nomes:
+        numero += 1
+    return modelo.format(numero)
+
+
+def _fim_elemento(dados, inicio, nome):
+    """Posição logo após o fechamento do elemento que começa em `inicio`, ou None se ainda não chegou"""
+    profundidade = 0
+    for marca in re.compile(rb"<(/?)" + re.escape(nome) + rb"(?=[\s>/])[^>]*>").finditer(dados, inicio):
+        if marca.group(1):
+            profundidade -= 1
+        elif not marca.group(0).endswith(b"/>"):
+            profundidade += 1
+        if profundidade == 0:
+            return marca.end()
+    return None
+
+
+def _maior_id(dados):
+    """Maior id de docPr/cNvPr (propriedades dos desenhos) no XML, ou 0"""
+    return max((int(numero) for numero in _ID_DESENHO.findall(dados)), default=0)
+
+
+class _LeitorIds:
+    """Repassa a leitura do XML guardando o maior id de desenho encontrado no caminho"""
+
+    def __init__(self, entrada):
+        self.entrada = entrada
+        self.maior = 0
+        self._resto = b""
+
+    def read(self, tamanho=-1):
+        bloco = self.entrada.read(tamanho)
+        dados = self._resto + bloco
+        self.maior = max(self.maior, _maior_id(dados))
+        # Uma tag cortada no fim do bloco é examinada de novo com o bloco seguinte
+        abertura = dados.rfind(b"<")
+        self._resto = dados[abertura:] if abertura >= 0 and b">" not in dados[abertura:] else b""
+        return bloco
+
+
+def _reescrever_elementos(entrada, saida, nome, transformar):
+    """
+    Copia o XML em fluxo, substituindo cada elemento `nome` (completo, com filhos) pelo
+    retorno de transformar(bytes do elemento); só o elemento em questão fica em memória
+    """
+    abertura = re.compile(b"<" + re.escape(nome) + rb"(?=[\s>/])")
+    pendente = b""
+    while True:
+        bloco = entrada.read(TAMANHO_BLOCO)
+        pendente += bloco
+        while True:
+            encontrado = abertura.search(pendente)
+            if encontrado is None:
+                break
+            fim = _fim_elemento(pendente, encontrado.start(), nome)
+            saida.write(pendente[:encontrado.start()])
+            pendente = pendente[encontrado.start():]
+            if fim is None:
+                break
+            fim -= encontrado.start()
+            saida.write(transformar(pendente[:fim]))
+            pendente = pendente[fim:]
+        if not bloco:
+            if abertura.match(pendente):
+                raise FormatoNaoSuportado(f"Elemento {nome.decode()} incompleto")
+            saida.write(pendente)
+            return
+        if not abertura.match(pendente):
+            # Guarda o final do bloco, que pode conter o início de uma tag
+            corte = max(0, len(pendente) - len(nome) - 2)
+            saida.write(pendente[:corte])
+            pendente = pendente[corte:]
+
+
+# ---------------------------------------------------------------------------
+# DOCX
+# ---------------------------------------------------------------------------
+
+def _paragrafo_imagem(id_relacao, largura_emu, altura_emu, id_desenho):
+    return (
+        '<w:p><w:r><w:drawing>'
+        '<wp:inline distT="0" distB="0" distL="0" distR="0" '
+        'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+        'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+        'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture" '
+        f'xmlns:r="{NS_R}">'
+        f'<wp:extent cx="{largura_emu}" cy="{altura_emu}"/>'
+        f'<wp:docPr id="{id_desenho}" name="Marca d&apos;água {id_desenho}"/>'
+        '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+        '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        '<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name="marca_dagua.png"/><pic:cNvPicPr/></pic:nvPicPr>'
+        f'<pic:blipFill><a:blip r:embed="{id_relacao}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+        f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{largura_emu}" cy="{altura_emu}"/></a:xfrm>'
+        '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr></pic:pic>'
+        '</a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+    ).encode("utf-8")
+
+
+def marcar_docx(doc_path, output_path, png, tamanho_px, largura_emu):
+    """
+    Adiciona a imagem no cabeçalho padrão de todas as seções do DOCX sem carregar o documento
+    :param png: Marca d'água codificada em PNG
+    :param tamanho_px: (largura, altura) da imagem, para manter a proporção
+    :param largura_emu: Largura da imagem no cabeçalho, em EMU
+    """
+    altura_emu = round(largura_emu * tamanho_px[1] / tamanho_px[0])
+    with zipfile.ZipFile(doc_path) as origem, \
+            zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as destino:
+        nomes = set(origem.namelist())
+        documento = "word/document.xml"
+        rels_documento = _caminho_rels(documento)
+        if documento not in nomes:
+            raise FormatoNaoSuportado("Pacote sem word/document.xml")
+        dados_rels = origem.read(rels_documento) if rels_documento in nomes else None
+        relacoes = _relacoes(dados_rels, documento)
+
+        midia = _nome_livre(nomes, "word/media/marca_dagua{}.png")
+        cabecalho_novo = _nome_livre(nomes, "word/header_marca_dagua{}.xml")
+        id_cabecalho = _id_livre(dados_rels)
+        referencia = (f'<w:headerReference xmlns:r="{NS_R}" w:type="default" '
+                      f'r:id="{id_cabecalho}"/>').encode()
+        cabecalhos_existentes = set()
+        secoes_sem_cabecalho = []
+
+        def transformar(sectpr):
+            padrao = re.search(rb'<w:headerReference\b[^>]*w:type="default"[^>]*>', sectpr)
+            if padrao:
+                id_existente = re.search(rb'r:id="([^"]+)"', padrao.group(0))
+                if id_existente is None or id_existente.group(1).decode() not in relacoes:
+                    raise FormatoNaoSuportado("Referência de cabeçalho desconhecida")
+                cabecalhos_existentes.add(relacoes[id_existente.group(1).decode()][1])
+                return sectpr
+            # headerReference é o primeiro filho de sectPr na ordem do esquema
+            secoes_sem_cabecalho.append(True)
+            abertura = re.match(rb"<w:sectPr\b[^>]*?(/?)>", sectpr)
+            if abertura.group(1):
+                return sectpr[:abertura.end() - 2] + b">" + referencia + b"</w:sectPr>"
+            return sectpr[:abertura.end()] + referencia + sectpr[abertura.end():]
+
+        # O document.xml vai primeiro: é nele que se descobre quais cabeçalhos mudam
+        with origem.open(documento) as entrada:
+            if not re.search(rb"<w:document[\s>]", entrada.read(4096)):
+                raise FormatoNaoSuportado("document.xml sem o prefixo w:")
+        info_documento = origem.getinfo(documento)
+        with origem.open(info_documento) as entrada, destino.open(info_documento, "w") as saida:
+            leitor = _LeitorIds(entrada)
+            _reescrever_elementos(leitor, saida, b"w:sectPr", transformar)
+        # Os novos desenhos recebem ids depois do maior já usado no documento
+        proximo_id = max([leitor.maior] + [_maior_id(origem.read(nome)) for nome in sorted(nomes)
+                                           if _PARTES_COM_DESENHOS.match(nome)]) + 1
+
+        substituicoes = []
+        novas_partes = {}
+        if secoes_sem_cabecalho:
+            # Um único cabeçalho compartilhado por todas as seções que não tinham o seu
+            rels_cabecalho = _caminho_rels(cabecalho_novo)
+            id_imagem = _id_livre(None)
+            novas_partes[cabecalho_novo] = (
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<w:hdr xmlns:w="{NS_W}" xmlns:r="{NS_R}">').encode() + \
+                _paragrafo_imagem(id_imagem, largura_emu, altura_emu, proximo_id) + b"</w:hdr>"
+            novas_partes[rels_cabecalho] = _adicionar_relacao(
+                None, id_imagem, REL_IMAGEM, posixpath.relpath(midia, posixpath.dirname(cabecalho_novo)))
+            dados_rels = _adicionar_relacao(dados_rels, id_cabecalho, REL_CABECALHO,
+                                            posixpath.relpath(cabecalho_novo, "word"))
+            substituicoes.append((cabecalho_novo, TIPO_CABECALHO))
+
+        # Cabeçalhos que já existiam recebem a imagem em um novo parágrafo
+        modificadas = {}
+        for numero, cabecalho in enumerate(sorted(cabecalhos_existentes), 1):
+            rels_cabecalho = _caminho_rels(cabecalho)
+            dados_cab_rels = origem.read(rels_cabecalho) if rels_cabecalho in nomes else None
+            id_imagem = _id_livre(dados_cab_rels)
+            modificadas[rels_cabecalho] = _adicionar_relacao(
+                dados_cab_rels, id_imagem, REL_IMAGEM, posixpath.relpath(midia, posixpath.dirname(cabecalho)))
+            dados_cabecalho = origem.read(cabecalho)
+            posicao = dados_cabecalho.rfind(b"</w:hdr>")
+            if posicao < 0:
+                raise FormatoNaoSuportado(f"{cabecalho} sem o prefixo w:")
+            paragrafo = _paragrafo_imagem(id_imagem, largura_emu, altura_emu, proximo_id + numero)
+            modificadas[cabecalho] = dados_cabecalho[:posicao] + paragrafo + dados_cabecalho[posicao:]
+        if dados_rels is not None:
+            modificadas[rels_documento] = dados_rels
+
+        _finalizar(origem, destino, {documento}, modificadas, novas_partes, midia, png, substituicoes)
+
+
+# ---------------------------------------------------------------------------
+# XLSX
+# ---------------------------------------------------------------------------
+
+def _ancora(id_relacao, largura_emu, altura_emu, id_forma, prefixo=b"xdr:"):
+    p = prefixo.decode()
+    return (
+        f'<{p}oneCellAnchor xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+        f'<{p}from><{p}col>1</{p}col><{p}colOff>0</{p}colOff><{p}row>1</{p}row><{p}rowOff>0</{p}rowOff></{p}from>'
+        f'<{p}ext cx="{largura_emu}" cy="{altura_emu}"/>'
+        f'<{p}pic><{p}nvPicPr><{p}cNvPr id="{id_forma}" name="Marca d&apos;água"/>'
+        f'<{p}cNvPicPr><a:picLocks noChangeAspect="1"/></{p}cNvPicPr></{p}nvPicPr>'
+        f'<{p}blipFill><a:blip xmlns:r="{NS_R}" r:embed="{id_relacao}"/>'
+        f'<a:stretch><a:fillRect/></a:stretch></{p}blipFill>'
+        f'<{p}spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{largura_emu}" cy="{altura_emu}"/></a:xfrm>'
+        f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></{p}spPr></{p}pic>'
+        f'<{p}clientData/></{p}oneCellAnchor>'
+    ).encode("utf-8")
+
+
+def _marcar_planilha(entrada, saida, id_desenho):
+    """
+    Copia a planilha em fluxo até o fim de sheetData e insere <drawing> na posição do esquema
+    :return: Id da relação do desenho que a planilha já tinha, ou None se o novo foi inserido
+    """
+    inicio = entrada.read(4096)
+    raiz = re.search(rb"<(\w+:)?worksheet[\s>]", inicio)
+    if raiz is None:
+        raise FormatoNaoSuportado("Planilha sem o elemento worksheet")
+    prefixo = raiz.group(1) or b""
+    fim_dados = re.compile(b"</" + re.escape(prefixo) + b"sheetData>|<" + re.escape(prefixo) + rb"sheetData\s*/>")
+
+    # sheetData (quase todo o arquivo) é repassado sem ser interpretado
+    pendente = inicio
+    while True:
+        encontrado = fim_dados.search(pendente)
+        if encontrado:
+            saida.write(pendente[:encontrado.end()])
+            cauda = pendente[encontrado.end():] + entrada.read()
+            break
+        bloco = entrada.read(TAMANHO_BLOCO)
+        if not bloco:
+            raise FormatoNaoSuportado("Planilha sem sheetData")
+        corte = max(0, len(pendente) - 32)
+        saida.write(pendente[:corte])
+        pendente = pendente[corte:] + bloco
+
+    existente = re.search(b"<" + re.escape(prefixo) + rb"drawing\b[^>]*>", cauda)
+    if existente:
+        id_existente = re.search(rb'r:id="([^"]+)"', existente.group(0))
+        if id_existente is None:
+            raise FormatoNaoSuportado("Desenho da planilha sem r:id")
+        saida.write(cauda)
+        return id_existente.group(1).decode()
+
+    nomes = b"|".join(re.escape(prefixo + nome.encode()) for nome in DEPOIS_DO_DESENHO)
+    seguinte = re.search(b"<(?:" + nomes + rb")[\s>/]|</" + re.escape(prefixo) + b"worksheet>", cauda)
+    if seguinte is None:
+        raise FormatoNaoSuportado("Planilha sem fechamento")
+    elemento = f'<{prefixo.decode()}drawing xmlns:r="{NS_R}" r:id="{id_desenho}"/>'.encode()
+    saida.write(cauda[:seguinte.start()] + elemento + cauda[seguinte.start():])
+    return None
+
+
+def marcar_xlsx(excel_path, output_path, png, tamanho_px):
+    """
+    Ancora a imagem na célula B2 de todas as planilhas do XLSX sem carregar a pasta de trabalho
+    :param png: Marca d'água codificada em PNG
+    :param tamanho_px: (largura, altura) da imagem em pixels
+    """
+    largura_emu, altura_emu = tamanho_px[0] * EMU_POR_PIXEL, tamanho_px[1] * EMU_POR_PIXEL
+    with zipfile.ZipFile(excel_path) as origem, \
+            zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as destino:
+        nomes = set(origem.namelist())
+        workbook = "xl/workbook.xml"
+        rels_workbook = _caminho_rels(workbook)
+        if rels_workbook not in nomes:
+            raise FormatoNaoSuportado("Pacote sem xl/_rels/workbook.xml.rels")
+        planilhas = [alvo for tipo, alvo in _relacoes(origem.read(rels_workbook), workbook).values()
+                     if tipo == REL_PLANILHA and alvo in nomes]
+
+        midia = _nome_livre(nomes, "xl/media/marca_dagua{}.png")
+        substituicoes = []
+        novas_partes = {}
+        modificadas = {}
+        usados = set(nomes)
+        for planilha in planilhas:
+            rels_planilha = _caminho_rels(planilha)
+            dados_rels = origem.read(rels_planilha) if rels_planilha in nomes else None
+            id_desenho = _id_livre(dados_rels)
+            info = origem.getinfo(planilha)
+            with origem.open(info) as entrada, destino.open(info, "w") as saida:
+                id_existente = _marcar_planilha(entrada, saida, id_desenho)
+
+            if id_existente is None:
+                # Desenho novo só com a marca
+                desenho = _nome_livre(usados, "xl/drawings/drawing_marca_dagua{}.xml")
+                usados.add(desenho)
+                modificadas[rels_planilha] = _adicionar_relacao(
+                    dados_rels, id_desenho, REL_DESENHO, posixpath.relpath(desenho, posixpath.dirname(planilha)))
+                novas_partes[desenho] = (
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    '<xdr:wsDr xmlns:xdr="http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing">'
+                ).encode() + _ancora("rId1", largura_emu, altura_emu, 1) + b"</xdr:wsDr>"
+                novas_partes[_caminho_rels(desenho)] = _adicionar_relacao(
+                    None, "rId1", REL_IMAGEM, posixpath.relpath(midia, posixpath.dirname(desenho)))
+                substituicoes.append((desenho, TIPO_DESENHO))
+                continue
+
+            # A planilha já tinha um desenho: a marca é acrescentada a ele
+            relacao = _relacoes(dados_rels, planilha).get(id_existente)
+            if relacao is None or relacao[1] not in nomes:
+                raise FormatoNaoSuportado("Desenho da planilha não encontrado")
+            desenho = relacao[1]
+            rels_desenho = _caminho_rels(desenho)
+            if desenho in modificadas:
+                continue  # Desenho compartilhado por mais de uma planilha, já marcado
+            dados_desenho = origem.read(desenho)
+            dados_rels_desenho = origem.read(rels_desenho) if rels_desenho in nomes else None
+            fechamento = re.search(rb"</(\w+:)?wsDr>", dados_desenho)
+            if fechamento is None:
+                raise FormatoNaoSuportado(f"{desenho} inválido")
+            id_imagem = _id_livre(dados_rels_desenho)
+            modificadas[rels_desenho] = _adicionar_relacao(
+                dados_rels_desenho, id_imagem, REL_IMAGEM, posixpath.relpath(midia, posixpath.dirname(desenho)))
+            ancora = _ancora(id_imagem, largura_emu, altura_emu, _maior_id(dados_desenho) + 1,
+                             fechamento.group(1) or b"")
+            modificadas[desenho] = dados_desenho[:fechamento.start()] + ancora + dados_desenho[fechamento.start():]
+
+        _finalizar(origem, destino, set(planilhas), modificadas, novas_partes, midia, png, substituicoes)
+
+
+def _finalizar(origem, destino, escritas, modificadas, novas_partes, midia, png, substituicoes):
+    """Repassa as demais partes, grava as alteradas e as novas, a mídia e os tipos de conteúdo"""
+    for info in origem.infolist():
+        if info.filename in escritas:
+            continue
+        if info.filename == "[Content_Types].xml":
+            _escrever(destino, info.filename, _tipos_de_conteudo(origem.read(info), substituicoes))
+        elif info.filename in modificadas:
+            _escrever(destino, info.filename, modificadas.pop(info.filename))
+        else:
+            _copiar_parte(origem, destino, info)
+    # Partes alteradas que não existiam no pacote original (ex.: .rels novos) e as partes novas
+    for nome, dados in list(modificadas.items()) + list(novas_partes.items()):
+        _escrever(destino, nome, dados)
+    _escrever(destino, midia, png)
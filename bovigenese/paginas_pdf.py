@@ -0,0 +1,495 @@
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+try:
+    from .cache_paginas import CAMADA_PROCESSADAS, CAMADA_RENDERIZADAS
+    from .escritor_pdf import EscritorPDF, usa_jpeg
+    from .instrumentacao import PERFIL_INATIVO, Perfil
+    from .trabalho_pdf import TrabalhoPDF, intervalo_paginas
+except ImportError:
+    from cache_paginas import CAMADA_PROCESSADAS, CAMADA_RENDERIZADAS
+    from escritor_pdf import EscritorPDF, usa_jpeg
+    from instrumentacao import PERFIL_INATIVO, Perfil
+    from trabalho_pdf import TrabalhoPDF, intervalo_paginas
+
+# Número padrão de páginas renderizadas por vez pelo poppler
+JANELA_PADRAO = 4
+
+# Codificações de saída das páginas
+CODIFICACAO_ORIGINAL = "original"  # Como a página chega (RGB vira JPEG padrão do Pillow)
+CODIFICACAO_AUTO = "auto"          # Escolhe por página entre as opções abaixo
+CODIFICACAO_BINARIA = "binaria"    # 1 bit, CCITT G4
+CODIFICACAO_CINZA = "cinza"        # 8 bits em escala de cinza, JPEG
+CODIFICACAO_JPEG = "jpeg"          # Colorida, JPEG com a qualidade escolhida
+CODIFICACOES = (CODIFICACAO_ORIGINAL, CODIFICACAO_AUTO, CODIFICACAO_BINARIA,
+                CODIFICACAO_CINZA, CODIFICACAO_JPEG)
+
+# Limites usados pela escolha automática
+LIMITE_CROMA = 24            # Diferença entre canais a partir da qual o pixel é considerado colorido
+LIMITE_COLORIDOS = 0.001     # Fração de pixels coloridos que obriga a saída colorida
+LIMITE_INTERMEDIARIOS = 0.02 # Fração de tons intermediários tolerada na saída binária
+
+
+class ProcessamentoCancelado(Exception):
+    """O processamento foi interrompido a pedido do usuário"""
+
+
+def contar_paginas(pdf_path, poppler_path=None, cache=None):
+    """Retorna o número de páginas do PDF sem renderizá-lo (consultando o cache, se houver)"""
+    if cache is not None:
+        total = cache.obter_total_paginas(pdf_path)
+        if total is not None:
+            return total
+    info = pdfinfo_from_path(pdf_path, poppler_path=poppler_path)
+    total = int(info["Pages"])
+    if cache is not None:
+        cache.guardar_total_paginas(pdf_path, total)
+    return total
+
+
+def renderizar_paginas(pdf_path, dpi=200, poppler_path=None, janela=JANELA_PADRAO,
+                       grayscale=False):
+    """
+    Renderiza o PDF página a página, mantendo no máximo `janela` páginas em memória
+    :param pdf_path: Caminho do PDF de entrada
+    :param dpi: Resolução da renderização
+    :param poppler_path: Pasta dos binários do poppler (None usa o PATH)
+    :param janela: Quantidade de páginas renderizadas em cada chamada ao poppler
+    :param grayscale: Renderiza em escala de cinza (modo "L") em vez de RGB
+    """
+    total = contar_paginas(pdf_path, poppler_path)
+    for inicio in range(1, total + 1, janela):
+        fim = min(inicio + janela - 1, total)
+        imagens = convert_from_path(pdf_path, dpi=dpi, first_page=inicio, last_page=fim,
+                                    poppler_path=poppler_path, grayscale=grayscale)
+        while imagens:
+            # Retira a página da lista para que ela possa ser liberada logo após o uso
+            yield imagens.pop(0)
+
+
+def _processar(processar_pagina, pagina, numero, com_numero):
+    return processar_pagina(pagina, numero) if com_numero else processar_pagina(pagina)
+
+
+def _obter_processada(cache, pdf_path, numero, dpi, grayscale, chave_processamento):
+    """Página já processada guardada no cache, ou None"""
+    if cache is None or chave_processamento is None:
+        return None
+    return cache.obter(cache.chave_processada(pdf_path, numero, dpi, grayscale, chave_processamento),
+                       CAMADA_PROCESSADAS)
+
+
+def _guardar_processada(cache, pdf_path, numero, dpi, grayscale, chave_processamento, pagina):
+    if cache is not None and chave_processamento is not None:
+        cache.guardar(cache.chave_processada(pdf_path, numero, dpi, grayscale, chave_processamento),
+                      pagina)
+
+
+def _renderizar_faixa(pdf_path, numeros, dpi, poppler_path, grayscale, cache=None, perfil=PERFIL_INATIVO):
+    """
+    Obtém as páginas pedidas, primeiro no cache de renderizações e depois no poppler,
+    que é chamado uma única vez para o intervalo que cobre as páginas faltantes
+    :return: {número da página: imagem PIL}
+    """
+    paginas = {}
+    faltantes = []
+    for numero in numeros:
+        pagina = None
+        if cache is not None:
+            pagina = cache.obter(cache.chave_renderizada(pdf_path, numero, dpi, grayscale),
+                                 CAMADA_RENDERIZADAS)
+        if pagina is None:
+            faltantes.append(numero)
+        else:
+            paginas[numero] = pagina
+    if not faltantes:
+        return paginas
+
+    inicio, fim = min(faltantes), max(faltantes)
+    with perfil.etapa("renderizar"):
+        imagens = convert_from_path(pdf_path, dpi=dpi, first_page=inicio, last_page=fim,
+                                    poppler_path=poppler_path, grayscale=grayscale)
+    for numero, imagem in zip(range(inicio, fim + 1), imagens):
+        if numero not in faltantes:
+            imagem.close()
+            continue
+        if cache is not None:
+            cache.guardar(cache.chave_renderizada(pdf_path, numero, dpi, grayscale), imagem)
+        paginas[numero] = imagem
+    return paginas
+
+
+def _janelas(numeros, janela):
+    """Agrupa os números em janelas de até `janela` páginas consecutivas (uma chamada ao poppler cada)"""
+    atual = []
+    for numero in numeros:
+        if atual and (len(atual) == janela or numero != atual[-1] + 1):
+            yield atual
+            atual = []
+        atual.append(numero)
+    if atual:
+        yield atual
+
+
+def _paginas_sequenciais(pdf_path, processar_pagina, numeros_paginas, dpi, poppler_path, janela, grayscale,
+                         com_numero, cache, chave_processamento, perfil=PERFIL_INATIVO):
+    """Renderiza e processa as páginas pedidas no processo atual, janela a janela"""
+    for numeros in _janelas(numeros_paginas, janela):
+        prontas = {}
+        for numero in numeros:
+            pagina = _obter_processada(cache, pdf_path, numero, dpi, grayscale, chave_processamento)
+            if pagina is not None:
+                prontas[numero] = pagina
+        renderizadas = _renderizar_faixa(pdf_path, [n for n in numeros if n not in prontas],
+                                         dpi, poppler_path, grayscale, cache, perfil)
+        for numero in numeros:
+            if numero in prontas:
+                yield prontas.pop(numero)
+                continue
+            with perfil.etapa("processar_pagina"):
+                resultado = _processar(processar_pagina, renderizadas.pop(numero), numero, com_numero)
+            _guardar_processada(cache, pdf_path, numero, dpi, grayscale, chave_processamento, resultado)
+            yield resultado
+
+
+def _publicar_pagina(dados):
+    """
+    Copia a página para uma memória compartilhada nova e devolve o nome dela. O segmento é
+    retirado do resource_tracker deste processo: quem o libera é o processo principal, que o
+    registra ao abri-lo. Com os dois registros, o tracker avisava de um vazamento por página
+    """
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(create=True, size=dados.nbytes, track=False)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=dados.nbytes)
+    try:
+        np.ndarray(dados.shape, dtype=np.uint8, buffer=shm.buf)[...] = dados
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    if sys.version_info < (3, 13):
+        resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return shm.name
+
+
+def _processar_pagina_isolada(pdf_path, numero, dpi, poppler_path, grayscale, processar_pagina,
+                              com_numero=False, cache=None, chave_processamento=None, medir=False):
+    """
+    Executado em um processo do pool: renderiza e processa uma única página e devolve
+    o resultado em memória compartilhada, evitando serializar a imagem PIL inteira
+    :param medir: Mede as etapas da página para o Perfil do processo principal
+    :return: (nome da memória compartilhada, formato do array, renderização veio do cache,
+              bytes gravados no cache, medições exportadas ou None)
+    """
+    perfil = Perfil() if medir else PERFIL_INATIVO
+    renderizadas = _renderizar_faixa(pdf_path, [numero], dpi, poppler_path, grayscale, cache, perfil)
+    # O cache chega como cópia a cada tarefa, com os contadores zerados: refletem só esta página
+    acerto = cache is not None and cache.estatisticas[CAMADA_RENDERIZADAS]["acertos"] > 0
+    with perfil.etapa("processar_pagina"):
+        resultado = _processar(processar_pagina, renderizadas[numero], numero, com_numero)
+    _guardar_processada(cache, pdf_path, numero, dpi, grayscale, chave_processamento, resultado)
+    if resultado.mode not in ("L", "RGB"):
+        resultado = resultado.convert("RGB")
+
+    dados = np.asarray(resultado)
+    gravados = cache.bytes_novos if cache is not None else 0
+    return _publicar_pagina(dados), dados.shape, acerto, gravados, perfil.exportar() if medir else None
+
+
+def _ler_pagina_compartilhada(nome, forma):
+    """Reconstrói a página gravada por um processo do pool e libera a memória compartilhada"""
+    shm = shared_memory.SharedMemory(name=nome)
+    try:
+        dados = np.ndarray(forma, dtype=np.uint8, buffer=shm.buf)
+        pagina = Image.fromarray(dados)
+        if pagina.readonly:
+            # Modos como "L" apontam para o buffer em vez de copiá-lo
+            pagina = pagina.copy()
+        del dados
+    finally:
+        shm.close()
+        shm.unlink()
+    return pagina
+
+
+def _descartar_pagina_compartilhada(futuro):
+    """Libera a memória compartilhada de uma página que não será mais consumida"""
+    if futuro.cancel() or futuro.exception() is not None:
+        return
+    nome = futuro.result()[0]
+    shm = shared_memory.SharedMemory(name=nome)
+    shm.close()
+    shm.unlink()
+
+
+def processar_paginas_paralelo(pdf_path, processar_pagina, dpi=200, poppler_path=None,
+                               workers=None, grayscale=False, com_numero=False, cache=None,
+                               chave_processamento=None, perfil=PERFIL_INATIVO, numeros=None):
+    """
+    Renderiza e processa as páginas em um pool de processos, entregando-as na ordem original.
+    No máximo 2 páginas por processo ficam em andamento, o que limita o uso de memória.
+    :param processar_pagina: Função de nível de módulo (precisa ser serializável pelo pickle)
+    :param workers: Número de processos (None usa todos os núcleos)
+    :param com_numero: Chama processar_pagina(pagina, numero), com o número da página (base 1)
+    :param cache, chave_processamento, perfil: Ver processar_paginas_pdf
+    :param numeros: Páginas a processar, em ordem (padrão: todas)
+    """
+    if numeros is None:
+        numeros = range(1, contar_paginas(pdf_path, poppler_path, cache) + 1)
+    if not numeros:
+        return
+    workers = workers or os.cpu_count() or 1
+    pendentes = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            a_enviar = iter(numeros)
+            proxima = next(a_enviar, None)
+            while proxima is not None or pendentes:
+                while proxima is not None and len(pendentes) < 2 * workers:
+                    pronta = _obter_processada(cache, pdf_path, proxima, dpi, grayscale,
+                                               chave_processamento)
+                    if pronta is None:
+                        pendentes.append(executor.submit(_processar_pagina_isolada, pdf_path, proxima,
+                                                         dpi, poppler_path, grayscale, processar_pagina,
+                                                         com_numero, cache, chave_processamento,
+                                                         perfil.ativo))
+                    else:
+                        pendentes.append(pronta)
+                    proxima = next(a_enviar, None)
+                item = pendentes.popleft()
+                if isinstance(item, Image.Image):
+                    yield item
+                    continue
+                nome, forma, acerto, gravados, medicoes = item.result()
+                if cache is not None:
+                    cache.registrar(CAMADA_RENDERIZADAS, acerto)
+                    cache.contabilizar(gravados)
+                perfil.mesclar(medicoes)
+                yield _ler_pagina_compartilhada(nome, forma)
+        finally:
+            # Consumo interrompido (erro ou gerador fechado): não deixa memória compartilhada órfã
+            for item in pendentes:
+                if not isinstance(item, Image.Image):
+                    _descartar_pagina_compartilhada(item)
+
+
+def analisar_cores(pagina):
+    """
+    Mede o conteúdo de cor de uma página em uma amostra reduzida
+    :return: (fração de pixels coloridos, fração de tons intermediários entre preto e branco)
+    """
+    largura, altura = pagina.size
+    amostra = pagina.resize((max(1, largura // 4), max(1, altura // 4)), Image.NEAREST)
+    dados = np.asarray(amostra.convert("RGB") if amostra.mode != "L" else amostra)
+    if dados.ndim == 3:
+        croma = dados.max(axis=2).astype(np.int16) - dados.min(axis=2)
+        coloridos = float(np.count_nonzero(croma > LIMITE_CROMA)) / croma.size
+        cinza = np.asarray(amostra.convert("L"))
+    else:
+        coloridos = 0.0
+        cinza = dados
+    intermediarios = float(np.count_nonzero((cinza > 32) & (cinza < 224))) / cinza.size
+    return coloridos, intermediarios
+
+
+def codificar_pagina(pagina, codificacao=CODIFICACAO_AUTO):
+    """
+    Converte a página para o modo de imagem da codificação desejada
+    :return: (página convertida, codificação efetivamente usada, fração de tons intermediários)
+    """
+    if codificacao not in CODIFICACOES:
+        raise ValueError(f"Codificação desconhecida: {codificacao}")
+    if codificacao == CODIFICACAO_ORIGINAL:
+        return pagina, codificacao, None
+
+    coloridos, intermediarios = analisar_cores(pagina)
+    if codificacao == CODIFICACAO_AUTO:
+        if coloridos > LIMITE_COLORIDOS:
+            codificacao = CODIFICACAO_JPEG
+        elif intermediarios > LIMITE_INTERMEDIARIOS:
+            codificacao = CODIFICACAO_CINZA
+        else:
+            codificacao = CODIFICACAO_BINARIA
+
+    if codificacao == CODIFICACAO_BINARIA:
+        # Limiar simples (sem pontilhado) para manter o texto nítido e o G4 compacto
+        convertida = pagina.convert("L").convert("1", dither=Image.Dither.NONE)
+    elif codificacao == CODIFICACAO_CINZA:
+        convertida = pagina.convert("L")
+    else:
+        convertida = pagina.convert("RGB")
+    return convertida, codificacao, intermediarios
+
+
+def _registro_pagina(numero, codificacao, convertida, tamanho, qualidade, intermediarios):
+    """
+    :param convertida: Página como foi gravada; a qualidade só é registrada se ela foi para JPEG
+    :param tamanho: Bytes gravados para a página (imagem, conteúdo e objeto da página)
+    """
+    return {
+        "pagina": numero,
+        "codificacao": codificacao,
+        "bytes": tamanho,
+        "qualidade_jpeg": qualidade if usa_jpeg(convertida) else None,
+        "tons_intermediarios": intermediarios,
+    }
+
+
+def salvar_pdf_incremental(paginas, output_path, codificacao=CODIFICACAO_ORIGINAL,
+                           qualidade=75, relatorio=None, perfil=PERFIL_INATIVO, numeros=None):
+    """
+    Grava as páginas no PDF de saída em uma única passada, sem manter o documento inteiro em memória.
+    Cada página é escrita assim que chega; a árvore de páginas e a tabela de referências ficam para o final.
+    :param codificacao: Uma das CODIFICACOES ("auto" escolhe por página pelo conteúdo de cor)
+    :param qualidade: Qualidade JPEG das páginas em cinza ou coloridas
+    :param relatorio: Lista que recebe, por página, a codificação usada e os bytes gravados
+    :param perfil: Perfil que mede a codificação e a gravação de cada página
+    :param numeros: Número de cada página no documento original, para o relatório (padrão: 1, 2, ...)
+    :return: Número de páginas gravadas
+    """
+    total = 0
+    arquivo = None
+    try:
+        for pagina in paginas:
+            with perfil.etapa("gravar_pagina"):
+                convertida, escolhida, intermediarios = codificar_pagina(pagina, codificacao)
+                if arquivo is None:
+                    arquivo = open(output_path, "wb")
+                    escritor = EscritorPDF(arquivo)
+                tamanho = escritor.adicionar_pagina(convertida, qualidade)
+            if relatorio is not None:
+                relatorio.append(_registro_pagina(numeros[total] if numeros is not None else total + 1,
+                                                  escolhida, convertida, tamanho, qualidade,
+                                                  intermediarios))
+            if convertida is not pagina:
+                convertida.close()
+            pagina.close()
+            total += 1
+        if total == 0:
+            raise ValueError("O PDF não possui páginas para gravar")
+        escritor.fechar()
+    finally:
+        if arquivo is not None:
+            arquivo.close()
+    return total
+
+
+def salvar_paginas_trabalho(paginas, numeros, trabalho, codificacao=CODIFICACAO_ORIGINAL,
+                            qualidade=75, perfil=PERFIL_INATIVO):
+    """
+    Grava cada página como um PDF próprio no diretório do trabalho, marcando-a como concluída
+    assim que é gravada; uma interrupção perde no máximo as páginas em andamento
+    :param numeros: Número de cada página recebida no documento original
+    :param trabalho: trabalho_pdf.TrabalhoPDF
+    """
+    for numero, pagina in zip(numeros, paginas):
+        with perfil.etapa("gravar_pagina"):
+            convertida, escolhida, intermediarios = codificar_pagina(pagina, codificacao)
+            trabalho.gravar_pagina(numero, convertida, qualidade,
+                                   _registro_pagina(numero, escolhida, convertida, 0, qualidade, intermediarios))
+        if convertida is not pagina:
+            convertida.close()
+        pagina.close()
+
+
+def _acompanhar(paginas, total, progresso, cancelar, ja_prontas=0):
+    """
+    Repassa as páginas verificando o pedido de cancelamento e informando o progresso
+    :param ja_prontas: Páginas do total concluídas antes desta execução (trabalho retomado)
+    """
+    for concluidas, pagina in enumerate(paginas, ja_prontas + 1):
+        if cancelar is not None and cancelar.is_set():
+            pagina.close()
+            raise ProcessamentoCancelado("Processamento cancelado")
+        yield pagina
+        # Só chega aqui depois que a página foi gravada
+        if progresso is not None:
+            progresso(concluidas, total)
+
+
+def processar_paginas_pdf(pdf_path, output_path, processar_pagina, dpi=200,
+                          poppler_path=None, janela=JANELA_PADRAO, workers=1, grayscale=False,
+                          codificacao=CODIFICACAO_ORIGINAL, qualidade=75, relatorio=None,
+                          progresso=None, cancelar=None, com_numero=False, cache=None,
+                          chave_processamento=None, perfil=None, primeira_pagina=None,
+                          ultima_pagina=None, diretorio_trabalho=None):
+    """
+    Renderiza, processa e grava cada página do PDF em fluxo contínuo.
+    O pico de memória depende apenas do tamanho da janela, e não do número de páginas.
+    :param processar_pagina: Função que recebe uma página (PIL) e retorna a página processada
+    :param workers: Número de processos para renderizar e processar páginas em paralelo
+                    (1 processa tudo no processo atual, None usa todos os núcleos)
+    :param grayscale: Renderiza as páginas em escala de cinza
+    :param codificacao, qualidade, relatorio: Ver salvar_pdf_incremental
+    :param progresso: Função chamada como progresso(paginas_gravadas, total) após cada página
+    :param cancelar: threading.Event; quando sinalizado, interrompe com ProcessamentoCancelado
+    :param com_numero: Chama processar_pagina(pagina, numero), com o número da página (base 1)
+    :param cache: CachePaginas para reaproveitar renderizações e páginas processadas
+    :param chave_processamento: Identifica o processamento (função, parâmetros e versão);
+                                sem ela, apenas as renderizações são guardadas no cache
+    :param perfil: instrumentacao.Perfil que recebe o tempo de renderização, processamento e
+                   gravação de cada página (os bytes do PDF são contados por quem chama, uma vez
+                   por arquivo, como em instrumentacao.medir_etapa)
+    :param primeira_pagina, ultima_pagina: Intervalo de páginas (base 1, inclusivo) renderizado e
+                                           gravado na saída; o padrão é o documento inteiro
+    :param diretorio_trabalho: Pasta de checkpoints (trabalho_pdf.TrabalhoPDF): cada página pronta é
+                               gravada nela, uma nova execução pula as páginas já concluídas e a saída
+                               só é montada quando o intervalo inteiro estiver pronto. Exige
+                               chave_processamento, que identifica o processamento ao retomar
+    :return: Número de páginas gravadas
+    :raises ValueError: Se o intervalo de páginas for inválido
+    :raises trabalho_pdf.TrabalhoIncompativel: Se o diretório for de outro PDF ou processamento
+    """
+    perfil = perfil or PERFIL_INATIVO
+    total = contar_paginas(pdf_path, poppler_path, cache)
+    numeros = intervalo_paginas(total, primeira_pagina, ultima_pagina)
+    trabalho = None
+    pendentes = numeros
+    if diretorio_trabalho is not None:
+        if chave_processamento is None:
+            raise ValueError("O diretório de trabalho exige a chave_processamento")
+        trabalho = TrabalhoPDF(diretorio_trabalho, pdf_path, total,
+                               (dpi, grayscale, codificacao, qualidade, chave_processamento))
+        pendentes = trabalho.pendentes(numeros)
+
+    if workers == 1:
+        processadas = _paginas_sequenciais(pdf_path, processar_pagina, pendentes, dpi, poppler_path,
+                                           janela, grayscale, com_numero, cache, chave_processamento,
+                                           perfil)
+    else:
+        processadas = processar_paginas_paralelo(pdf_path, processar_pagina, dpi=dpi,
+                                                 poppler_path=poppler_path, workers=workers,
+                                                 grayscale=grayscale, com_numero=com_numero,
+                                                 cache=cache, chave_processamento=chave_processamento,
+                                                 perfil=perfil, numeros=pendentes)
+    if progresso is not None or cancelar is not None:
+        processadas = _acompanhar(processadas, len(numeros), progresso, cancelar,
+                                  len(numeros) - len(pendentes))
+    try:
+        if trabalho is None:
+            gravadas = salvar_pdf_incremental(processadas, output_path, codificacao=codificacao,
+                                              qualidade=qualidade, relatorio=relatorio, perfil=perfil,
+                                              numeros=numeros)
+        else:
+            salvar_paginas_trabalho(processadas, pendentes, trabalho, codificacao=codificacao,
+                                    qualidade=qualidade, perfil=perfil)
+            with perfil.etapa("juntar_paginas"):
+                gravadas = trabalho.juntar(output_path, numeros)
+            if relatorio is not None:
+                relatorio.extend(trabalho.relatorio(numeros))
+        return gravadas
+    except Exception:
+        # Não deixa um PDF parcial no lugar da saída
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    finally:
+        processadas.close()
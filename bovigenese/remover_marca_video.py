@@ -0,0 +1,308 @@
+"""
+Remoção de marcas d'água estáticas (logotipos e textos sobrepostos na mesma posição em todo o
+vídeo), sem conhecer a imagem da marca.
+
+A marca é estimada uma única vez por vídeo, a partir de uma amostra de frames:
+- máscara: o gradiente mediano das amostras só é forte onde as bordas se repetem em todos os
+  frames, ou seja, nas bordas da marca (o fundo em movimento tem gradiente mediano próximo de zero);
+- alfa: dentro da máscara, frame = alfa * marca + (1 - alfa) * fundo. O fundo é estimado pelo
+  inpainting de cada amostra, e a razão entre a variação temporal do frame e a do fundo dá 1 - alfa.
+
+Em cada frame a mistura é invertida, fundo = (frame - alfa * marca) / (1 - alfa), apenas na região
+da marca. Pixels quase opacos, ou em que o alfa não pôde ser estimado, são preenchidos por inpainting.
+
+    python remover_marca_video.py entrada.mp4 saida.mp4 [--profile perfil.json]
+
+Cenas paradas (câmera fixa, slides) têm bordas estáticas além das da marca e não podem ser
+separadas dela; nesses vídeos a estimativa é recusada com ValueError.
+"""
+import os
+import sys
+import cv2
+import numpy as np
+
+try:
+    from .adicionar_marca_video import FILA_PADRAO, AdicionarMarcaVideo
+    from .instrumentacao import Perfil, medir_etapa, separar_perfil
+except ImportError:
+    from adicionar_marca_video import FILA_PADRAO, AdicionarMarcaVideo
+    from instrumentacao import Perfil, medir_etapa, separar_perfil
+
+AMOSTRAS_PADRAO = 32         # Frames amostrados ao longo do vídeo para estimar a marca
+AMOSTRAS_MINIMAS = 8         # Abaixo disso a mediana temporal não separa a marca do fundo
+LARGURA_DETECCAO = 640       # Largura das amostras na detecção da máscara
+GRADIENTE_MINIMO = 20.0      # Magnitude mínima do gradiente mediano (Sobel 3x3, tons 0..255)
+FRACAO_GRADIENTE = 0.2       # Fração do gradiente mediano mais forte que ainda conta como borda
+AREA_MINIMA_BORDA = 4        # Componentes de borda menores (em pixels reduzidos) são ruído
+FRACAO_MAXIMA_MASCARA = 0.25 # Máscara maior que esta fração do frame indica cena parada
+MARGEM = 8                   # Pixels em volta da máscara incluídos na região processada
+RAIO_INPAINT = 3
+VARIANCIA_MINIMA = 30.0      # Variação temporal do fundo (soma dos canais) exigida para estimar o alfa
+FRACAO_CONFIAVEL_MINIMA = 0.5
+ALFA_MINIMO = 0.02           # Abaixo disso o pixel é mantido
+ALFA_MAXIMO = 0.85           # Acima disso a inversão amplifica o ruído e o pixel vai para o inpainting
+
+MODO_NENHUM = "nenhum"
+MODO_INVERSAO = "inversao"
+MODO_MISTO = "inversao+inpaint"
+MODO_INPAINT = "inpaint"
+
+
+class MarcaEstimada:
+    def __init__(self, x=0, y=0, largura=0, altura=0, fator=None, deslocamento=None,
+                 mascara_inpaint=None, modo=MODO_NENHUM, alfa_mediano=None, amostras=0):
+        """
+        Marca d'água estimada de um vídeo, pronta para ser removida de cada frame
+        :param x, y, largura, altura: Região processada em cada frame
+        :param fator: 1 / (1 - alfa) por pixel, (altura, largura, 1), ou None sem inversão
+        :param deslocamento: alfa * marca * fator - 0.5 por pixel e canal (o 0.5 arredonda na conversão)
+        :param mascara_inpaint: Pixels preenchidos por inpainting (uint8), ou None
+        """
+        self.x, self.y, self.largura, self.altura = int(x), int(y), int(largura), int(altura)
+        self.fator = fator
+        self.deslocamento = deslocamento
+        self.mascara_inpaint = mascara_inpaint
+        self.modo = modo
+        self.alfa_mediano = alfa_mediano
+        self.amostras = amostras
+
+    def relatorio(self):
+        return {"modo": self.modo, "regiao": [self.x, self.y, self.largura, self.altura],
+                "alfa_mediano": self.alfa_mediano, "amostras": self.amostras,
+                "pixels_inpaint": int(np.count_nonzero(self.mascara_inpaint))
+                if self.mascara_inpaint is not None else 0}
+
+
+def ler_amostras(video_path, quantidade):
+    """Frames espaçados uniformemente ao longo do vídeo (BGR)"""
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise ValueError("Não foi possível abrir o vídeo")
+    try:
+        total = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        for posicao in np.unique(np.linspace(0, max(total - 1, 0), quantidade).round().astype(int)):
+            video.set(cv2.CAP_PROP_POS_FRAMES, int(posicao))
+            ret, frame = video.read()
+            if ret:
+                yield frame
+    finally:
+        video.release()
+
+
+def mascara_por_gradiente(amostras, escala):
+    """
+    Máscara da marca (na resolução reduzida) pelas bordas que se repetem em todas as amostras
+    :return: Máscara uint8 (1 = marca) ou None se nenhuma borda estática for encontrada
+    """
+    gx, gy = [], []
+    for frame in amostras:
+        cinza = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if escala < 1:
+            cinza = cv2.resize(cinza, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        cinza = cinza.astype(np.float32)
+        gx.append(cv2.Sobel(cinza, cv2.CV_32F, 1, 0, ksize=3))
+        gy.append(cv2.Sobel(cinza, cv2.CV_32F, 0, 1, ksize=3))
+    if len(gx) < AMOSTRAS_MINIMAS:
+        raise ValueError(f"O vídeo tem menos de {AMOSTRAS_MINIMAS} frames legíveis para estimar a marca")
+    magnitude = np.hypot(np.median(np.stack(gx), axis=0), np.median(np.stack(gy), axis=0))
+    del gx, gy
+
+    limiar = max(GRADIENTE_MINIMO, FRACAO_GRADIENTE * float(np.percentile(magnitude, 99.9)))
+    bordas = (magnitude > limiar).astype(np.uint8)
+    _, rotulos, estatisticas, _ = cv2.connectedComponentsWithStats(bordas, connectivity=8)
+    manter = np.flatnonzero(estatisticas[1:, cv2.CC_STAT_AREA] >= AREA_MINIMA_BORDA) + 1
+    if manter.size == 0:
+        return None
+    bordas = np.isin(rotulos, manter).astype(np.uint8)
+
+    # Bordas próximas (letras de um texto) viram uma região só, preenchida por dentro
+    fechada = cv2.morphologyEx(bordas, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+    contornos, _ = cv2.findContours(fechada, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    mascara = np.zeros_like(fechada)
+    cv2.drawContours(mascara, contornos, -1, 1, thickness=cv2.FILLED)
+    if mascara.mean() > FRACAO_MAXIMA_MASCARA:
+        raise ValueError("Bordas estáticas demais: a cena parece parada e a marca não pode ser "
+                         "separada do fundo")
+    return mascara
+
+
+def estimar_alfa(recortes, mascara):
+    """
+    Estima alfa e alfa * marca por pixel dentro da máscara
+    :param recortes: Amostras da região, (amostras, altura, largura, 3) uint8
+    :param mascara: bool (altura, largura)
+    :return: (alfa float32, alfa * marca float32 por canal, pixels com fundo variado o bastante)
+    """
+    mascara_inpaint = mascara.astype(np.uint8)
+    fundos = np.stack([cv2.inpaint(recorte, mascara_inpaint, RAIO_INPAINT, cv2.INPAINT_TELEA)
+                       for recorte in recortes]).astype(np.float32)
+    frames = recortes.astype(np.float32)
+
+    # frame = alfa * marca + (1 - alfa) * fundo: a variação temporal é escalada por 1 - alfa
+    variancia_fundo = fundos.var(axis=0).sum(axis=2)
+    variancia_frame = frames.var(axis=0).sum(axis=2)
+    confiavel = variancia_fundo >= VARIANCIA_MINIMA
+    transmissao = np.sqrt(variancia_frame / np.maximum(variancia_fundo, 1e-6))
+    alfa = cv2.medianBlur(np.clip(1 - transmissao, 0, 1).astype(np.float32), 3)
+    alfa[~mascara | (alfa < ALFA_MINIMO)] = 0
+
+    # A mediana temporal dá a parte constante: mediana(frame) - (1 - alfa) * mediana(fundo)
+    marca = np.median(frames, axis=0) - (1 - alfa)[:, :, None] * np.median(fundos, axis=0)
+    marca[alfa == 0] = 0
+    return alfa, marca.astype(np.float32), confiavel
+
+
+class RemoverMarcaVideo(AdicionarMarcaVideo):
+    def __init__(self, amostras=AMOSTRAS_PADRAO, perfil=None):
+        """
+        Remove marcas d'água estáticas de vídeos, reaproveitando o pipeline de decodificação,
+        processamento e codificação (e a divisão em segmentos) do AdicionarMarcaVideo
+        :param amostras: Frames amostrados para estimar a marca de cada vídeo
+        :param perfil: instrumentacao.Perfil opcional; mede a estimativa e cada frame
+        """
+        # Não há imagem de marca nem cache de saída: o resultado depende só do vídeo
+        super().__init__(None, opacidade=None, cache_saida=None, perfil=perfil)
+        self.amostras = amostras
+        self.estimativas = {}
+
+    def estimar(self, video_path):
+        """
+        Estima a máscara e o alfa da marca, uma vez por vídeo (o resultado fica guardado e segue
+        junto com o processador para os processos que tratam cada segmento)
+        :return: MarcaEstimada
+        """
+        chave = os.path.abspath(video_path)
+        if chave not in self.estimativas:
+            with self.perfil.etapa("estimar_marca", processo=True):
+                self.estimativas[chave] = self._estimar(video_path)
+        return self.estimativas[chave]
+
+    def _estimar(self, video_path):
+        video = cv2.VideoCapture(video_path)
+        if not video.isOpened():
+            raise ValueError("Não foi possível abrir o vídeo")
+        largura = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        altura = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        video.release()
+        escala = min(1.0, LARGURA_DETECCAO / largura)
+
+        mascara = mascara_por_gradiente(ler_amostras(video_path, self.amostras), escala)
+        if mascara is None:
+            return MarcaEstimada(amostras=self.amostras)
+
+        # Máscara na resolução original, dilatada para cobrir as bordas perdidas na redução
+        mascara = cv2.resize(mascara, (largura, altura), interpolation=cv2.INTER_NEAREST)
+        raio = int(np.ceil(1 / escala))
+        mascara = cv2.dilate(mascara, np.ones((2 * raio + 1, 2 * raio + 1), np.uint8))
+        linhas = np.flatnonzero(mascara.any(axis=1))
+        colunas = np.flatnonzero(mascara.any(axis=0))
+        y0, y1 = max(0, linhas[0] - MARGEM), min(altura, linhas[-1] + 1 + MARGEM)
+        x0, x1 = max(0, colunas[0] - MARGEM), min(largura, colunas[-1] + 1 + MARGEM)
+        mascara = mascara[y0:y1, x0:x1].astype(bool)
+
+        # Segunda leitura das amostras guardando só a região da marca
+        recortes = np.stack([frame[y0:y1, x0:x1].copy() for frame in ler_amostras(video_path, self.amostras)])
+        alfa, marca, confiavel = estimar_alfa(recortes, mascara)
+
+        estimavel = (np.count_nonzero(confiavel & mascara) >= FRACAO_CONFIAVEL_MINIMA * np.count_nonzero(mascara)
+                     and np.any(alfa > 0))
+        if not estimavel:
+            return MarcaEstimada(x0, y0, x1 - x0, y1 - y0, mascara_inpaint=mascara.astype(np.uint8),
+                                 modo=MODO_INPAINT, amostras=len(recortes))
+
+        invertidos = mascara & confiavel & (alfa <= ALFA_MAXIMO)
+        restantes = mascara & ~invertidos & (~confiavel | (alfa > ALFA_MAXIMO))
+        alfa[~invertidos] = 0
+        marca[~invertidos] = 0
+        fator = (1 / (1 - alfa))[:, :, None].astype(np.float32)
+        return MarcaEstimada(x0, y0, x1 - x0, y1 - y0, fator=fator,
+                             deslocamento=(marca * fator - 0.5).astype(np.float32),
+                             mascara_inpaint=restantes.astype(np.uint8) if restantes.any() else None,
+                             modo=MODO_MISTO if restantes.any() else MODO_INVERSAO,
+                             alfa_mediano=round(float(np.median(alfa[invertidos])), 3) if invertidos.any() else None,
+                             amostras=len(recortes))
+
+    def remover_marca_frame(self, frame, estimativa):
+        """Remove a marca estimada de um frame (BGR), alterando só a região da marca"""
+        if estimativa.largura == 0:
+            return frame
+        roi = frame[estimativa.y:estimativa.y + estimativa.altura,
+                    estimativa.x:estimativa.x + estimativa.largura]
+        if estimativa.fator is not None:
+            # (frame - alfa * marca) / (1 - alfa), arredondado e limitado a 0..255
+            limpa = roi * estimativa.fator
+            limpa -= estimativa.deslocamento
+            np.clip(limpa, 0, 255, out=limpa)
+            roi[...] = limpa
+        if estimativa.mascara_inpaint is not None:
+            roi[...] = cv2.inpaint(np.ascontiguousarray(roi), estimativa.mascara_inpaint, RAIO_INPAINT,
+                                   cv2.INPAINT_TELEA)
+        return frame
+
+    def _aplicar_frame(self, frame, estimativa):
+        return self.remover_marca_frame(frame, estimativa)
+
+    def _preparar_video(self, video_path, frame_size):
+        return self.estimar(video_path)
+
+    @medir_etapa("remover_video")
+    def processar_video(self, video_path, output_path, pipeline=True, workers=None, fila=FILA_PADRAO,
+                        inicio=0, fim=None, mostrar_progresso=True):
+        """
+        Remove a marca d'água de todo o vídeo (ou do trecho [inicio, fim) de frames);
+        os parâmetros e o retorno são os de AdicionarMarcaVideo.processar_video
+        """
+        return self._processar_video(video_path, output_path, pipeline, workers, fila, inicio, fim,
+                                     mostrar_progresso)
+
+    def processar_videos(self, trabalhos, workers=None, segmentos=None):
+        """
+        Remove a marca de vários vídeos; cada marca é estimada aqui, antes de os segmentos
+        serem distribuídos entre os processos
+        :param workers, segmentos: Ver AdicionarMarcaVideo.processar_videos
+        :return: Lista com o resumo de cada vídeo (com a estimativa em "marca"), na ordem dos trabalhos
+        """
+        validos, erros = [], []
+        for indice, (video_path, _) in enumerate(trabalhos):
+            try:
+                self.estimar(video_path)
+                validos.append(indice)
+            except ValueError as e:
+                # A falha de um vídeo não interrompe os demais
+                erros.append(e)
+                print(f"Erro ao processar {video_path}: {e}")
+
+        resumos = [None] * len(trabalhos)
+        if validos:
+            processados = super().processar_videos(
+                [trabalhos[indice] for indice in validos], workers,
+                None if segmentos is None else [segmentos[indice] for indice in validos])
+            for indice, resumo in zip(validos, processados):
+                resumo["marca"] = self.estimar(trabalhos[indice][0]).relatorio()
+                resumos[indice] = resumo
+        if erros:
+            raise erros[0]
+        return resumos
+
+
+def main():
+    argumentos, arquivo_perfil = separar_perfil(sys.argv)
+    if len(argumentos) != 3:
+        print("Uso: python remover_marca_video.py arquivo_entrada arquivo_saida [--profile perfil.json]")
+        sys.exit(1)
+    perfil = Perfil() if arquivo_perfil else None
+    processador = RemoverMarcaVideo(perfil=perfil)
+    try:
+        resumo = processador.processar_videos([(argumentos[1], argumentos[2])])[0]
+        marca = resumo["marca"]
+        print(f"Marca: {marca['modo']}, região {marca['regiao']}, alfa mediano {marca['alfa_mediano']}")
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if perfil is not None:
+            perfil.salvar(arquivo_perfil)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Serviço local que mantém os processadores de marca d'água carregados entre os downloads.
+
+Em vez de iniciar um interpretador Python por download (e reimportar OpenCV, NumPy, pdf2image,
+python-docx e openpyxl e recarregar a marca), o Laravel envia o trabalho para este serviço,
+que já está aquecido. Só escuta em localhost.
+
+    python servico_marca.py --porta 8765 --concorrencia 2 --fila 16 --timeout 600 --cache-dir cache_saida
+
+Com --profile, /metricas inclui o tempo e a CPU de cada etapa (renderização, composição,
+gravação, frames de vídeo), os histogramas de latência, o pico de memória e os bytes processados.
+
+Rotas:
+    POST /processar  {"entrada": ..., "saida": ..., "marca": ..., "opacidade": 0.3}
+    GET  /saude      estado do serviço e ocupação da fila
+    GET  /metricas   contadores e latências dos trabalhos
+
+Respostas de /processar: 200 concluído, 400 requisição inválida, 422 falha no processamento,
+503 fila cheia, 504 tempo limite excedido.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from .adicionar_marca import AdicionarMarcaDagua, processar_arquivo
+    from .adicionar_marca_video import AdicionarMarcaVideo
+    from .cache_saida import CacheSaida
+    from .instrumentacao import Perfil
+except ImportError:
+    from adicionar_marca import AdicionarMarcaDagua, processar_arquivo
+    from adicionar_marca_video import AdicionarMarcaVideo
+    from cache_saida import CacheSaida
+    from instrumentacao import Perfil
+
+HOST = "127.0.0.1"
+PORTA_PADRAO = 8765
+CONCORRENCIA_PADRAO = 2   # Trabalhos executados ao mesmo tempo
+FILA_PADRAO = 16          # Trabalhos aguardando além dos que estão em execução
+TIMEOUT_PADRAO = 600      # Segundos que a requisição espera pelo resultado
+OPACIDADE_PADRAO = 0.3
+AMOSTRAS_LATENCIA = 1000  # Latências guardadas para os percentis de /metricas
+
+
+class ServicoMarca:
+    def __init__(self, concorrencia=CONCORRENCIA_PADRAO, fila=FILA_PADRAO, timeout=TIMEOUT_PADRAO,
+                 cache_saida=None, perfil=None):
+        """
+        Executa os trabalhos com processadores mantidos em memória
+        :param concorrencia: Trabalhos executados ao mesmo tempo
+        :param fila: Trabalhos que podem aguardar; acima disso a requisição é recusada
+        :param timeout: Segundos que cada requisição espera pelo resultado
+        :param cache_saida: CacheSaida opcional compartilhado por todos os processadores
+        :param perfil: instrumentacao.Perfil opcional compartilhado por todos os processadores
+        """
+        self.timeout = timeout
+        self.cache_saida = cache_saida
+        self.perfil = perfil
+        self._executor = ThreadPoolExecutor(max_workers=concorrencia)
+        self._vagas = threading.BoundedSemaphore(concorrencia + fila)
+        self._lock = threading.Lock()
+        self._processadores = {}
+        self._latencias = []
+        self.inicio = time.time()
+        self.metricas = {"recebidos": 0, "concluidos": 0, "falhas": 0, "recusados": 0,
+                         "expirados": 0, "em_andamento": 0}
+        self.concorrencia = concorrencia
+        self.fila = fila
+
+    def processador(self, marca, opacidade, video=False):
+        """Processador (e seus caches) para a marca e opacidade, criado no primeiro uso"""
+        chave = (os.path.abspath(marca), opacidade, video)
+        with self._lock:
+            if chave not in self._processadores:
+                classe = AdicionarMarcaVideo if video else AdicionarMarcaDagua
+                self._processadores[chave] = classe(marca_dagua_path=marca, opacidade=opacidade,
+                                                    cache_saida=self.cache_saida, perfil=self.perfil)
+            return self._processadores[chave]
+
+    def _contar(self, metrica, quantidade=1):
+        with self._lock:
+            self.metricas[metrica] += quantidade
+
+    def _executar(self, entrada, saida, marca, opacidade):
+        inicio = time.perf_counter()
+        try:
+            if entrada.lower().endswith(".mp4"):
+                processador = self.processador(marca, opacidade, video=True)
+                processador.processar_video(entrada, saida, mostrar_progresso=False)
+            else:
+                processar_arquivo(self.processador(marca, opacidade), entrada, saida)
+        finally:
+            with self._lock:
+                self._latencias.append(time.perf_counter() - inicio)
+                del self._latencias[:-AMOSTRAS_LATENCIA]
+                self.metricas["em_andamento"] -= 1
+
+    def processar(self, entrada, saida, marca, opacidade=OPACIDADE_PADRAO):
+        """
+        Enfileira um trabalho e espera o resultado
+        :return: (código HTTP, corpo da resposta)
+        """
+        self._contar("recebidos")
+        if not self._vagas.acquire(blocking=False):
+            self._contar("recusados")
+            return 503, {"status": "erro", "erro": "Fila cheia"}
+        self._contar("em_andamento")
+        inicio = time.perf_counter()
+        try:
+            futuro = self._executor.submit(self._executar, entrada, saida, marca, opacidade)
+        except Exception:
+            self._contar("em_andamento", -1)
+            self._vagas.release()
+            raise
+        # A vaga só é devolvida quando o trabalho termina, mesmo que a requisição expire
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        try:
+            futuro.result(timeout=self.timeout)
+        except FuturoTimeout:
+            # A thread não pode ser interrompida; o trabalho continua, mas a resposta é de falha
+            self._contar("expirados")
+            return 504, {"status": "erro", "erro": f"Tempo limite de {self.timeout}s excedido"}
+        except Exception as e:
+            self._contar("falhas")
+            return 422, {"status": "erro", "erro": f"{type(e).__name__}: {e}"}
+        self._contar("concluidos")
+        return 200, {"status": "ok", "saida": saida, "segundos": round(time.perf_counter() - inicio, 3)}
+
+    def saude(self):
+        with self._lock:
+            return {"status": "ok", "em_andamento": self.metricas["em_andamento"],
+                    "concorrencia": self.concorrencia, "fila": self.fila,
+                    "processadores": len(self._processadores)}
+
+    def relatorio(self):
+        with self._lock:
+            latencias = sorted(self._latencias)
+            metricas = dict(self.metricas)
+        percentis = {}
+        if latencias:
+            for nome, fracao in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                percentis[nome] = round(latencias[min(len(latencias) - 1, int(fracao * len(latencias)))], 3)
+            percentis["media"] = round(sum(latencias) / len(latencias), 3)
+        relatorio = {"metricas": metricas, "latencia_segundos": percentis,
+                     "ativo_ha_segundos": round(time.time() - self.inicio, 1)}
+        if self.cache_saida is not None:
+            relatorio["cache_saida"] = self.cache_saida.relatorio()
+        if self.perfil is not None:
+            relatorio["perfil"] = self.perfil.relatorio()
+        return relatorio
+
+    def encerrar(self):
+        self._executor.shutdown(wait=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    servico = None  # ServicoMarca, definido em criar_servidor
+
+    def _responder(self, codigo, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == "/saude":
+            self._responder(200, self.servico.saude())
+        elif self.path == "/metricas":
+            self._responder(200, self.servico.relatorio())
+        else:
+            self._responder(404, {"status": "erro", "erro": "Rota não encontrada"})
+
+    def do_POST(self):
+        if self.path != "/processar":
+            self._responder(404, {"status": "erro", "erro": "Rota não encontrada"})
+            return
+        try:
+            tamanho = int(self.headers.get("Content-Length", 0))
+            pedido = json.loads(self.rfile.read(tamanho) or b"{}")
+            entrada, saida, marca = pedido["entrada"], pedido["saida"], pedido["marca"]
+            opacidade = float(pedido.get("opacidade", OPACIDADE_PADRAO))
+        except (ValueError, KeyError, TypeError) as e:
+            self._responder(400, {"status": "erro", "erro": f"Requisição inválida: {e}"})
+            return
+        self._responder(*self.servico.processar(entrada, saida, marca, opacidade))
+
+
+def criar_servidor(servico, porta=PORTA_PADRAO):
+    """Servidor HTTP em localhost, uma thread por requisição"""
+    handler = type("Handler", (_Handler,), {"servico": servico})
+    servidor = ThreadingHTTPServer((HOST, porta), handler)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço local de marca d'água")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--concorrencia", type=int, default=CONCORRENCIA_PADRAO)
+    parser.add_argument("--fila", type=int, default=FILA_PADRAO)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_PADRAO)
+    parser.add_argument("--cache-dir", help="Pasta do cache de arquivos gerados (desativado se omitido)")
+    parser.add_argument("--cache-size", type=int, default=5120, help="Tamanho máximo do cache em MB")
+    parser.add_argument("--profile", action="store_true", help="Mede as etapas e expõe o perfil em /metricas")
+    args = parser.parse_args()
+
+    cache_saida = CacheSaida(args.cache_dir, args.cache_size * 1024 * 1024) if args.cache_dir else None
+    servico = ServicoMarca(args.concorrencia, args.fila, args.timeout, cache_saida,
+                           Perfil() if args.profile else None)
+    servidor = criar_servidor(servico, args.porta)
+    print(f"Serviço de marca d'água em http://{HOST}:{args.porta}", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servico.encerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Processamento retomável de PDFs longos: cada página processada é gravada como um PDF de uma
+página no diretório do trabalho, junto com o estado.json. Um trabalho interrompido (página
+defeituosa, falta de memória, reinício do worker) continua das páginas que faltam, e o PDF
+final só é montado quando todas as páginas do intervalo estiverem prontas.
+
+Um documento muito grande pode ser dividido em intervalos de páginas processados em máquinas
+diferentes, cada uma com o seu diretório de trabalho, e os resultados juntados depois:
+
+    python trabalho_pdf.py saida.pdf trabalho_maquina1/ trabalho_maquina2/
+"""
+import hashlib
+import json
+import os
+import sys
+import uuid
+
+try:
+    from .cache_disco import hash_arquivo
+    from .escritor_pdf import EscritorPDF, salvar_pagina_pdf
+except ImportError:
+    from cache_disco import hash_arquivo
+    from escritor_pdf import EscritorPDF, salvar_pagina_pdf
+
+ARQUIVO_ESTADO = "estado.json"
+PASTA_PAGINAS = "paginas"
+# Versão do formato do diretório de trabalho
+VERSAO_TRABALHO = 1
+
+
+class TrabalhoIncompativel(Exception):
+    """O diretório de trabalho pertence a outro PDF ou a outro processamento"""
+
+
+class TrabalhoIncompleto(Exception):
+    """Faltam páginas processadas para montar o PDF final"""
+
+
+def intervalo_paginas(total, primeira_pagina=None, ultima_pagina=None):
+    """
+    Números das páginas selecionadas (base 1, limites inclusivos)
+    :raises ValueError: Se o intervalo estiver fora do documento ou vazio
+    """
+    primeira = 1 if primeira_pagina is None else primeira_pagina
+    ultima = total if ultima_pagina is None else ultima_pagina
+    if not 1 <= primeira <= ultima <= total:
+        raise ValueError(f"Intervalo de páginas inválido: {primeira}-{ultima} (o PDF tem {total} páginas)")
+    return list(range(primeira, ultima + 1))
+
+
+def _gravar_atomico(caminho, gravar):
+    """Grava em um arquivo temporário e o move para o destino, para nunca deixar um arquivo pela metade"""
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    try:
+        gravar(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _juntar_pdfs(caminhos, output_path):
+    """
+    Concatena os PDFs de uma página na ordem dada, copiando uma página por vez para a saída
+    (a memória não cresce com o número de páginas)
+    """
+    def gravar(temporario):
+        with open(temporario, "wb") as f:
+            escritor = EscritorPDF(f)
+            for caminho in caminhos:
+                escritor.copiar_pagina(caminho)
+            escritor.fechar()
+    _gravar_atomico(output_path, gravar)
+
+
+class TrabalhoPDF:
+    def __init__(self, diretorio, pdf_path, total, processamento):
+        """
+        Abre (ou cria) o diretório de trabalho de um PDF
+        :param diretorio: Pasta do trabalho (criada se não existir)
+        :param pdf_path: PDF de entrada; o conteúdo é conferido ao retomar
+        :param total: Número de páginas do PDF
+        :param processamento: Tupla que identifica o processamento e a codificação das páginas;
+                              retomar ou juntar exige o mesmo valor
+        :raises TrabalhoIncompativel: Se o diretório já tiver páginas de outro PDF ou processamento
+        """
+        self.diretorio = diretorio
+        os.makedirs(os.path.join(diretorio, PASTA_PAGINAS), exist_ok=True)
+        identidade = {
+            "versao": VERSAO_TRABALHO,
+            "pdf_sha256": hash_arquivo(pdf_path),
+            "total": total,
+            "processamento": hashlib.sha256(repr(processamento).encode("utf-8")).hexdigest(),
+        }
+        estado = self.ler_estado(diretorio)
+        if estado is None:
+            estado = dict(identidade, pdf=os.path.basename(pdf_path), paginas={})
+        elif any(estado.get(campo) != valor for campo, valor in identidade.items()):
+            raise TrabalhoIncompativel(
+                f"O diretório {diretorio} pertence a outro PDF ou a outros parâmetros de processamento")
+        self.estado = estado
+        self._salvar_estado()
+
+    @staticmethod
+    def ler_estado(diretorio):
+        """Conteúdo do estado.json do diretório, ou None se o trabalho ainda não começou"""
+        try:
+            with open(os.path.join(diretorio, ARQUIVO_ESTADO), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _salvar_estado(self):
+        def gravar(temporario):
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(self.estado, f, indent=2, ensure_ascii=False)
+        _gravar_atomico(os.path.join(self.diretorio, ARQUIVO_ESTADO), gravar)
+
+    def caminho_pagina(self, numero):
+        return os.path.join(self.diretorio, PASTA_PAGINAS, f"{numero:06d}.pdf")
+
+    def concluida(self, numero):
+        """A página já foi processada e gravada (o estado só registra páginas gravadas por inteiro)"""
+        return str(numero) in self.estado["paginas"] and os.path.exists(self.caminho_pagina(numero))
+
+    def pendentes(self, numeros):
+        return [numero for numero in numeros if not self.concluida(numero)]
+
+    def gravar_pagina(self, numero, pagina, qualidade, registro):
+        """
+        Grava a página já codificada e a registra como concluída
+        :param pagina: Imagem PIL no modo da codificação escolhida
+        :param qualidade: Qualidade JPEG (ignorada nas páginas de 1 bit, gravadas em CCITT G4)
+        :param registro: Dados da página para o relatório; recebe o número de bytes gravados
+        """
+        caminho = self.caminho_pagina(numero)
+        _gravar_atomico(caminho, lambda temporario: salvar_pagina_pdf(pagina, temporario, qualidade))
+        self.estado["paginas"][str(numero)] = dict(registro, bytes=os.path.getsize(caminho))
+        self._salvar_estado()
+
+    def relatorio(self, numeros):
+        return [self.estado["paginas"][str(numero)] for numero in numeros]
+
+    def juntar(self, output_path, numeros):
+        """
+        Monta o PDF de saída com as páginas do intervalo
+        :raises TrabalhoIncompleto: Se alguma página ainda não foi processada
+        """
+        faltantes = self.pendentes(numeros)
+        if faltantes:
+            raise TrabalhoIncompleto(f"Páginas ainda não processadas: {_resumir(faltantes)}")
+        _juntar_pdfs([self.caminho_pagina(numero) for numero in numeros], output_path)
+        return len(numeros)
+
+
+def _resumir(numeros):
+    """Lista de páginas abreviada em intervalos (1-3, 7, 9-12)"""
+    partes = []
+    for numero in numeros:
+        if partes and partes[-1][1] == numero - 1:
+            partes[-1][1] = numero
+        else:
+            partes.append([numero, numero])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in partes)
+
+
+def juntar_trabalhos(diretorios, output_path):
+    """
+    Junta em um único PDF as páginas de vários diretórios de trabalho do mesmo documento
+    (intervalos processados em máquinas diferentes). Páginas presentes em mais de um diretório
+    são usadas uma vez.
+    :return: Relatório das páginas, na ordem do documento
+    :raises TrabalhoIncompativel: Se os diretórios forem de PDFs ou processamentos diferentes
+    :raises TrabalhoIncompleto: Se alguma página do documento não estiver em nenhum diretório
+    """
+    identidade = None
+    paginas = {}
+    for diretorio in diretorios:
+        estado = TrabalhoPDF.ler_estado(diretorio)
+        if estado is None:
+            raise TrabalhoIncompativel(f"{diretorio} não é um diretório de trabalho")
+        atual = (estado["versao"], estado["pdf_sha256"], estado["total"], estado["processamento"])
+        if identidade is None:
+            identidade = atual
+        elif atual != identidade:
+            raise TrabalhoIncompativel(f"{diretorio} pertence a outro PDF ou a outro processamento")
+        for numero, registro in estado["paginas"].items():
+            caminho = os.path.join(diretorio, PASTA_PAGINAS, f"{int(numero):06d}.pdf")
+            if int(numero) not in paginas and os.path.exists(caminho):
+                paginas[int(numero)] = (caminho, registro)
+    if identidade is None:
+        raise ValueError("Nenhum diretório de trabalho informado")
+
+    numeros = range(1, identidade[2] + 1)
+    faltantes = [numero for numero in numeros if numero not in paginas]
+    if faltantes:
+        raise TrabalhoIncompleto(f"Páginas sem resultado em nenhum diretório: {_resumir(faltantes)}")
+    _juntar_pdfs([paginas[numero][0] for numero in numeros], output_path)
+    return [paginas[numero][1] for numero in numeros]
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Uso: python trabalho_pdf.py arquivo_saida.pdf diretorio_trabalho [diretorio_trabalho ...]")
+        sys.exit(1)
+    try:
+        paginas = juntar_trabalhos(sys.argv[2:], sys.argv[1])
+    except (TrabalhoIncompativel, TrabalhoIncompleto, ValueError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"{len(paginas)} páginas juntadas em {sys.argv[1]}")
+
+
+if __name__ == "__main__":
+    main()
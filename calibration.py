@@ -0,0 +1,171 @@
+"""
+Calibração automática da faixa de cinza da marca d'água.
+
+Antes da passada em alta resolução, as páginas são renderizadas em baixa resolução e em
+escala de cinza para montar histogramas de luminância. A marca d'água aparece como um pico
+entre o texto (escuro) e o papel (branco); a faixa em torno desse pico substitui os valores
+fixos de LOWER_GRAY/UPPER_GRAY. O resultado pode ser gravado em JSON e reaproveitado enquanto
+o PDF de origem (SHA-256) e a resolução da calibração forem os mesmos.
+
+Opcionalmente, a mesma passada localiza a marca d'água: como ela fica na mesma posição em
+todas as páginas, os pixels que caem na faixa de cinza em quase todas as páginas amostradas
+formam a região da marca. A limpeza em alta resolução fica restrita a essa região.
+"""
+import json
+import os
+
+import cv2
+import numpy as np
+
+from bovigenese.paginas_pdf import renderizar_paginas
+from bovigenese.cache_disco import hash_arquivo
+from watermark_remover import LOWER_GRAY, UPPER_GRAY, default_poppler_path
+
+CALIBRATION_DPI = 50
+MIN_LEVEL = 100         # Tons abaixo disso são texto, nunca marca d'água
+MAX_LEVEL = UPPER_GRAY  # Tons acima disso são o papel (e ruído próximo do branco)
+MIN_PEAK_FRACTION = 0.002  # Fração mínima de pixels no pico para considerar que há marca d'água
+EDGE_RATIO = 0.05       # Os limites da faixa ficam onde o histograma cai abaixo de 5% do pico
+MARGIN = 5              # Folga aplicada aos limites detectados
+# Versão do algoritmo de detecção; calibrações gravadas com outra versão são refeitas
+CALIBRATION_VERSION = 2
+LOCATE_SAMPLES = 8      # Máximo de páginas guardadas (espaçadas pelo documento) para localizar a marca
+CONSISTENCY = 0.6       # Fração das páginas amostradas em que o pixel precisa estar na faixa de cinza
+MIN_REGION_FRACTION = 0.001  # Área mínima (fração da página) para aceitar a região encontrada
+REGION_PADDING = 0.02   # Folga ao redor da região, como fração da largura/altura da página
+
+def luminance_histogram(image):
+    """Histograma de 256 tons da página (PIL em escala de cinza ou RGB)."""
+    gray = np.asarray(image if image.mode == "L" else image.convert("L"))
+    return np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+
+def detect_gray_band(histogram):
+    """
+    Encontra a faixa de cinza da marca d'água em um histograma de luminância.
+    :return: (lower_gray, upper_gray, detected); sem pico detectado, devolve a faixa padrão
+    """
+    total = histogram.sum()
+    if total == 0:
+        return LOWER_GRAY, UPPER_GRAY, False
+
+    # Suaviza o histograma para que o pico não dependa de tons isolados
+    smooth = np.convolve(histogram, np.ones(5) / 5, mode="same")
+    region = smooth[MIN_LEVEL:MAX_LEVEL + 1]
+    peak = MIN_LEVEL + int(np.argmax(region))
+    peak_mass = histogram[max(MIN_LEVEL, peak - 10):min(MAX_LEVEL, peak + 10) + 1].sum()
+    if peak_mass < MIN_PEAK_FRACTION * total:
+        return LOWER_GRAY, UPPER_GRAY, False
+
+    # Desce e sobe a partir do pico até o histograma ficar desprezível; a folga cobre as bordas
+    # suavizadas da marca d'água. O limite superior nunca passa do papel (MAX_LEVEL)
+    edge = EDGE_RATIO * smooth[peak]
+    lower = peak
+    while lower > MIN_LEVEL and smooth[lower - 1] >= edge:
+        lower -= 1
+    upper = peak
+    while upper < MAX_LEVEL and smooth[upper + 1] >= edge:
+        upper += 1
+    return max(MIN_LEVEL, lower - MARGIN), min(MAX_LEVEL, upper + MARGIN), True
+
+def locate_region(samples, lower_gray, upper_gray):
+    """
+    Região da marca d'água a partir da consistência da máscara de cinza entre as páginas amostradas.
+    Os pixels na faixa em pelo menos CONSISTENCY das amostras são agrupados e o maior grupo é a marca;
+    conteúdo cinza que muda de página para página (tabelas, fotos) fica de fora.
+    :param samples: Páginas em baixa resolução (arrays em escala de cinza)
+    :return: {"box": [x0, y0, x1, y1] em frações da página, "density": fração esperada de pixels
+             na faixa dentro da caixa, "samples": páginas usadas}, ou None se não houver região estável
+    """
+    if len(samples) < 2:
+        return None
+    height, width = samples[0].shape
+    masks = []
+    for sample in samples:
+        if sample.shape != (height, width):
+            sample = cv2.resize(sample, (width, height), interpolation=cv2.INTER_AREA)
+        masks.append((sample >= lower_gray) & (sample <= upper_gray))
+    consistent = (np.mean(masks, axis=0) >= CONSISTENCY).astype(np.uint8)
+
+    # Liga os traços da marca (letras, bordas suavizadas) em um único componente
+    kernel = np.ones((max(3, height // 50), max(3, width // 50)), np.uint8)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(cv2.dilate(consistent, kernel))
+    if count < 2:
+        return None
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    ys, xs = np.nonzero((labels == largest) & consistent.view(np.bool_))
+    if len(xs) < MIN_REGION_FRACTION * width * height:
+        return None
+
+    pad_x, pad_y = REGION_PADDING * width, REGION_PADDING * height
+    x0, x1 = max(0.0, xs.min() - pad_x), min(float(width), xs.max() + 1 + pad_x)
+    y0, y1 = max(0.0, ys.min() - pad_y), min(float(height), ys.max() + 1 + pad_y)
+    box = (int(y0), int(np.ceil(y1)), int(x0), int(np.ceil(x1)))
+    density = float(np.mean([mask[box[0]:box[1], box[2]:box[3]].mean() for mask in masks]))
+    return {"box": [x0 / width, y0 / height, x1 / width, y1 / height], "density": density,
+            "samples": len(samples)}
+
+def calibrate(pdf_path, per_page=False, dpi=CALIBRATION_DPI, poppler_path=None, locate=False):
+    """
+    Renderiza o PDF em baixa resolução e detecta a faixa de cinza da marca d'água.
+    :param per_page: Também calcula uma faixa para cada página
+    :param locate: Também localiza a região da marca d'água (ver locate_region)
+    :return: Dicionário com a faixa do documento e, se pedido, a de cada página e a região
+    """
+    if poppler_path is None:
+        poppler_path = default_poppler_path()
+    document_histogram = np.zeros(256, dtype=np.float64)
+    pages = []
+    samples = []
+    stride = 1
+    for page_number, image in enumerate(renderizar_paginas(pdf_path, dpi=dpi, poppler_path=poppler_path,
+                                                           grayscale=True), 1):
+        histogram = luminance_histogram(image)
+        if locate and (page_number - 1) % stride == 0:
+            samples.append(np.asarray(image))
+            if len(samples) > LOCATE_SAMPLES:
+                # Sem saber o total de páginas, mantém as amostras espaçadas dobrando o intervalo
+                samples = samples[::2]
+                stride *= 2
+        image.close()
+        document_histogram += histogram
+        if per_page:
+            lower, upper, detected = detect_gray_band(histogram)
+            pages.append({"page": page_number, "lower_gray": lower, "upper_gray": upper,
+                          "detected": detected})
+
+    lower, upper, detected = detect_gray_band(document_histogram)
+    calibration = {"lower_gray": lower, "upper_gray": upper, "detected": detected, "dpi": dpi,
+                   "version": CALIBRATION_VERSION}
+    if per_page:
+        calibration["pages"] = pages
+    if locate:
+        calibration["region"] = locate_region(samples, lower, upper) if detected else None
+    return calibration
+
+def save_calibration(calibration, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2)
+
+def load_calibration(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_or_calibrate(pdf_path, calibration_file=None, per_page=False, poppler_path=None, locate=False,
+                      dpi=CALIBRATION_DPI):
+    """
+    Reaproveita a calibração gravada em calibration_file, se existir e tiver sido feita para o
+    mesmo PDF (SHA-256 do conteúdo), na mesma resolução e pela mesma versão da detecção; caso
+    contrário calibra o documento e grava o resultado nesse arquivo (quando informado).
+    """
+    source = hash_arquivo(pdf_path) if calibration_file else None
+    if calibration_file and os.path.exists(calibration_file):
+        calibration = load_calibration(calibration_file)
+        if (calibration.get("source_sha256") == source and calibration.get("dpi") == dpi and
+                calibration.get("version") == CALIBRATION_VERSION and
+                (not per_page or "pages" in calibration) and (not locate or "region" in calibration)):
+            return calibration
+    calibration = calibrate(pdf_path, per_page=per_page, dpi=dpi, poppler_path=poppler_path, locate=locate)
+    if calibration_file:
+        calibration["source_sha256"] = source
+        save_calibration(calibration, calibration_file)
+    return calibration
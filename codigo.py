@@ -3,18 +3,17 @@
 
 import cv2
 import numpy as np
-from pdf2image import convert_from_path
 from PIL import Image
 import os
 from google.colab import files
 
+# O módulo de páginas fica em bovigenese/ (envie a pasta junto com este notebook)
+from bovigenese.paginas_pdf import processar_paginas_pdf
+
 # Upload do arquivo PDF
 uploaded = files.upload()
 pdf_path = list(uploaded.keys())[0]
 
-# Converter PDF para imagens (300 DPI para qualidade alta)
-images = convert_from_path(pdf_path, 300)
-
 # Criar uma pasta para armazenar imagens temporárias
 output_folder = "processed_pages"
 os.makedirs(output_folder, exist_ok=True)
@@ -34,21 +33,20 @@ def remove_gray_watermark(image):
 
     return image
 
-processed_images = []
-
-# Processar todas as páginas
-for i, image in enumerate(images):
+def limpar_pagina(image):
+    """Remove a marca d'água de uma página renderizada e retorna a página em formato PIL"""
     # Converter a imagem para um formato compatível com OpenCV
     img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
 
     # Remover a marca d'água substituindo por branco
     cleaned_img = remove_gray_watermark(img_cv)
 
-    # Converter de volta para formato PIL e armazenar
-    processed_images.append(Image.fromarray(cv2.cvtColor(cleaned_img, cv2.COLOR_BGR2RGB)))
+    # Converter de volta para formato PIL
+    return Image.fromarray(cv2.cvtColor(cleaned_img, cv2.COLOR_BGR2RGB))
 
-# Criar um novo PDF sem marcas d'água diretamente com Pillow
+# Converter (300 DPI para qualidade alta), processar e gravar uma página por vez,
+# sem carregar o PDF inteiro na memória
 output_pdf = "/content/PDF_sem_marca.pdf"
-processed_images[0].save(output_pdf, save_all=True, append_images=processed_images[1:])
+processar_paginas_pdf(pdf_path, output_pdf, limpar_pagina, dpi=300)
 
 print(f"Processo concluído! O PDF sem marca d'água foi salvo como '{output_pdf}'.")
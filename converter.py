@@ -1,11 +1,14 @@
-import time
+import argparse
+import math
 import os
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.shared import Pt
+from pypdf import PdfReader
 
 # Caminho do ChromeDriver
 driver_path = r"C:\chromedriver-win64\chromedriver.exe"
@@ -14,8 +17,155 @@ pdf_path = r"C:\Users\Douglas\Desktop\NOMARKWATER\PDF_BASE.pdf"
 # Pasta para salvar o arquivo convertido
 download_folder = r"C:\Users\Douglas\Desktop\NOMARKWATER"
 
+# Fragmentos de texto a menos desta distância vertical (em pontos) ficam na mesma linha
+TOLERANCIA_LINHA = 2.0
+# Margem das páginas do DOCX gerado, em pontos
+MARGEM = 36
+# Formatos que o python-docx incorpora sem conversão
+EXTENSOES_DOCX = (".png", ".jpg", ".jpeg", ".gif", ".bmp")
+
+
+def _multiplicar(m, n):
+    return [m[0] * n[0] + m[1] * n[2], m[0] * n[1] + m[1] * n[3],
+            m[2] * n[0] + m[3] * n[2], m[2] * n[1] + m[3] * n[3],
+            m[4] * n[0] + m[5] * n[2] + n[4], m[4] * n[1] + m[5] * n[3] + n[5]]
+
+
+def _elementos_da_pagina(pagina):
+    """
+    Linhas de texto e imagens da página com a posição em que são desenhadas
+    :return: (lista de ("texto", y, x, tamanho_fonte, texto) e ("imagem", y, x, largura, nome), imagens por nome)
+    """
+    fragmentos = []
+    desenhos = []
+
+    def visitar_texto(texto, cm, tm, fonte, tamanho):
+        if not texto.strip():
+            return
+        matriz = _multiplicar(tm, cm)
+        fragmentos.append((matriz[5], matriz[4], tamanho * math.hypot(matriz[2], matriz[3]) or tamanho,
+                           texto.replace("\n", " ").strip()))
+
+    def visitar_operador(operador, argumentos, cm, tm):
+        # Imagens são desenhadas no quadrado unitário escalado pela matriz atual
+        if operador == b"Do" and argumentos:
+            desenhos.append(("imagem", cm[5] + cm[3], cm[4], math.hypot(cm[0], cm[1]), str(argumentos[0])))
+
+    pagina.extract_text(visitor_text=visitar_texto, visitor_operand_before=visitar_operador)
+
+    # Agrupa os fragmentos em linhas, de cima para baixo e da esquerda para a direita
+    linhas = []
+    for y, x, tamanho, texto in sorted(fragmentos, key=lambda f: (-f[0], f[1])):
+        if linhas and abs(linhas[-1][1] - y) <= TOLERANCIA_LINHA:
+            linhas[-1][4].append(texto)
+        else:
+            linhas.append(["texto", y, x, tamanho, [texto]])
+    elementos = [(tipo, y, x, tamanho, " ".join(textos)) for tipo, y, x, tamanho, textos in linhas]
+
+    imagens = {}
+    for imagem in pagina.images:
+        imagens["/" + os.path.splitext(imagem.name)[0]] = imagem
+    elementos += [desenho for desenho in desenhos if desenho[4] in imagens]
+    elementos.sort(key=lambda elemento: -elemento[1])
+    return elementos, imagens
+
+
+def _dados_imagem(imagem):
+    """Bytes da imagem em um formato aceito pelo python-docx"""
+    if os.path.splitext(imagem.name)[1].lower() in EXTENSOES_DOCX:
+        return BytesIO(imagem.data)
+    convertida = BytesIO()
+    imagem.image.save(convertida, format="PNG")
+    convertida.seek(0)
+    return convertida
+
+
+def converter_pdf_para_docx(pdf, docx_path):
+    """
+    Converte o PDF em DOCX localmente: linhas de texto (com tamanho de fonte e recuo) e imagens,
+    na ordem em que aparecem em cada página, uma página do DOCX por página do PDF.
+    Gráficos vetoriais (linhas, tabelas desenhadas, formas) não são levados ao DOCX; para PDFs
+    com esse conteúdo use a conversão online (converter_online), que é o padrão do main
+    :return: Dicionário com páginas, imagens e segundos
+    """
+    inicio = time.perf_counter()
+    reader = PdfReader(pdf)
+    doc = Document()
+    secao = doc.sections[0]
+    primeira = reader.pages[0].cropbox if len(reader.pages) else None
+    if primeira is not None:
+        secao.page_width, secao.page_height = Pt(float(primeira.width)), Pt(float(primeira.height))
+    secao.left_margin = secao.right_margin = secao.top_margin = secao.bottom_margin = Pt(MARGEM)
+    largura_util = float(primeira.width) - 2 * MARGEM if primeira is not None else 500
+
+    total_imagens = 0
+    for numero, pagina in enumerate(reader.pages):
+        elementos, imagens = _elementos_da_pagina(pagina)
+        esquerda = float(pagina.cropbox.left) + MARGEM
+        usadas = set()
+        paragrafo = None
+        for tipo, _, x, medida, conteudo in elementos:
+            if tipo == "imagem" and conteudo in usadas:
+                continue
+            paragrafo = doc.add_paragraph()
+            paragrafo.paragraph_format.space_after = Pt(0)
+            paragrafo.paragraph_format.left_indent = Pt(max(0.0, x - esquerda))
+            if tipo == "texto":
+                paragrafo.add_run(conteudo).font.size = Pt(max(1.0, round(medida, 1)))
+            else:
+                usadas.add(conteudo)
+                largura = min(max(medida, 1.0), max(largura_util - max(0.0, x - esquerda), 1.0))
+                paragrafo.add_run().add_picture(_dados_imagem(imagens[conteudo]), width=Pt(largura))
+                total_imagens += 1
+
+        # Imagens que não foram localizadas no conteúdo (ex.: dentro de formulários) vão ao fim da página
+        for nome, imagem in imagens.items():
+            if nome not in usadas:
+                paragrafo = doc.add_paragraph()
+                paragrafo.add_run().add_picture(_dados_imagem(imagem),
+                                                width=Pt(min(imagem.image.width * 0.75, largura_util)))
+                total_imagens += 1
+
+        if numero < len(reader.pages) - 1:
+            (paragrafo or doc.add_paragraph()).add_run().add_break(WD_BREAK.PAGE)
+
+    doc.save(docx_path)
+    return {"paginas": len(reader.pages), "imagens": total_imagens,
+            "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+def _converter_trabalho(trabalho):
+    entrada, saida, nova_imagem = trabalho
+    resumo = converter_pdf_para_docx(entrada, saida)
+    if nova_imagem:
+        from delete import substituir_imagens_em_todas_paginas
+        inicio = time.perf_counter()
+        substituir_imagens_em_todas_paginas(saida, nova_imagem, saida)
+        resumo["segundos_substituicao"] = round(time.perf_counter() - inicio, 3)
+    return entrada, saida, resumo
+
+
+def converter_lote(pdfs, pasta_saida, workers=None, nova_imagem=None):
+    """
+    Converte vários PDFs em paralelo
+    :param nova_imagem: Se informado, cada DOCX passa em seguida por delete.substituir_imagens_em_todas_paginas
+    :return: Lista de (pdf, docx, resumo) na ordem dos PDFs
+    """
+    os.makedirs(pasta_saida, exist_ok=True)
+    trabalhos = [(pdf, os.path.join(pasta_saida, os.path.splitext(os.path.basename(pdf))[0] + ".docx"), nova_imagem)
+                 for pdf in pdfs]
+    if len(trabalhos) == 1:
+        return [_converter_trabalho(trabalhos[0])]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_converter_trabalho, trabalhos))
+
 
 def setup_browser(download_dir):
+    # O Selenium só é necessário na conversão online
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     chrome_options.add_argument("--start-maximized")  # Inicia o navegador maximizado
 
@@ -32,56 +182,39 @@ def setup_browser(download_dir):
     driver = webdriver.Chrome(service=service, options=chrome_options)
     return driver
 
-def main():
+def converter_online(pdf_path=pdf_path, download_folder=download_folder):
+    """
+    Conversão pelo ilovepdf no navegador (requer Chrome, ChromeDriver e acesso à internet)
+    :return: Caminho do DOCX baixado, ou None se a conversão falhar
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     url = "https://www.ilovepdf.com/pt/pdf_para_word"
     driver = setup_browser(download_folder)
     wait = WebDriverWait(driver, 30)  # Timeout de 30 segundos
+    # O ilovepdf mantém o nome do PDF no arquivo convertido
+    download_file = os.path.join(download_folder, os.path.splitext(os.path.basename(pdf_path))[0] + ".docx")
     try:
         driver.get(url)
-        
-        # Aguarda o botão de upload estar presente
-        upload_button = wait.until(EC.presence_of_element_located((By.ID, "pickfiles")))
-        upload_button.click()
-        
-        # Aguarda a janela de seleção de arquivos e envia o arquivo
-        # Usaremos o Selenium para interagir com o sistema de arquivos
-        # Selenium não pode interagir diretamente com diálogos do sistema operacional
-        # Portanto, precisamos usar uma solução alternativa, como enviar o caminho do arquivo via clipboard
-        # ou usar uma biblioteca como pywinauto para interagir com a janela
-
-        # Alternativa 1: Usar input de arquivo, se disponível
-        # Verifique se existe um input de tipo file
-
-        try:
-            file_input = driver.find_element(By.XPATH, "//input[@type='file']")
-            file_input.send_keys(pdf_path)
-            print("Arquivo enviado via input de arquivo.")
-        except Exception as e:
-            print("Não foi possível enviar o arquivo via input de arquivo:", e)
-            # Se não for possível, retornar ao método anterior usando PyAutoGUI ou outra abordagem
-
-            # Opcional: Reverter para o uso do PyAutoGUI
-            raise NotImplementedError("Método de envio de arquivo via Selenium não implementado.")
-        
-        # Aguarda o upload completar
-        # Dependendo do site, pode haver indicadores de progresso
-        time.sleep(5)  # Ajuste conforme necessário
-
-        # Clica no botão de converter
+
+        # O arquivo é enviado pelo input do formulário de upload; clicar no botão "pickfiles"
+        # abriria a janela de seleção do sistema operacional, que o Selenium não controla
+        file_input = wait.until(EC.presence_of_element_located((By.XPATH, "//input[@type='file']")))
+        file_input.send_keys(os.path.abspath(pdf_path))
+        print("Arquivo enviado via input de arquivo.")
+
+        # Clica no botão de converter assim que o upload terminar
         converter_button = wait.until(EC.element_to_be_clickable((By.ID, "processTask")))
         converter_button.click()
 
         # Aguarda a conversão
-        # Pode ser necessário aguardar até que o botão de download esteja clicável
-        baixar_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//a[@id='pickfiles']")))  # Ajuste o seletor conforme necessário
-        # Alternativamente, você pode aguardar até que o download comece
+        wait.until(EC.element_to_be_clickable((By.XPATH, "//a[@id='pickfiles']")))
 
         print("Conversão concluída. O arquivo deve estar sendo baixado.")
 
-        # Aguarde o download finalizar
-        # Isso pode ser feito verificando a existência do arquivo na pasta de download
-        # Por exemplo:
-        download_file = os.path.join(download_folder, "PRIMEASSIST_MOD_2.docx")
+        # Aguarde o download finalizar (o Chrome grava em .crdownload até concluir)
         timeout = 60  # Tempo máximo de espera em segundos
         start_time = time.time()
         while not os.path.exists(download_file):
@@ -89,17 +222,45 @@ def main():
                 print("Tempo esgotado aguardando o download.")
                 break
             time.sleep(1)
-        
+
         if os.path.exists(download_file):
             print(f"Arquivo baixado com sucesso: {download_file}")
-        else:
-            print("Falha ao baixar o arquivo.")
+            return download_file
+        print("Falha ao baixar o arquivo.")
 
     except Exception as e:
         print(f"Ocorreu um erro: {e}")
     finally:
         driver.quit()
         print("Processo finalizado.")
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte PDFs em DOCX")
+    parser.add_argument("pdfs", nargs="*", default=[pdf_path], help="PDFs a converter")
+    parser.add_argument("--saida", default=download_folder, help="Pasta dos DOCX gerados")
+    parser.add_argument("--workers", type=int, help="Processos em paralelo (conversão local)")
+    parser.add_argument("--substituir", metavar="IMAGEM",
+                        help="Substitui as imagens dos DOCX gerados por esta imagem (delete.py)")
+    parser.add_argument("--local", action="store_true",
+                        help="Converte sem o ilovepdf: mais rápido e em paralelo, mas só com texto e imagens "
+                             "(gráficos vetoriais não são convertidos)")
+    args = parser.parse_args()
+
+    if not args.local:
+        for pdf in args.pdfs:
+            docx_path = converter_online(pdf, args.saida)
+            if docx_path and args.substituir:
+                from delete import substituir_imagens_em_todas_paginas
+                substituir_imagens_em_todas_paginas(docx_path, args.substituir, docx_path)
+        return
+
+    inicio = time.perf_counter()
+    for pdf, docx_path, resumo in converter_lote(args.pdfs, args.saida, args.workers, args.substituir):
+        extra = f", substituição {resumo['segundos_substituicao']}s" if "segundos_substituicao" in resumo else ""
+        print(f"{pdf} -> {docx_path}: {resumo['paginas']} páginas, {resumo['imagens']} imagens, "
+              f"{resumo['segundos']}s{extra}")
+    print(f"Total: {len(args.pdfs)} arquivo(s) em {time.perf_counter() - inicio:.2f}s")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
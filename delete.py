@@ -1,5 +1,9 @@
+import argparse
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from docx import Document
+from docx.parts.image import ImagePart
 from PIL import Image
 from io import BytesIO
 
@@ -8,37 +12,114 @@ doc_path = r"C:\Users\Douglas\Desktop\NOMARKWATER\PDF_BASE.docx"
 nova_imagem_path = r"C:\Users\Douglas\Desktop\NOMARKWATER\NOMARKWATER.png"
 output_path = r"C:\Users\Douglas\Desktop\NOMARKWATER\PDF_BASE_NOMARKWATER.docx"
 
-def substituir_imagens_em_todas_paginas(doc_path, nova_imagem_path, output_path):
+
+class ImagemSubstituta:
+    def __init__(self, nova_imagem_path):
+        """
+        Nova imagem carregada uma única vez, com os PNGs já redimensionados guardados por tamanho
+        :param nova_imagem_path: Caminho da imagem que substitui as do documento
+        """
+        self.caminho = nova_imagem_path
+        self.imagem = Image.open(nova_imagem_path)
+        self.imagem.load()
+        self._codificadas = {}
+
+    def png(self, tamanho):
+        """Nova imagem redimensionada para (largura, altura) e codificada em PNG, gerada uma vez por tamanho"""
+        if tamanho not in self._codificadas:
+            redimensionada = self.imagem.resize(tamanho, Image.Resampling.LANCZOS)
+            img_bytes = BytesIO()
+            redimensionada.save(img_bytes, format='PNG')
+            self._codificadas[tamanho] = img_bytes.getvalue()
+        return self._codificadas[tamanho]
+
+
+def _partes_de_imagem(doc):
+    """Todas as imagens do pacote: corpo, cabeçalhos, rodapés, notas etc."""
+    for parte in doc.part.package.iter_parts():
+        if isinstance(parte, ImagePart):
+            yield parte
+
+
+def substituir_imagens_em_todas_paginas(doc_path, nova_imagem_path, output_path, substituta=None):
+    """
+    Substitui todas as imagens do documento pela nova imagem, no tamanho de cada original
+    :param substituta: ImagemSubstituta já carregada (reaproveita os PNGs entre documentos)
+    :return: Número de imagens substituídas
+    """
     # Abre o documento Word
     doc = Document(doc_path)
-    
+
     # Carrega a nova imagem
-    nova_imagem = Image.open(nova_imagem_path)
-    
-    # Itera sobre todas as imagens no documento
-    for rel in list(doc.part.rels.values()):
-        if "image" in rel.target_ref:
-            # Obtém a imagem original
-            img_part = rel.target_part
-            img_data = img_part.blob
-
-            # Carrega a imagem original para obter dimensões
-            img_original = Image.open(BytesIO(img_data))
-            largura_original, altura_original = img_original.size
+    if substituta is None:
+        substituta = ImagemSubstituta(nova_imagem_path)
 
-            # Redimensiona a nova imagem para as dimensões da original
-            nova_imagem_redimensionada = nova_imagem.resize((largura_original, altura_original), Image.Resampling.LANCZOS)
+    # Itera sobre todas as imagens do documento (cada parte aparece uma vez, mesmo se usada em várias páginas)
+    tamanhos = Counter()
+    for img_part in _partes_de_imagem(doc):
+        # Image.open só lê o cabeçalho; as dimensões saem sem decodificar a imagem
+        with Image.open(BytesIO(img_part.blob)) as img_original:
+            largura_original, altura_original = img_original.size
 
-            # Converte a imagem para bytes
-            img_bytes = BytesIO()
-            nova_imagem_redimensionada.save(img_bytes, format='PNG')  # Salva no formato PNG
-            img_part._blob = img_bytes.getvalue()  # Substitui a imagem no documento
+        # Redimensiona a nova imagem para as dimensões da original (uma vez por tamanho)
+        img_part._blob = substituta.png((largura_original, altura_original))
+        tamanhos[(largura_original, altura_original)] += 1
 
-            print(f"Substituiu uma imagem ({largura_original}px x {altura_original}px).")
-    
     # Salva o documento modificado
     doc.save(output_path)
-    print(f"Documento salvo com sucesso em: {output_path}")
+    # Um resumo por documento (no lote, uma linha por arquivo em vez de uma por imagem)
+    substituidas = sum(tamanhos.values())
+    resumo = ", ".join(f"{quantidade} de {largura}px x {altura}px"
+                       for (largura, altura), quantidade in sorted(tamanhos.items()))
+    print(f"Documento salvo com sucesso em: {output_path} "
+          f"({substituidas} imagens substituídas{': ' + resumo if resumo else ''}).")
+    return substituidas
+
+
+# Imagem substituta de cada processo do pool, carregada no primeiro documento
+_substitutas = {}
+
+def _substituir_no_processo(trabalho):
+    entrada, saida, nova_imagem = trabalho
+    if nova_imagem not in _substitutas:
+        _substitutas[nova_imagem] = ImagemSubstituta(nova_imagem)
+    return substituir_imagens_em_todas_paginas(entrada, nova_imagem, saida, _substitutas[nova_imagem])
+
+
+def substituir_imagens_em_lote(trabalhos, nova_imagem_path, workers=None):
+    """
+    Processa vários documentos em paralelo
+    :param trabalhos: Lista de (doc_path, output_path)
+    :param workers: Número de processos (padrão: número de CPUs)
+    :return: Imagens substituídas em cada documento, na ordem dos trabalhos
+    """
+    if len(trabalhos) == 1:
+        entrada, saida = trabalhos[0]
+        return [substituir_imagens_em_todas_paginas(entrada, nova_imagem_path, saida)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_substituir_no_processo,
+                                 [(entrada, saida, nova_imagem_path) for entrada, saida in trabalhos]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Substitui as imagens de documentos Word")
+    parser.add_argument("entradas", nargs="*", default=[doc_path], help="Documentos .docx")
+    parser.add_argument("--imagem", default=nova_imagem_path, help="Nova imagem")
+    parser.add_argument("--saida", help="Documento de saída (um documento) ou pasta de saída (vários)")
+    parser.add_argument("--workers", type=int, help="Processos em paralelo")
+    args = parser.parse_args()
+
+    if len(args.entradas) == 1:
+        saida = args.saida or (output_path if args.entradas[0] == doc_path
+                               else os.path.splitext(args.entradas[0])[0] + "_NOMARKWATER.docx")
+        substituir_imagens_em_todas_paginas(args.entradas[0], args.imagem, saida)
+        return
+
+    pasta = args.saida or "."
+    os.makedirs(pasta, exist_ok=True)
+    trabalhos = [(entrada, os.path.join(pasta, os.path.splitext(os.path.basename(entrada))[0] + "_NOMARKWATER.docx"))
+                 for entrada in args.entradas]
+    substituir_imagens_em_lote(trabalhos, args.imagem, args.workers)
 
-# Chama a função para substituir as imagens
-substituir_imagens_em_todas_paginas(doc_path, nova_imagem_path, output_path)
+if __name__ == "__main__":
+    main()
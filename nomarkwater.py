@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Linha de comando para remover marcas d'água de PDFs em lote, sem interface gráfica.
+
+    python -m nomarkwater entrada.pdf pasta/ "lote/*.pdf" -o saida/ --jobs 4 --json
+
+Com --job-dir, cada página pronta fica gravada na pasta do job: repetir o mesmo comando depois
+de uma falha processa só as páginas que faltam. Com --first-page/--last-page, máquinas diferentes
+podem processar partes do mesmo PDF e o resultado é juntado com bovigenese/trabalho_pdf.py.
+
+As dependências pesadas (OpenCV, NumPy, pdf2image) só são importadas quando um arquivo
+é de fato processado, então `--help` e erros de uso respondem imediatamente.
+
+Códigos de saída: 0 = todos os arquivos processados, 1 = algum arquivo falhou,
+2 = erro de uso ou nenhum PDF encontrado.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+ENCODINGS = ("original", "auto", "binaria", "cinza", "jpeg")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="nomarkwater",
+        description="Remove marcas d'água cinzentas de arquivos PDF.")
+    parser.add_argument("inputs", nargs="+", metavar="ENTRADA",
+                        help="Arquivos PDF, pastas ou padrões glob (ex.: 'lote/*.pdf')")
+    parser.add_argument("-o", "--output-dir",
+                        help="Pasta de saída (padrão: a mesma pasta de cada arquivo)")
+    parser.add_argument("--suffix", default="_sem_marca",
+                        help="Sufixo adicionado ao nome dos arquivos gerados (padrão: %(default)s)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Procura PDFs também nas subpastas")
+    parser.add_argument("--dpi", type=int, default=300, help="Resolução da renderização (padrão: %(default)s)")
+    parser.add_argument("--lower", type=int, default=180,
+                        help="Tom mínimo de cinza tratado como marca d'água (padrão: %(default)s)")
+    parser.add_argument("--upper", type=int, default=250,
+                        help="Tom máximo de cinza tratado como marca d'água (padrão: %(default)s)")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="Detecta a faixa de cinza da marca d'água em uma pré-passada de baixa "
+                             "resolução (ignora --lower/--upper)")
+    parser.add_argument("--per-page", action="store_true",
+                        help="Com --calibrate, detecta uma faixa para cada página")
+    parser.add_argument("--locate", action="store_true",
+                        help="Localiza a região da marca d'água nas páginas amostradas e limpa só ela "
+                             "(implica --calibrate; páginas sem a marca na região são limpas inteiras)")
+    parser.add_argument("--calibration-file",
+                        help="Arquivo JSON da calibração, reaproveitado se existir (apenas uma entrada); "
+                             "padrão: <saída>.calibration.json")
+    parser.add_argument("--grayscale", action="store_true",
+                        help="Renderiza em escala de cinza (documentos monocromáticos)")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="original",
+                        help="Codificação das páginas geradas (padrão: %(default)s)")
+    parser.add_argument("--jpeg-quality", type=int, default=75,
+                        help="Qualidade JPEG das páginas em cinza ou coloridas (padrão: %(default)s)")
+    parser.add_argument("--vector", action="store_true",
+                        help="Remove a marca editando o conteúdo do PDF, sem rasterizar")
+    parser.add_argument("--first-page", type=int,
+                        help="Primeira página processada (padrão: 1)")
+    parser.add_argument("--last-page", type=int,
+                        help="Última página processada (padrão: a última do PDF)")
+    parser.add_argument("--job-dir",
+                        help="Pasta de checkpoints; cada PDF usa a subpasta com o seu nome e um job "
+                             "interrompido continua das páginas que faltam")
+    parser.add_argument("--cache-dir",
+                        help="Pasta do cache de páginas renderizadas e limpas (desativado se omitido)")
+    parser.add_argument("--cache-size", type=int, default=2048,
+                        help="Tamanho máximo do cache em MB (padrão: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Quantidade de arquivos processados ao mesmo tempo (padrão: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Processos por arquivo para limpar páginas em paralelo (padrão: %(default)s)")
+    parser.add_argument("--json", action="store_true",
+                        help="Imprime o resultado de cada arquivo em JSON na saída padrão")
+    parser.add_argument("--profile", action="store_true",
+                        help="Mede tempo e CPU de cada etapa, latência por página, pico de memória e "
+                             "bytes; grava <saída>.profile.json e inclui o relatório no resultado")
+    return parser
+
+
+def expand_inputs(inputs, recursive=False):
+    """Expande arquivos, pastas e padrões glob em uma lista ordenada de PDFs, sem repetições"""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*") if recursive else os.path.join(item, "*")
+            candidates = glob.glob(pattern, recursive=recursive)
+        elif glob.has_magic(item):
+            candidates = glob.glob(item, recursive=recursive)
+        else:
+            candidates = [item]
+        for path in sorted(candidates):
+            if os.path.isdir(path) or not path.lower().endswith(".pdf"):
+                continue
+            path = os.path.abspath(path)
+            if path not in found:
+                found.append(path)
+    return found
+
+
+def output_path_for(input_path, output_dir, suffix):
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    folder = output_dir or os.path.dirname(input_path)
+    return os.path.join(folder, f"{base}{suffix}.pdf")
+
+
+def job_dir_for(input_path, job_dir):
+    return os.path.join(job_dir, os.path.splitext(os.path.basename(input_path))[0])
+
+
+def run_job(input_path, output_path, options):
+    """
+    Processa um único PDF e devolve o resultado em formato serializável.
+    Executado no processo principal ou em um processo do pool de jobs.
+    """
+    started = time.perf_counter()
+    result = {"input": input_path, "output": output_path}
+    try:
+        if not os.path.isfile(input_path):
+            raise FileNotFoundError(f"Arquivo não encontrado: {input_path}")
+        cache = None
+        if options["cache_dir"]:
+            from bovigenese.cache_paginas import CachePaginas
+            cache = CachePaginas(options["cache_dir"], options["cache_size"] * 1024 * 1024)
+        from bovigenese.instrumentacao import PERFIL_INATIVO, Perfil
+        profile = Perfil() if options["profile"] else PERFIL_INATIVO
+        calibration = None
+        if options["calibrate"]:
+            from calibration import load_or_calibrate
+            calibration_file = options["calibration_file"] or f"{output_path}.calibration.json"
+            with profile.etapa("calibrar"):
+                calibration = load_or_calibrate(input_path, calibration_file, per_page=options["per_page"],
+                                                locate=options["locate"])
+            result["calibration"] = {"lower_gray": calibration["lower_gray"],
+                                     "upper_gray": calibration["upper_gray"],
+                                     "detected": calibration["detected"],
+                                     "region": calibration.get("region"),
+                                     "file": calibration_file}
+        if options["vector"]:
+            from vector_removal import process_pdf_vector
+            lower, upper = options["lower"], options["upper"]
+            if calibration is not None:
+                lower, upper = calibration["lower_gray"], calibration["upper_gray"]
+            with profile.etapa("remover_vetorial"):
+                result["pages"] = process_pdf_vector(input_path, output_path, dpi=options["dpi"],
+                                                     lower_gray=lower, upper_gray=upper)
+            profile.contar_arquivos(input_path, output_path)
+        else:
+            from watermark_remover import process_pdf
+            result["pages"] = process_pdf(input_path, output_path, dpi=options["dpi"],
+                                          lower_gray=options["lower"], upper_gray=options["upper"],
+                                          workers=options["workers"], grayscale=options["grayscale"],
+                                          encoding=options["encoding"],
+                                          jpeg_quality=options["jpeg_quality"],
+                                          calibration=calibration, cache=cache, profile=profile,
+                                          first_page=options["first_page"], last_page=options["last_page"],
+                                          job_dir=options["job_dir"] and job_dir_for(input_path,
+                                                                                     options["job_dir"]))
+        result["status"] = "ok"
+        result["output_bytes"] = os.path.getsize(output_path)
+        if cache is not None:
+            result["cache"] = cache.estatisticas
+        if profile.ativo:
+            result["profile"] = profile.relatorio()
+            profile.salvar(f"{output_path}.profile.json")
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run_jobs(jobs, options, concurrency):
+    """Executa os jobs, em paralelo quando concurrency > 1, na ordem de conclusão"""
+    if concurrency <= 1 or len(jobs) <= 1:
+        for input_path, output_path in jobs:
+            yield run_job(input_path, output_path, options)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=min(concurrency, len(jobs))) as executor:
+        futures = [executor.submit(run_job, input_path, output_path, options)
+                   for input_path, output_path in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.lower <= args.upper <= 255:
+        parser.error("a faixa de cinza precisa satisfazer 0 <= --lower <= --upper <= 255")
+    if args.jobs < 1 or args.workers < 1:
+        parser.error("--jobs e --workers precisam ser maiores que zero")
+    first_page = 1 if args.first_page is None else args.first_page
+    if first_page < 1 or (args.last_page is not None and args.last_page < first_page):
+        parser.error("o intervalo precisa satisfazer 1 <= --first-page <= --last-page")
+    if args.vector and (args.first_page is not None or args.last_page is not None or args.job_dir):
+        parser.error("--first-page, --last-page e --job-dir não se aplicam a --vector")
+
+    inputs = expand_inputs(args.inputs, args.recursive)
+    if not inputs:
+        print("Nenhum arquivo PDF encontrado nas entradas informadas.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.calibration_file and len(inputs) > 1:
+        parser.error("--calibration-file só pode ser usado com uma única entrada")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    options = {
+        "dpi": args.dpi, "lower": args.lower, "upper": args.upper,
+        "grayscale": args.grayscale, "encoding": args.encoding,
+        "jpeg_quality": args.jpeg_quality, "vector": args.vector, "workers": args.workers,
+        "calibrate": args.calibrate or args.locate or bool(args.calibration_file), "per_page": args.per_page,
+        "locate": args.locate, "profile": args.profile,
+        "calibration_file": args.calibration_file,
+        "cache_dir": args.cache_dir, "cache_size": args.cache_size,
+        "first_page": args.first_page, "last_page": args.last_page, "job_dir": args.job_dir,
+    }
+    jobs = [(path, output_path_for(path, args.output_dir, args.suffix)) for path in inputs]
+
+    failures = 0
+    for result in run_jobs(jobs, options, args.jobs):
+        if result["status"] != "ok":
+            failures += 1
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+        elif result["status"] == "ok":
+            print(f"OK    {result['input']} -> {result['output']} ({result['seconds']}s)", flush=True)
+        else:
+            print(f"ERRO  {result['input']}: {result['error']}", file=sys.stderr, flush=True)
+    return EXIT_FAILED if failures else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Os módulos ficam na raiz do repositório e em bovigenese/, sem instalação
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
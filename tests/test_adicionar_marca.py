@@ -0,0 +1,132 @@
+import io
+import os
+import threading
+import zipfile
+
+import openpyxl
+import pytest
+from PIL import Image
+
+from bovigenese import adicionar_marca, paginas_pdf
+from bovigenese.adicionar_marca import AdicionarMarcaDagua
+from bovigenese.instrumentacao import Perfil
+
+MARCA = os.path.join(os.path.dirname(adicionar_marca.__file__), "marca.png")
+
+
+@pytest.fixture
+def processador():
+    return AdicionarMarcaDagua(MARCA)
+
+
+def test_marca_pronta_e_reaproveitada(processador):
+    marca = processador.obter_marca((300, 200))
+    assert processador.obter_marca((300, 200)) is marca
+    assert max(marca.size[0] / 300, marca.size[1] / 200) == pytest.approx(1, abs=0.01)
+
+    # Os outros tipos partem da mesma marca redimensionada, sem redimensionar de novo
+    redimensionadas = []
+    original = processador.redimensionar_marca
+    processador.redimensionar_marca = lambda tamanho: redimensionadas.append(tamanho) or original(tamanho)
+    png = processador.obter_marca((300, 200), "png")
+    sobreposicao = processador.obter_marca((300, 200), "sobreposicao")
+    assert redimensionadas == []
+    assert processador.obter_marca((300, 200), "png") is png
+    assert processador.obter_marca((300, 200), "sobreposicao") is sobreposicao
+    assert Image.open(io.BytesIO(png)).size == marca.size
+    assert sobreposicao.size == marca.size
+
+
+def test_marcas_usadas_ha_mais_tempo_sao_descartadas(monkeypatch, processador):
+    monkeypatch.setattr(adicionar_marca, "TAMANHO_CACHE_MARCAS", 3)
+    primeira = processador.obter_marca((100, 100))
+    segunda = processador.obter_marca((110, 110))
+    processador.obter_marca((120, 120))
+    # Usar a primeira a torna a mais recente; a segunda passa a ser a mais antiga
+    assert processador.obter_marca((100, 100)) is primeira
+    processador.obter_marca((130, 130))
+
+    assert len(processador._marcas) == 3
+    assert processador.obter_marca((100, 100)) is primeira
+    assert processador.obter_marca((110, 110)) is not segunda
+
+
+def test_opacidade_faz_parte_da_chave(processador):
+    marca = processador.obter_marca((200, 200))
+    processador.opacidade = 0.6
+    assert processador.obter_marca((200, 200)) is not marca
+
+
+def test_acessos_concorrentes(monkeypatch, processador):
+    monkeypatch.setattr(adicionar_marca, "TAMANHO_CACHE_MARCAS", 4)
+    tamanhos = [(100 + 10 * numero, 100) for numero in range(8)]
+    barreira = threading.Barrier(8)
+    erros, resultados = [], {}
+
+    def trabalhar(indice):
+        try:
+            barreira.wait()
+            for rodada in range(20):
+                tamanho = tamanhos[(indice + rodada) % len(tamanhos)]
+                tipo = ("marca", "png", "sobreposicao")[rodada % 3]
+                pronta = processador.obter_marca(tamanho, tipo)
+                resultados.setdefault((tamanho, tipo), set()).add(
+                    pronta if isinstance(pronta, bytes) else pronta.tobytes())
+        except Exception as erro:  # pragma: no cover - só em caso de falha
+            erros.append(erro)
+
+    threads = [threading.Thread(target=trabalhar, args=(indice,)) for indice in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert erros == []
+    assert len(processador._marcas) <= 4
+    # Mesmo recalculada após ser descartada, a marca de cada tamanho e tipo é sempre a mesma
+    assert all(len(conteudos) == 1 for conteudos in resultados.values())
+
+
+def test_excel_com_uma_unica_midia_para_todas_as_planilhas(tmp_path, processador):
+    entrada, saida = str(tmp_path / "entrada.xlsx"), str(tmp_path / "saida.xlsx")
+    workbook = openpyxl.Workbook()
+    workbook.active["A1"] = "primeira"
+    for nome in ("Segunda", "Terceira"):
+        workbook.create_sheet(nome)["A1"] = nome
+    workbook.save(entrada)
+
+    processador.adicionar_marca_excel(entrada, saida, rapido=False)
+
+    with zipfile.ZipFile(saida) as pacote:
+        nomes = pacote.namelist()
+        assert len(nomes) == len(set(nomes))
+        midias = [nome for nome in nomes if nome.startswith("xl/media/")]
+        assert len(midias) == 1
+        assert pacote.read(midias[0]) == processador.obter_marca((300, 200), "png")
+        relacoes = [pacote.read(nome) for nome in nomes if nome.startswith("xl/drawings/_rels/")]
+    assert len(relacoes) == 3
+    alvo = ("/" + midias[0]).encode()
+    assert all(alvo in dados for dados in relacoes)
+
+    marcado = openpyxl.load_workbook(saida)
+    assert [len(planilha._images) for planilha in marcado] == [1, 1, 1]
+    assert [planilha["A1"].value for planilha in marcado] == ["primeira", "Segunda", "Terceira"]
+
+
+def renderizacao_falsa(monkeypatch, paginas):
+    """Substitui o poppler: o PDF tem `paginas` páginas brancas"""
+    monkeypatch.setattr(paginas_pdf, "pdfinfo_from_path", lambda caminho, poppler_path=None: {"Pages": paginas})
+    monkeypatch.setattr(paginas_pdf, "convert_from_path",
+                        lambda caminho, first_page, last_page, **kwargs:
+                        [Image.new("RGB", (200, 280), "white") for _ in range(first_page, last_page + 1)])
+
+
+def test_perfil_conta_os_bytes_de_cada_arquivo_uma_vez(tmp_path, monkeypatch):
+    renderizacao_falsa(monkeypatch, 2)
+    entrada, saida = tmp_path / "entrada.pdf", tmp_path / "saida.pdf"
+    Image.new("RGB", (200, 280), "white").save(entrada, save_all=True,
+                                                append_images=[Image.new("RGB", (200, 280), "gray")])
+    perfil = Perfil()
+
+    AdicionarMarcaDagua(MARCA, perfil=perfil).adicionar_marca_pdf(str(entrada), str(saida))
+    assert perfil.bytes == {"lidos": os.path.getsize(entrada), "gravados": os.path.getsize(saida)}
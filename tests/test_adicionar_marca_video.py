@@ -0,0 +1,214 @@
+import os
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from bovigenese import adicionar_marca_video
+from bovigenese.adicionar_marca_video import AdicionarMarcaVideo, planejar_segmentos
+
+MARCA = os.path.join(os.path.dirname(adicionar_marca_video.__file__), "marca.png")
+
+
+def gravar_video(caminho, frames=30, fps=10, tamanho=(64, 48)):
+    writer = cv2.VideoWriter(str(caminho), cv2.VideoWriter_fourcc(*"mp4v"), fps, tamanho)
+    for numero in range(frames):
+        writer.write(np.full((tamanho[1], tamanho[0], 3), numero * 5 % 256, np.uint8))
+    writer.release()
+    return str(caminho)
+
+
+class VideoFalso:
+    """Substitui o cv2.VideoCapture com as propriedades de um vídeo, sem abrir arquivo"""
+
+    def __init__(self, fps, frames):
+        self.propriedades = {cv2.CAP_PROP_FPS: fps, cv2.CAP_PROP_FRAME_COUNT: frames}
+
+    def isOpened(self):
+        return True
+
+    def get(self, propriedade):
+        return self.propriedades[propriedade]
+
+    def release(self):
+        pass
+
+
+def ffprobe_falso(monkeypatch, linhas):
+    monkeypatch.setattr(adicionar_marca_video.shutil, "which", lambda programa: f"/usr/bin/{programa}")
+
+    def executar(comando, **kwargs):
+        assert comando[0] == "ffprobe"
+        return subprocess.CompletedProcess(comando, 0, stdout="\n".join(linhas) + "\n", stderr="")
+    monkeypatch.setattr(adicionar_marca_video.subprocess, "run", executar)
+
+
+def test_segmentos_comecam_nos_keyframes(monkeypatch):
+    # 25 fps, 1000 frames (40 s), keyframe a cada 2 s
+    monkeypatch.setattr(adicionar_marca_video.cv2, "VideoCapture", lambda caminho: VideoFalso(25.0, 1000))
+    ffprobe_falso(monkeypatch, [f"{segundo:.6f},{'K_' if segundo % 2 == 0 else '__'}" for segundo in range(40)])
+
+    assert planejar_segmentos("video.mp4", 4) == [(0, 250), (250, 500), (500, 750), (750, None)]
+    # Alvos fora dos keyframes vão para o keyframe mais próximo
+    assert planejar_segmentos("video.mp4", 3) == [(0, 350), (350, 650), (650, None)]
+
+
+def test_segmentos_curtos_nao_sao_divididos(monkeypatch):
+    # 3 s de vídeo: com segmentos de pelo menos 2 s, só cabe um
+    monkeypatch.setattr(adicionar_marca_video.cv2, "VideoCapture", lambda caminho: VideoFalso(25.0, 75))
+    ffprobe_falso(monkeypatch, ["0.000000,K_", "1.000000,K_", "2.000000,K_"])
+    assert planejar_segmentos("video.mp4", 8) == [(0, None)]
+
+
+def test_sem_ffprobe_corta_uniformemente(monkeypatch):
+    monkeypatch.setattr(adicionar_marca_video.cv2, "VideoCapture", lambda caminho: VideoFalso(25.0, 1000))
+    monkeypatch.setattr(adicionar_marca_video.shutil, "which", lambda programa: None)
+    assert planejar_segmentos("video.mp4", 4) == [(0, 250), (250, 500), (500, 750), (750, None)]
+
+
+def test_main_planeja_uma_unica_vez(monkeypatch, tmp_path):
+    planos, chamadas = [], []
+
+    def planejar(video_path, partes):
+        planos.append(video_path)
+        return [(0, 15), (15, None)]
+
+    def processar_videos(self, trabalhos, workers=None, segmentos=None):
+        chamadas.append((trabalhos, segmentos))
+    monkeypatch.setattr(adicionar_marca_video, "planejar_segmentos", planejar)
+    monkeypatch.setattr(adicionar_marca_video, "pode_segmentar", lambda workers: True)
+    monkeypatch.setattr(AdicionarMarcaVideo, "processar_videos", processar_videos)
+    monkeypatch.delenv("MARCA_CACHE_SAIDA", raising=False)
+    monkeypatch.setattr(sys, "argv", ["adicionar_marca_video.py", "entrada.mp4", "saida.mp4", MARCA])
+
+    adicionar_marca_video.main()
+    assert planos == ["entrada.mp4"]
+    assert chamadas == [([("entrada.mp4", "saida.mp4")], [[(0, 15), (15, None)]])]
+
+
+def test_processar_videos_usa_o_plano_recebido(monkeypatch, tmp_path):
+    video = gravar_video(tmp_path / "entrada.mp4")
+    saida = str(tmp_path / "saida.mp4")
+
+    def planejar(video_path, partes):
+        raise AssertionError("o plano recebido deve ser usado")
+    monkeypatch.setattr(adicionar_marca_video, "planejar_segmentos", planejar)
+
+    resumo, = AdicionarMarcaVideo(MARCA).processar_videos([(video, saida)], workers=1, segmentos=[[(0, None)]])
+    assert resumo["frames"] == 30
+    assert resumo["segmentos"] == 1
+    # O tempo do vídeo vai do seu primeiro segmento até o fim: nunca zero nem negativo
+    assert resumo["segundos"] > 0
+    assert cv2.VideoCapture(saida).get(cv2.CAP_PROP_FRAME_COUNT) == pytest.approx(30)
+
+
+def test_mistura_inteira_igual_a_referencia_em_ponto_flutuante():
+    rng = np.random.default_rng(3)
+    marca_bgra = rng.integers(0, 256, size=(40, 60, 4), dtype=np.uint8)
+    # Bordas transparentes são descartadas da região processada
+    marca_bgra[:5, :, 3] = 0
+    marca_bgra[:, -7:, 3] = 0
+    frame = rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)
+
+    processador = AdicionarMarcaVideo(MARCA, opacidade=0.37)
+    marca = adicionar_marca_video.MarcaPreparada(marca_bgra, processador.opacidade, (160, 120))
+    assert (marca.altura, marca.largura) == (35, 53)
+    resultado = processador.adicionar_marca_frame(frame.copy(), marca)
+
+    # frame * (1 - a) + cor * a, com a = alfa * opacidade / 255, no frame inteiro
+    x, y = (160 - 60) // 2, (120 - 40) // 2
+    esperado = frame.astype(np.float64)
+    alfa = marca_bgra[:, :, 3:].astype(np.float64) * processador.opacidade / 255
+    regiao = esperado[y:y + 40, x:x + 60]
+    regiao[...] = regiao * (1 - alfa) + marca_bgra[:, :, :3] * alfa
+    assert np.abs(resultado.astype(np.int16) - np.rint(esperado)).max() <= 1
+    # Fora da marca o frame não muda
+    assert np.array_equal(resultado[:y], frame[:y])
+
+
+def test_marca_totalmente_transparente_nao_altera_o_frame():
+    marca_bgra = np.zeros((10, 10, 4), dtype=np.uint8)
+    frame = np.full((20, 20, 3), 77, dtype=np.uint8)
+    processador = AdicionarMarcaVideo(MARCA)
+    assert np.array_equal(processador.adicionar_marca_frame(frame.copy(), marca_bgra), frame)
+
+
+class FramesSinteticos:
+    """Substitui o cv2.VideoCapture: cada frame traz o seu número no primeiro pixel"""
+
+    def __init__(self, total):
+        self.total = total
+        self.lidos = 0
+
+    def read(self):
+        if self.lidos >= self.total:
+            return False, None
+        frame = np.zeros((4, 4, 3), dtype=np.uint8)
+        frame[0, 0, 0] = self.lidos % 256
+        frame[0, 0, 1] = self.lidos // 256
+        self.lidos += 1
+        return True, frame
+
+
+class Gravador:
+    def __init__(self, falhar_em=None):
+        self.numeros = []
+        self.falhar_em = falhar_em
+
+    def write(self, frame):
+        if len(self.numeros) == self.falhar_em:
+            raise OSError("disco cheio")
+        self.numeros.append(int(frame[0, 0, 0]) + 256 * int(frame[0, 0, 1]))
+
+
+class MisturaDesordenada(AdicionarMarcaVideo):
+    """Frames terminam a mistura fora de ordem; o pixel [0, 1] marca que passaram por ela"""
+
+    def __init__(self, falhar_em=None):
+        super().__init__(MARCA)
+        self.falhar_em = falhar_em
+
+    def _aplicar_frame(self, frame, marca):
+        numero = int(frame[0, 0, 0]) + 256 * int(frame[0, 0, 1])
+        if numero == self.falhar_em:
+            raise ValueError("frame corrompido")
+        time.sleep(0.002 * (numero % 3 == 0))
+        frame[0, 1] = 255
+        return frame
+
+
+def test_pipeline_grava_os_frames_na_ordem_de_leitura():
+    video, gravador = FramesSinteticos(200), Gravador()
+    estatisticas = MisturaDesordenada()._processar_pipeline(video, gravador, None, 200, workers=4, fila=8,
+                                                             mostrar_progresso=False)
+    assert gravador.numeros == list(range(200))
+    assert estatisticas["frames"] == 200
+
+
+def test_pipeline_respeita_o_limite_de_frames():
+    video, gravador = FramesSinteticos(200), Gravador()
+    MisturaDesordenada()._processar_pipeline(video, gravador, None, 200, workers=2, fila=4, limite=50,
+                                             mostrar_progresso=False)
+    assert gravador.numeros == list(range(50))
+    assert video.lidos == 50
+
+
+def test_falha_na_codificacao_interrompe_a_decodificacao():
+    video, gravador = FramesSinteticos(10000), Gravador(falhar_em=20)
+    with pytest.raises(OSError):
+        MisturaDesordenada()._processar_pipeline(video, gravador, None, 10000, workers=2, fila=4,
+                                                 mostrar_progresso=False)
+    # A fila limitada segura a decodificação: no máximo alguns frames além dos gravados
+    assert video.lidos < 20 + 4 + 4
+    assert gravador.numeros == list(range(20))
+
+
+def test_falha_na_mistura_e_propagada():
+    video, gravador = FramesSinteticos(100), Gravador()
+    with pytest.raises(ValueError, match="frame corrompido"):
+        MisturaDesordenada(falhar_em=30)._processar_pipeline(video, gravador, None, 100, workers=2, fila=4,
+                                                             mostrar_progresso=False)
+    assert gravador.numeros == list(range(30))
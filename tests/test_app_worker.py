@@ -0,0 +1,79 @@
+import os
+import queue
+import threading
+
+import app
+from app import ProcessingCancelled, ProcessingWorker, output_path_for
+
+
+def eventos(fila):
+    recebidos = []
+    while not fila.empty():
+        recebidos.append(fila.get_nowait())
+    return recebidos
+
+
+def executar(monkeypatch, pdf_paths, processar, cancel_event=None, **opcoes):
+    chamadas = []
+
+    def process_pdf(pdf_path, output_pdf, **kwargs):
+        chamadas.append((pdf_path, output_pdf, kwargs))
+        processar(pdf_path, kwargs)
+    monkeypatch.setattr(app, "process_pdf", process_pdf)
+    fila = queue.Queue()
+    worker = ProcessingWorker(pdf_paths, fila, cancel_event or threading.Event(), **opcoes)
+    worker.run()
+    return eventos(fila), chamadas
+
+
+def test_progresso_e_conclusao(monkeypatch, tmp_path):
+    pdf = str(tmp_path / "a.pdf")
+
+    def processar(pdf_path, kwargs):
+        for feitas in (1, 2):
+            kwargs["progress"](feitas, 2)
+    recebidos, chamadas = executar(monkeypatch, [pdf], processar)
+
+    assert [evento[0] for evento in recebidos] == ["started", "progress", "progress", "done", "finished"]
+    assert [evento[2:4] for evento in recebidos if evento[0] == "progress"] == [(1, 2), (2, 2)]
+    # Padrão de sempre: saída PDF_sem_marca.pdf, página inteira com a faixa fixa, sem calibração
+    assert recebidos[3] == ("done", pdf, os.path.join(str(tmp_path), "PDF_sem_marca.pdf"))
+    assert chamadas[0][2]["calibration"] is None
+    assert chamadas[0][2].get("encoding", "original") == "original"
+
+
+def test_cancelamento_interrompe_a_fila(monkeypatch, tmp_path):
+    pdfs = [str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]
+    cancelar = threading.Event()
+
+    def processar(pdf_path, kwargs):
+        kwargs["progress"](1, 3)
+        cancelar.set()
+        if kwargs["cancel_event"].is_set():
+            raise ProcessingCancelled("Processamento cancelado")
+    recebidos, chamadas = executar(monkeypatch, pdfs, processar, cancel_event=cancelar)
+
+    assert [evento[:2] for evento in recebidos] == [
+        ("started", pdfs[0]), ("progress", pdfs[0]), ("cancelled", pdfs[0]), ("cancelled", pdfs[1]),
+        ("finished",)]
+    # O segundo PDF nem chega a ser processado
+    assert [chamada[0] for chamada in chamadas] == [pdfs[0]]
+
+
+def test_erro_segue_para_o_proximo_pdf(monkeypatch, tmp_path):
+    pdfs = [str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]
+
+    def processar(pdf_path, kwargs):
+        if pdf_path == pdfs[0]:
+            raise app.PDFProcessingError("PDF corrompido")
+    recebidos, _ = executar(monkeypatch, pdfs, processar)
+
+    assert recebidos[1] == ("error", pdfs[0], "PDF corrompido")
+    assert recebidos[-2][0] == "done"
+
+
+def test_nome_da_saida_com_outros_pdfs_da_mesma_pasta(tmp_path):
+    a, b = str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")
+    outro = str(tmp_path / "outra" / "c.pdf")
+    assert output_path_for(a, [a, b]) == str(tmp_path / "a_sem_marca.pdf")
+    assert output_path_for(outro, [a, b, outro]) == str(tmp_path / "outra" / "PDF_sem_marca.pdf")
@@ -0,0 +1,52 @@
+import os
+import pickle
+
+import numpy as np
+from PIL import Image
+
+from bovigenese.cache_paginas import CAMADA_PROCESSADAS, CAMADA_RENDERIZADAS, CachePaginas
+
+
+def test_copia_do_pool_comeca_zerada_e_nao_remove_paginas(tmp_path, monkeypatch):
+    cache = CachePaginas(str(tmp_path / "cache"))
+    cache.guardar(cache.chave("a"), Image.new("L", (10, 10)))
+    cache.obter(cache.chave("a"), CAMADA_RENDERIZADAS)
+    assert cache.estatisticas[CAMADA_RENDERIZADAS]["acertos"] == 1
+
+    copia = pickle.loads(pickle.dumps(cache))
+    # Um acerto do processo principal não pode aparecer como acerto da tarefa
+    assert copia.estatisticas[CAMADA_RENDERIZADAS]["acertos"] == 0
+
+    # A cópia não percorre o diretório para controlar o tamanho; só soma os bytes gravados
+    monkeypatch.setattr(CachePaginas, "_entradas", lambda self: (_ for _ in ()).throw(AssertionError))
+    copia.guardar(copia.chave("b"), Image.new("L", (10, 10)))
+    copia.guardar(copia.chave("c"), Image.new("L", (10, 10)))
+    monkeypatch.undo()
+    gravadas = [os.path.getsize(copia._caminho(copia.chave(nome))) for nome in "bc"]
+    assert copia.bytes_novos == sum(gravadas)
+
+    cache.contabilizar(copia.bytes_novos)
+    assert cache._tamanho_atual == cache.tamanho()
+
+
+def test_paginas_guardadas_comprimidas_e_sem_perdas(tmp_path):
+    cache = CachePaginas(str(tmp_path / "cache"))
+    pixels = np.full((600, 400, 3), 255, dtype=np.uint8)
+    pixels[100:110, 50:350] = 0
+    pixels[300:400, 100:300] = (210, 200, 190)
+    cache.guardar(cache.chave("pagina"), Image.fromarray(pixels))
+
+    assert cache.tamanho() < pixels.nbytes / 20
+    lida = cache.obter(cache.chave("pagina"))
+    assert lida.mode == "RGB"
+    assert np.array_equal(np.asarray(lida), pixels)
+
+
+def test_pagina_corrompida_conta_como_falha(tmp_path):
+    cache = CachePaginas(str(tmp_path / "cache"))
+    caminho = cache._caminho(cache.chave("pagina"))
+    os.makedirs(os.path.dirname(caminho))
+    with open(caminho, "wb") as f:
+        f.write(b"nao e png")
+    assert cache.obter(cache.chave("pagina")) is None
+    assert cache.estatisticas[CAMADA_PROCESSADAS]["falhas"] == 1
@@ -0,0 +1,71 @@
+import os
+import threading
+
+from bovigenese.cache_saida import CacheSaida, com_cache_saida
+
+
+class Processador:
+    def __init__(self, cache, marca):
+        self.cache_saida = cache
+        self.marca_dagua_path = marca
+        self.opacidade = 0.3
+        self.chamadas = []
+
+    @com_cache_saida("1", ignorar=("mostrar_progresso",))
+    def processar(self, entrada, output_path, qualidade=75, mostrar_progresso=True):
+        self.chamadas.append((qualidade, mostrar_progresso))
+        with open(output_path, "w") as f:
+            f.write(f"{qualidade}")
+
+
+def preparar(tmp_path):
+    entrada, marca = tmp_path / "entrada.txt", tmp_path / "marca.png"
+    entrada.write_text("conteudo")
+    marca.write_text("marca")
+    cache = CacheSaida(str(tmp_path / "cache"))
+    return Processador(cache, str(marca)), str(entrada), cache
+
+
+def test_argumentos_por_posicao_ou_nome_geram_a_mesma_chave(tmp_path):
+    processador, entrada, _ = preparar(tmp_path)
+    saida = str(tmp_path / "saida.txt")
+    processador.processar(entrada, saida)
+    processador.processar(entrada, saida, 75)
+    processador.processar(entrada, saida, qualidade=75)
+    # Ignorado também quando passado por posição
+    processador.processar(entrada, saida, 75, False)
+    assert len(processador.chamadas) == 1
+
+    processador.processar(entrada, saida, 50)
+    assert len(processador.chamadas) == 2
+
+
+def test_arquivos_de_trava_sao_removidos(tmp_path):
+    processador, entrada, cache = preparar(tmp_path)
+    threads = [threading.Thread(target=processador.processar,
+                                args=(entrada, str(tmp_path / f"saida{n}.txt"), n % 3))
+               for n in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(processador.chamadas) == 3
+    assert os.listdir(os.path.join(cache.diretorio, "travas")) == []
+
+
+def test_remove_os_arquivos_usados_ha_mais_tempo(tmp_path):
+    cache = CacheSaida(str(tmp_path / "cache"), tamanho_maximo=250)
+    arquivo = tmp_path / "gerado.pdf"
+    arquivo.write_bytes(b"x" * 100)
+    for numero, chave in enumerate(("a" * 64, "b" * 64, "c" * 64)):
+        cache.guardar(chave, str(arquivo))
+        # Datas de acesso distintas, da mais antiga para a mais nova
+        os.utime(cache._caminho(chave, ".pdf"), (numero, numero))
+
+    cache.guardar("d" * 64, str(arquivo))
+    destino = str(tmp_path / "saida.pdf")
+    assert not cache.copiar("a" * 64, destino)
+    assert not cache.copiar("b" * 64, destino)
+    assert cache.copiar("d" * 64, destino)
+    # Os arquivos de trava e os temporários não contam para o limite
+    assert cache.tamanho() == 200
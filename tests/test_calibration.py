@@ -0,0 +1,83 @@
+import numpy as np
+
+import calibration
+from calibration import MAX_LEVEL, detect_gray_band
+from watermark_remover import LOWER_GRAY, UPPER_GRAY
+
+
+def calibrar_contando(chamadas):
+    def calibrar(pdf_path, per_page=False, dpi=calibration.CALIBRATION_DPI, poppler_path=None,
+                 locate=False):
+        chamadas.append(dpi)
+        return {"lower_gray": 180, "upper_gray": 250, "detected": True, "dpi": dpi,
+                "version": calibration.CALIBRATION_VERSION}
+    return calibrar
+
+
+def test_reaproveita_so_para_o_mesmo_pdf_e_dpi(tmp_path, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(calibration, "calibrate", calibrar_contando(chamadas))
+    pdf = tmp_path / "doc.pdf"
+    arquivo = str(tmp_path / "doc.calibration.json")
+    pdf.write_bytes(b"%PDF-1.4 primeira versao")
+
+    calibration.load_or_calibrate(str(pdf), arquivo)
+    calibration.load_or_calibrate(str(pdf), arquivo)
+    assert chamadas == [calibration.CALIBRATION_DPI]
+
+    # Mesmo nome, outro conteúdo: a calibração gravada não vale mais
+    pdf.write_bytes(b"%PDF-1.4 segunda versao")
+    calibration.load_or_calibrate(str(pdf), arquivo)
+    assert len(chamadas) == 2
+
+    calibration.load_or_calibrate(str(pdf), arquivo, dpi=100)
+    assert chamadas[-1] == 100
+    assert calibration.load_calibration(arquivo)["dpi"] == 100
+
+
+def histograma(picos):
+    """Histograma de 256 tons com {tom: pixels}"""
+    valores = np.zeros(256)
+    for tom, pixels in picos.items():
+        valores[tom] = pixels
+    return valores
+
+
+def pico(centro, largura, pixels):
+    return {tom: pixels for tom in range(centro - largura, centro + largura + 1)}
+
+
+def test_faixa_em_torno_de_um_pico_claro():
+    # Texto escuro, papel branco e a marca entre 195 e 215
+    lower, upper, detected = detect_gray_band(histograma({20: 5000, 255: 80000, **pico(205, 10, 400)}))
+    assert detected
+    # Os dois limites acompanham o pico (com a folga de MARGIN e a suavização), não os valores fixos
+    assert 180 <= lower <= 195
+    assert 215 <= upper <= 225
+
+
+def test_sem_pico_devolve_a_faixa_padrao():
+    assert detect_gray_band(histograma({20: 5000, 255: 80000})) == (LOWER_GRAY, UPPER_GRAY, False)
+    assert detect_gray_band(np.zeros(256)) == (LOWER_GRAY, UPPER_GRAY, False)
+
+
+def test_pico_junto_ao_papel_nao_passa_do_limite_superior():
+    lower, upper, detected = detect_gray_band(histograma({20: 5000, 255: 80000, **pico(244, 4, 400)}))
+    assert detected
+    assert 230 <= lower <= 240
+    assert upper == MAX_LEVEL
+
+
+def test_calibracao_de_outra_versao_e_refeita(tmp_path, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(calibration, "calibrate", calibrar_contando(chamadas))
+    pdf = tmp_path / "doc.pdf"
+    arquivo = str(tmp_path / "doc.calibration.json")
+    pdf.write_bytes(b"%PDF-1.4")
+    calibration.load_or_calibrate(str(pdf), arquivo)
+
+    antiga = calibration.load_calibration(arquivo)
+    del antiga["version"]
+    calibration.save_calibration(antiga, arquivo)
+    calibration.load_or_calibrate(str(pdf), arquivo)
+    assert len(chamadas) == 2
@@ -0,0 +1,59 @@
+import numpy as np
+from PIL import Image
+
+from calibration import locate_region
+from watermark_remover import clean_page
+
+ALTURA, LARGURA = 200, 150
+CINZA = 210
+CAIXA = (60, 40, 110, 90)  # x0, y0, x1, y1 da marca, em pixels
+
+
+def amostra(semente):
+    """Página em baixa resolução: papel branco, texto que muda por página e a marca sempre no mesmo lugar"""
+    rng = np.random.default_rng(semente)
+    pagina = np.full((ALTURA, LARGURA), 255, dtype=np.uint8)
+    for linha in rng.choice(np.arange(10, ALTURA - 10, 6), size=15, replace=False):
+        pagina[linha:linha + 2, 10:LARGURA - 10] = 20
+    # Cinza que aparece só nesta página (foto, tabela) não pode entrar na região
+    x, y = rng.integers(0, LARGURA - 20), rng.integers(0, ALTURA - 20)
+    pagina[y:y + 15, x:x + 15] = CINZA
+    x0, y0, x1, y1 = CAIXA
+    pagina[y0:y1, x0:x1] = CINZA
+    return pagina
+
+
+def test_localiza_a_marca_repetida():
+    regiao = locate_region([amostra(n) for n in range(6)], 180, 250)
+    assert regiao is not None
+    x0, y0, x1, y1 = regiao["box"]
+    # A caixa contém a marca (com a folga) e fica perto dela
+    assert x0 <= CAIXA[0] / LARGURA <= x0 + 0.05 and x1 - 0.05 <= CAIXA[2] / LARGURA <= x1
+    assert y0 <= CAIXA[1] / ALTURA <= y0 + 0.05 and y1 - 0.05 <= CAIXA[3] / ALTURA <= y1
+    assert regiao["density"] > 0.5
+
+
+def test_sem_padrao_estavel():
+    rng = np.random.default_rng(0)
+    amostras = [np.where(rng.random((ALTURA, LARGURA)) < 0.02, CINZA, 255).astype(np.uint8) for _ in range(6)]
+    assert locate_region(amostras, 180, 250) is None
+    assert locate_region([amostra(0)], 180, 250) is None
+
+
+def test_limpa_so_a_regiao():
+    regiao = locate_region([amostra(n) for n in range(6)], 180, 250)
+    # Página em resolução maior, com cinza também fora da região
+    pagina = np.kron(amostra(1), np.ones((2, 2), dtype=np.uint8))
+    pagina[0:10, 0:10] = CINZA
+    limpa = np.asarray(clean_page(Image.fromarray(pagina), 180, 250, region=regiao))
+    x0, y0, x1, y1 = (2 * v for v in CAIXA)
+    assert (limpa[y0:y1, x0:x1] == 255).all()
+    assert (limpa[0:10, 0:10] == CINZA).all()
+
+
+def test_pagina_sem_a_marca_na_regiao_e_limpa_inteira():
+    regiao = locate_region([amostra(n) for n in range(6)], 180, 250)
+    pagina = np.full((ALTURA, LARGURA), 255, dtype=np.uint8)
+    pagina[0:10, 0:10] = CINZA
+    limpa = np.asarray(clean_page(Image.fromarray(pagina), 180, 250, region=regiao))
+    assert (limpa[0:10, 0:10] == 255).all()
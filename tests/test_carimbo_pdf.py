@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, NameObject, NumberObject
+
+from bovigenese import adicionar_marca
+from bovigenese.adicionar_marca import AdicionarMarcaDagua
+from bovigenese.carimbo_pdf import DPI_MARCA, matriz_marca
+
+MARCA = os.path.join(os.path.dirname(adicionar_marca.__file__), "marca.png")
+A4 = (595, 842)
+
+
+def gravar_pdf(caminho, paginas):
+    """PDF com um retângulo desenhado em cada página; paginas: lista de (largura, altura, rotação)"""
+    writer = PdfWriter()
+    for largura, altura, rotacao in paginas:
+        pagina = writer.add_blank_page(largura, altura)
+        conteudo = DecodedStreamObject()
+        conteudo.set_data(b"0 0 1 rg 50 50 100 100 re f")
+        pagina[NameObject("/Contents")] = writer._add_object(conteudo)
+        if rotacao:
+            pagina[NameObject("/Rotate")] = NumberObject(rotacao)
+    with open(caminho, "wb") as f:
+        writer.write(f)
+    return str(caminho)
+
+
+def imagens(reader):
+    """XObjects de imagem desenhados por página, pelo número do objeto"""
+    return [{valor.idnum for valor in pagina["/Resources"]["/XObject"].values()} for pagina in reader.pages]
+
+
+def test_uma_unica_marca_compartilhada_pelas_paginas(tmp_path):
+    entrada = gravar_pdf(tmp_path / "entrada.pdf", [(*A4, 0)] * 5 + [(*A4, 90)])
+    saida = str(tmp_path / "saida.pdf")
+    AdicionarMarcaDagua(MARCA).adicionar_marca_pdf(entrada, saida, vetorial=True)
+
+    reader = PdfReader(saida)
+    por_pagina = imagens(reader)
+    assert len(set().union(*por_pagina)) == 1
+    assert all(len(referencias) == 1 for referencias in por_pagina)
+    # O conteúdo original continua nas páginas, antes da marca
+    for pagina in reader.pages:
+        assert b"50 50 100 100 re f" in pagina.get_contents().get_data()
+
+
+def test_marca_reduzida_ao_tamanho_desenhado(tmp_path):
+    entrada = gravar_pdf(tmp_path / "entrada.pdf", [(*A4, 0)] * 10)
+    saida = str(tmp_path / "saida.pdf")
+    AdicionarMarcaDagua(MARCA).adicionar_marca_pdf(entrada, saida, vetorial=True)
+
+    marca = next(iter(PdfReader(saida).pages[0]["/Resources"]["/XObject"].values())).get_object()
+    # 30% da largura da página A4 na resolução do modo rasterizado
+    assert marca["/Width"] == pytest.approx(A4[0] * 0.3 * DPI_MARCA / 72, abs=1)
+    assert marca["/SMask"]["/Width"] == marca["/Width"]
+    # O arquivo cresce só o tamanho de uma marca, não o da imagem original (2854x821)
+    crescimento = os.path.getsize(saida) - os.path.getsize(entrada)
+    assert crescimento < 24 * 1024
+
+
+def test_vetorial_e_opcional(tmp_path, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(adicionar_marca, "carimbar_pdf", lambda *args, **kwargs: chamadas.append(args))
+    monkeypatch.setattr(adicionar_marca, "processar_paginas_pdf", lambda *args, **kwargs: chamadas.append("raster"))
+    entrada = gravar_pdf(tmp_path / "entrada.pdf", [(*A4, 0)])
+    AdicionarMarcaDagua(MARCA).adicionar_marca_pdf(entrada, str(tmp_path / "saida.pdf"))
+    assert chamadas == ["raster"]
+
+
+@pytest.mark.parametrize("rotacao", [0, 90, 180, 270])
+def test_marca_centralizada_e_na_horizontal_da_pagina_exibida(tmp_path, rotacao):
+    reader = PdfReader(gravar_pdf(tmp_path / "entrada.pdf", [(*A4, rotacao)]))
+    a, b, c, d, e, f = matriz_marca(reader.pages[0], 2854, 821)
+
+    # Largura visível da página exibida: a altura do A4 quando girado 90/270 graus
+    visivel = A4[1] if rotacao in (90, 270) else A4[0]
+    assert (a ** 2 + b ** 2) ** 0.5 == pytest.approx(visivel * 0.3)
+    # O centro da marca cai no centro da página em qualquer rotação
+    assert (e + (a + c) / 2, f + (b + d) / 2) == pytest.approx((A4[0] / 2, A4[1] / 2))
+    # A base da marca, girada junto com a página, fica horizontal na exibição
+    base = {0: (1, 0), 90: (0, 1), 180: (-1, 0), 270: (0, -1)}[rotacao]
+    assert (a / abs(a + b), b / abs(a + b)) == pytest.approx(base)
@@ -0,0 +1,64 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bovigenese import cliente_marca
+
+
+def servidor(respostas):
+    """Serviço falso que responde aos POSTs com os códigos da lista, na ordem"""
+    recebidos = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            recebidos.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            codigo = respostas[min(len(recebidos), len(respostas)) - 1]
+            dados = json.dumps({"status": "ok" if codigo == 200 else "erro"}).encode()
+            self.send_response(codigo)
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass
+
+    http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    return http, recebidos
+
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(cliente_marca, "ESPERA_FILA_CHEIA", 0.01)
+
+
+def test_servico_fora_do_ar_processa_localmente():
+    with socket.socket() as livre:
+        livre.bind(("127.0.0.1", 0))
+        porta = livre.getsockname()[1]
+    assert cliente_marca.enviar(f"http://127.0.0.1:{porta}", "a.pdf", "b.pdf", "m.png") is None
+
+
+def test_fila_cheia_tenta_de_novo():
+    http, recebidos = servidor([503, 503, 200])
+    try:
+        resposta = cliente_marca.enviar(f"http://127.0.0.1:{http.server_port}", "a.pdf", "b.pdf", "m.png")
+    finally:
+        http.shutdown()
+    assert resposta == {"status": "ok"}
+    # Sem a consulta a /saude antes: só os POSTs
+    assert len(recebidos) == 3
+
+
+def test_fila_sempre_cheia_nao_processa_localmente():
+    http, recebidos = servidor([503])
+    try:
+        with pytest.raises(cliente_marca.ServicoOcupado):
+            cliente_marca.enviar(f"http://127.0.0.1:{http.server_port}", "a.pdf", "b.pdf", "m.png",
+                                 tentativas=3)
+    finally:
+        http.shutdown()
+    assert len(recebidos) == 3
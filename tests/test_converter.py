@@ -0,0 +1,95 @@
+import sys
+import zlib
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Pt
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject, StreamObject
+
+import converter
+from converter import converter_pdf_para_docx
+
+
+def _stream(writer, dados):
+    stream = DecodedStreamObject()
+    stream.set_data(dados)
+    return writer._add_object(stream)
+
+
+def criar_pdf(caminho):
+    """Duas páginas carta: título, corpo recuado e uma imagem 20x10 na primeira; um texto na segunda"""
+    writer = PdfWriter()
+    fonte = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"), NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica")}))
+    imagem = StreamObject()
+    imagem._data = zlib.compress(bytes([200, 30, 30]) * 200)
+    imagem.update({NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Image"),
+                   NameObject("/Width"): NumberObject(20), NameObject("/Height"): NumberObject(10),
+                   NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+                   NameObject("/BitsPerComponent"): NumberObject(8),
+                   NameObject("/Filter"): NameObject("/FlateDecode")})
+    imagem = writer._add_object(imagem)
+
+    conteudos = [
+        b"BT /F1 18 Tf 36 740 Td (Titulo do documento) Tj ET\n"
+        b"BT /F1 10 Tf 108 700 Td (Paragrafo recuado) Tj ET\n"
+        b"q 144 0 0 72 36 600 cm /Im1 Do Q\n",
+        b"BT /F1 12 Tf 36 740 Td (Segunda pagina) Tj ET\n",
+    ]
+    for numero, conteudo in enumerate(conteudos):
+        pagina = writer.add_blank_page(612, 792)
+        recursos = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): fonte})})
+        if numero == 0:
+            recursos[NameObject("/XObject")] = DictionaryObject({NameObject("/Im1"): imagem})
+        pagina[NameObject("/Resources")] = recursos
+        pagina[NameObject("/Contents")] = _stream(writer, conteudo)
+    with open(caminho, "wb") as f:
+        writer.write(f)
+    return str(caminho)
+
+
+def test_docx_com_texto_imagens_e_paginas(tmp_path):
+    docx_path = str(tmp_path / "saida.docx")
+    resumo = converter_pdf_para_docx(criar_pdf(tmp_path / "entrada.pdf"), docx_path)
+    assert (resumo["paginas"], resumo["imagens"]) == (2, 1)
+
+    documento = Document(docx_path)
+    secao = documento.sections[0]
+    assert (secao.page_width, secao.page_height) == (Pt(612), Pt(792))
+
+    paragrafos = documento.paragraphs
+    textos = [p.text for p in paragrafos if p.text.strip()]
+    assert textos == ["Titulo do documento", "Paragrafo recuado", "Segunda pagina"]
+    titulo, recuado = (next(p for p in paragrafos if p.text == texto) for texto in textos[:2])
+    assert titulo.runs[0].font.size == Pt(18)
+    assert recuado.runs[0].font.size == Pt(10)
+    # Recuo relativo à margem: o texto começa 72 pt depois do título
+    assert recuado.paragraph_format.left_indent == Pt(72)
+
+    # A imagem fica entre o corpo e a quebra de página, na largura em que era desenhada
+    figuras = [p for p in paragrafos if p._element.findall(".//" + qn("w:drawing"))]
+    assert len(figuras) == 1
+    assert paragrafos.index(recuado) < paragrafos.index(figuras[0])
+    assert documento.inline_shapes[0].width == Pt(144)
+    quebras = [p for p in paragrafos
+               if any(br.get(qn("w:type")) == "page" for br in p._element.iter(qn("w:br")))]
+    assert len(quebras) == 1
+    assert paragrafos.index(quebras[0]) < paragrafos.index(next(p for p in paragrafos if p.text == textos[2]))
+
+
+def test_main_usa_o_ilovepdf_por_padrao(tmp_path, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(converter, "converter_online", lambda pdf, pasta: chamadas.append(("online", pdf)))
+    monkeypatch.setattr(converter, "converter_lote",
+                        lambda pdfs, pasta, workers, imagem: chamadas.append(("local", pdfs)) or [])
+
+    monkeypatch.setattr(sys, "argv", ["converter.py", "a.pdf", "b.pdf", "--saida", str(tmp_path)])
+    converter.main()
+    assert chamadas == [("online", "a.pdf"), ("online", "b.pdf")]
+
+    chamadas.clear()
+    monkeypatch.setattr(sys, "argv", ["converter.py", "a.pdf", "--saida", str(tmp_path), "--local"])
+    converter.main()
+    assert chamadas == [("local", ["a.pdf"])]
@@ -0,0 +1,79 @@
+import io
+from collections import Counter
+
+from docx import Document
+from docx.parts.image import ImagePart
+from PIL import Image
+
+import delete
+from delete import ImagemSubstituta, substituir_imagens_em_lote, substituir_imagens_em_todas_paginas
+
+
+def png(tamanho, cor):
+    buffer = io.BytesIO()
+    Image.new("RGB", tamanho, cor).save(buffer, "PNG")
+    return io.BytesIO(buffer.getvalue())
+
+
+def criar_docx(caminho):
+    """Imagens 40x20 no corpo, no cabeçalho e no rodapé (cada uma numa parte própria) e uma 30x30"""
+    documento = Document()
+    documento.add_picture(png((40, 20), "red"))
+    documento.add_picture(png((30, 30), "blue"))
+    secao = documento.sections[0]
+    secao.header.paragraphs[0].add_run().add_picture(png((40, 20), "green"))
+    secao.footer.paragraphs[0].add_run().add_picture(png((40, 20), "yellow"))
+    documento.save(caminho)
+    return str(caminho)
+
+
+def imagens(caminho):
+    return [parte for parte in Document(caminho).part.package.iter_parts() if isinstance(parte, ImagePart)]
+
+
+def test_substitui_as_imagens_de_todas_as_partes(tmp_path, capsys):
+    nova = tmp_path / "nova.png"
+    Image.new("RGBA", (100, 100), (0, 0, 0, 255)).save(nova)
+    entrada, saida = criar_docx(tmp_path / "entrada.docx"), str(tmp_path / "saida.docx")
+    substituta = ImagemSubstituta(str(nova))
+
+    assert substituir_imagens_em_todas_paginas(entrada, str(nova), saida, substituta) == 4
+
+    partes = imagens(saida)
+    tamanhos = Counter(Image.open(io.BytesIO(parte.blob)).size for parte in partes)
+    assert tamanhos == {(40, 20): 3, (30, 30): 1}
+    # Cabeçalho, rodapé e corpo recebem a mesma imagem nova, codificada uma vez por tamanho
+    assert all(parte.blob == substituta.png(Image.open(io.BytesIO(parte.blob)).size) for parte in partes)
+    assert sorted(substituta._codificadas) == [(30, 30), (40, 20)]
+    # Uma linha de resumo por documento, não uma por imagem
+    assert capsys.readouterr().out.splitlines() == [
+        f"Documento salvo com sucesso em: {saida} (4 imagens substituídas: 1 de 30px x 30px, 3 de 40px x 20px)."]
+
+
+class ExecutorLocal:
+    def __init__(self, max_workers=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def map(self, funcao, itens):
+        return map(funcao, itens)
+
+
+def test_lote_com_um_resumo_por_arquivo(tmp_path, capsys, monkeypatch):
+    nova = tmp_path / "nova.png"
+    Image.new("RGB", (10, 10), "white").save(nova)
+    trabalhos = [(criar_docx(tmp_path / f"entrada{numero}.docx"), str(tmp_path / f"saida{numero}.docx"))
+                 for numero in range(3)]
+    # Os trabalhos rodam no próprio processo, na mesma função usada pelos processos do pool
+    monkeypatch.setattr(delete, "ProcessPoolExecutor", ExecutorLocal)
+
+    assert substituir_imagens_em_lote(trabalhos, str(nova)) == [4, 4, 4]
+    linhas = capsys.readouterr().out.splitlines()
+    assert [linha.split(" (")[0] for linha in linhas] == \
+        [f"Documento salvo com sucesso em: {saida}" for _, saida in trabalhos]
+
@@ -0,0 +1,144 @@
+import io
+import re
+import zipfile
+
+import openpyxl
+from docx import Document
+from docx.enum.section import WD_SECTION
+from PIL import Image
+
+from bovigenese.ooxml_marca import marcar_docx, marcar_xlsx
+
+NS_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+
+def marca_png():
+    buffer = io.BytesIO()
+    Image.new("RGBA", (40, 20), (200, 0, 0, 128)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def criar_docx(caminho, secoes):
+    documento = Document()
+    for numero in range(secoes):
+        if numero:
+            documento.add_section(WD_SECTION.NEW_PAGE)
+        documento.add_paragraph(f"Texto da seção {numero + 1}")
+    # Uma seção já tem cabeçalho próprio, que precisa ser mantido
+    documento.sections[1].header.is_linked_to_previous = False
+    documento.sections[1].header.paragraphs[0].text = "Cabeçalho existente"
+    documento.save(caminho)
+
+
+def test_docx_recebe_a_marca_em_todas_as_secoes(tmp_path):
+    entrada, saida = str(tmp_path / "entrada.docx"), str(tmp_path / "saida.docx")
+    criar_docx(entrada, 3)
+    marcar_docx(entrada, saida, marca_png(), (40, 20), 914400)
+
+    with zipfile.ZipFile(saida) as pacote:
+        assert pacote.testzip() is None
+    documento = Document(saida)
+    assert [p.text for p in documento.paragraphs] == [p.text for p in Document(entrada).paragraphs]
+    for secao in documento.sections:
+        cabecalho = secao.header
+        assert not cabecalho.is_linked_to_previous
+        assert cabecalho._element.findall(f".//{NS_A}blip"), "cabeçalho sem a imagem"
+    assert "Cabeçalho existente" in [p.text for p in documento.sections[1].header.paragraphs]
+
+
+def test_docx_partes_inalteradas_sao_copiadas(tmp_path):
+    entrada, saida = str(tmp_path / "entrada.docx"), str(tmp_path / "saida.docx")
+    criar_docx(entrada, 2)
+    marcar_docx(entrada, saida, marca_png(), (40, 20), 914400)
+    with zipfile.ZipFile(entrada) as original, zipfile.ZipFile(saida) as marcado:
+        assert original.read("word/styles.xml") == marcado.read("word/styles.xml")
+
+
+def test_xlsx_recebe_a_marca_em_todas_as_planilhas(tmp_path):
+    entrada, saida = str(tmp_path / "entrada.xlsx"), str(tmp_path / "saida.xlsx")
+    workbook = openpyxl.Workbook()
+    workbook.active.title = "Primeira"
+    for nome in ("Segunda", "Terceira"):
+        workbook.create_sheet(nome)
+    for planilha in workbook.worksheets:
+        for linha in range(1, 51):
+            planilha.append([linha, f"{planilha.title} {linha}"])
+    workbook.save(entrada)
+
+    marcar_xlsx(entrada, saida, marca_png(), (40, 20))
+
+    marcado = openpyxl.load_workbook(saida)
+    assert marcado.sheetnames == ["Primeira", "Segunda", "Terceira"]
+    for planilha in marcado.worksheets:
+        assert len(planilha._images) == 1
+        assert planilha["B50"].value == f"{planilha.title} 50"
+
+
+def test_partes_inalteradas_sao_copiadas_sem_recomprimir(tmp_path):
+    entrada, saida = str(tmp_path / "entrada.docx"), str(tmp_path / "saida.docx")
+    criar_docx(entrada, 2)
+    # Partes sem compressão e com outro nível de compressão continuam idênticas na saída
+    dados = "".join(f"<linha n=\"{numero}\">{numero * 7919 % 1000}</linha>" for numero in range(5000)).encode()
+    with zipfile.ZipFile(entrada, "a") as pacote:
+        pacote.writestr("customXml/guardado.xml", b"<dados/>" * 100, compress_type=zipfile.ZIP_STORED)
+        pacote.writestr("customXml/rapido.xml", dados, compress_type=zipfile.ZIP_DEFLATED, compresslevel=1)
+    marcar_docx(entrada, saida, marca_png(), (40, 20), 914400)
+
+    with zipfile.ZipFile(entrada) as original, zipfile.ZipFile(saida) as marcado:
+        assert marcado.testzip() is None
+        for nome in ("word/styles.xml", "word/settings.xml", "customXml/guardado.xml", "customXml/rapido.xml"):
+            antes, depois = original.getinfo(nome), marcado.getinfo(nome)
+            assert (depois.CRC, depois.compress_size, depois.file_size, depois.compress_type) == \
+                (antes.CRC, antes.compress_size, antes.file_size, antes.compress_type)
+            assert marcado.read(nome) == original.read(nome)
+
+
+def ids_desenho(pacote):
+    ids = []
+    for nome in pacote.namelist():
+        if nome.startswith("word/") and nome.endswith(".xml"):
+            ids += re.findall(rb'<wp:docPr\b[^>]*?\sid="(\d+)"', pacote.read(nome))
+    return [int(numero) for numero in ids]
+
+
+def test_docx_ids_dos_desenhos_nao_colidem(tmp_path):
+    entrada, saida = str(tmp_path / "entrada.docx"), str(tmp_path / "saida.docx")
+    documento = Document()
+    documento.add_paragraph("Com imagem")
+    documento.add_picture(io.BytesIO(marca_png()))
+    documento.add_section(WD_SECTION.NEW_PAGE)
+    documento.sections[1].header.is_linked_to_previous = False
+    documento.sections[1].header.paragraphs[0].text = "Cabeçalho existente"
+    buffer = io.BytesIO()
+    documento.save(buffer)
+    # O id da imagem do corpo é o que antes era usado fixo para a marca
+    with zipfile.ZipFile(buffer) as origem, zipfile.ZipFile(entrada, "w", zipfile.ZIP_DEFLATED) as destino:
+        for info in origem.infolist():
+            dados = origem.read(info)
+            if info.filename == "word/document.xml":
+                dados = re.sub(rb'(<wp:docPr\b[^>]*?\sid=")\d+"', rb'\g<1>9000"', dados)
+            destino.writestr(info, dados)
+
+    marcar_docx(entrada, saida, marca_png(), (40, 20), 914400)
+    with zipfile.ZipFile(saida) as pacote:
+        ids = ids_desenho(pacote)
+    # A imagem do corpo, o cabeçalho novo e o cabeçalho existente
+    assert len(ids) == 3
+    assert len(set(ids)) == 3
+    assert min(ids) == 9000
+
+
+def test_xlsx_desenho_existente_recebe_id_livre(tmp_path):
+    entrada, primeira, segunda = (str(tmp_path / nome) for nome in ("entrada.xlsx", "1.xlsx", "2.xlsx"))
+    workbook = openpyxl.Workbook()
+    workbook.active.append([1, 2])
+    workbook.save(entrada)
+
+    # A segunda marcação acrescenta uma âncora ao desenho criado pela primeira
+    marcar_xlsx(entrada, primeira, marca_png(), (40, 20))
+    marcar_xlsx(primeira, segunda, marca_png(), (40, 20))
+    with zipfile.ZipFile(segunda) as pacote:
+        desenhos = [nome for nome in pacote.namelist() if re.match(r"xl/drawings/[^/]+\.xml$", nome)]
+        assert len(desenhos) == 1
+        ids = re.findall(rb'<xdr:cNvPr\b[^>]*?\sid="(\d+)"', pacote.read(desenhos[0]))
+    assert len(ids) == 2 and len(set(ids)) == 2
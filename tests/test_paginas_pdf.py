@@ -0,0 +1,133 @@
+import os
+import subprocess
+import sys
+import time
+
+from PIL import Image, ImageDraw
+from pypdf import PdfReader
+
+from bovigenese.escritor_pdf import salvar_pagina_pdf
+from bovigenese.paginas_pdf import (CODIFICACAO_AUTO, CODIFICACAO_BINARIA, CODIFICACAO_JPEG,
+                                    CODIFICACAO_ORIGINAL, salvar_pdf_incremental)
+
+
+def pagina(numero, modo="RGB", tamanho=(200, 280)):
+    imagem = Image.new(modo, tamanho, "white")
+    ImageDraw.Draw(imagem).text((20, 20), f"Pagina {numero}", fill="black")
+    return imagem
+
+
+def gravar(caminho, quantidade, **kwargs):
+    inicio = time.perf_counter()
+    salvar_pdf_incremental((pagina(n) for n in range(1, quantidade + 1)), str(caminho), **kwargs)
+    return time.perf_counter() - inicio, os.path.getsize(caminho)
+
+
+def test_grava_todas_as_paginas(tmp_path):
+    caminho = tmp_path / "saida.pdf"
+    relatorio = []
+    assert salvar_pdf_incremental((pagina(n) for n in range(1, 6)), str(caminho),
+                                  relatorio=relatorio, numeros=[3, 4, 5, 6, 7]) == 5
+    leitor = PdfReader(str(caminho))
+    assert len(leitor.pages) == 5
+    assert [float(x) for x in leitor.pages[0].mediabox] == [0, 0, 200, 280]
+    assert [registro["pagina"] for registro in relatorio] == [3, 4, 5, 6, 7]
+
+
+def test_tamanho_cresce_linearmente(tmp_path):
+    # Com append=True cada página regravava a árvore de páginas: o arquivo crescia com o quadrado
+    _, pequeno = gravar(tmp_path / "pequeno.pdf", 50)
+    _, grande = gravar(tmp_path / "grande.pdf", 400)
+    assert len(PdfReader(str(tmp_path / "grande.pdf")).pages) == 400
+    assert grande < pequeno * 8 * 1.1
+
+
+def test_bytes_do_relatorio_somam_o_arquivo(tmp_path):
+    caminho = tmp_path / "saida.pdf"
+    relatorio = []
+    salvar_pdf_incremental((pagina(n) for n in range(1, 11)), str(caminho), relatorio=relatorio)
+    paginas = sum(registro["bytes"] for registro in relatorio)
+    # O restante é o cabeçalho, a árvore de páginas e a tabela de referências
+    assert 0 < os.path.getsize(caminho) - paginas < 1000
+
+
+def test_sem_paginas(tmp_path):
+    caminho = tmp_path / "saida.pdf"
+    try:
+        salvar_pdf_incremental(iter(()), str(caminho))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Esperava ValueError")
+    assert not caminho.exists()
+
+
+def test_paginas_binarias_e_coloridas(tmp_path):
+    caminho = tmp_path / "saida.pdf"
+    for codificacao in (CODIFICACAO_BINARIA, CODIFICACAO_JPEG, CODIFICACAO_ORIGINAL):
+        salvar_pdf_incremental([pagina(1), pagina(2, "L"), pagina(3, "1")], str(caminho),
+                               codificacao=codificacao, qualidade=60)
+        leitor = PdfReader(str(caminho))
+        assert len(leitor.pages) == 3
+        for lida in leitor.pages:
+            imagem = next(iter(lida.images)).image
+            assert imagem.size == (200, 280)
+
+
+def imagem_da_pagina(caminho):
+    return next(iter(PdfReader(str(caminho)).pages[0].images)).image.convert("L").tobytes()
+
+
+def test_pagina_binaria_igual_a_do_pillow(tmp_path):
+    # Mesmo stream CCITT G4 e mesmos parâmetros que o Pillow gravaria para a página
+    original = pagina(1, "1")
+    salvar_pagina_pdf(original, str(tmp_path / "escritor.pdf"))
+    original.save(str(tmp_path / "pillow.pdf"))
+    assert imagem_da_pagina(tmp_path / "escritor.pdf") == imagem_da_pagina(tmp_path / "pillow.pdf")
+
+
+def test_memoria_compartilhada_sem_avisos_do_resource_tracker():
+    # Antes, o processo do pool e o principal registravam o segmento: um aviso de vazamento por página
+    script = """
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from bovigenese.paginas_pdf import _ler_pagina_compartilhada, _publicar_pagina
+
+if __name__ == "__main__":
+    dados = np.full((40, 30), 200, dtype=np.uint8)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        nomes = list(executor.map(_publicar_pagina, [dados] * 8))
+    for nome in nomes:
+        assert _ler_pagina_compartilhada(nome, dados.shape).getpixel((0, 0)) == 200
+"""
+    resultado = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert resultado.returncode == 0, resultado.stderr
+    assert "resource_tracker" not in resultado.stderr
+
+
+def test_qualidade_so_nas_paginas_jpeg(tmp_path):
+    # O Pillow >= 11.3 recusa quality= em páginas de 1 bit; o relatório não deve citá-la
+    caminho = tmp_path / "saida.pdf"
+    relatorio = []
+    colorida = pagina(2)
+    ImageDraw.Draw(colorida).rectangle((50, 50, 150, 150), fill="red")
+    salvar_pdf_incremental([pagina(1), colorida, pagina(3, "1")], str(caminho),
+                           codificacao=CODIFICACAO_AUTO, qualidade=40, relatorio=relatorio)
+    assert [r["codificacao"] for r in relatorio] == [CODIFICACAO_BINARIA, CODIFICACAO_JPEG,
+                                                     CODIFICACAO_BINARIA]
+    assert [r["qualidade_jpeg"] for r in relatorio] == [None, 40, None]
+
+    relatorio = []
+    salvar_pdf_incremental([pagina(1, "1"), pagina(2)], str(caminho), qualidade=40, relatorio=relatorio)
+    assert [r["qualidade_jpeg"] for r in relatorio] == [None, 40]
+
+
+def test_bytes_por_pagina_exatos(tmp_path):
+    # Cada página custa o mesmo, seja a primeira ou a centésima (a menos dos dígitos dos números
+    # de objeto); com append=True as últimas pagavam também a árvore de páginas regravada
+    relatorio = []
+    salvar_pdf_incremental((pagina(1, "1") for _ in range(100)), str(tmp_path / "saida.pdf"),
+                           relatorio=relatorio)
+    tamanhos = [r["bytes"] for r in relatorio]
+    assert max(tamanhos) - min(tamanhos) < 20
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+import pytest
+
+from bovigenese.instrumentacao import PERFIL_INATIVO
+from bovigenese.remover_marca_video import (MODO_INVERSAO, RemoverMarcaVideo, estimar_alfa,
+                                            mascara_por_gradiente)
+
+ALFA = 0.4
+REGIAO = (slice(40, 80), slice(50, 110))  # Linhas e colunas do texto sobreposto
+
+
+def fundo(numero, altura=120, largura=160):
+    """Fundo liso com uma cor diferente a cada frame (a cena muda, a marca fica)"""
+    cor = np.random.default_rng(numero).integers(20, 200, size=3)
+    return np.broadcast_to(cor, (altura, largura, 3)).astype(np.float64)
+
+
+def sobrepor(cena):
+    """Marca branca com alfa fixo sobre a região"""
+    frame = cena.copy()
+    frame[REGIAO] = ALFA * 255 + (1 - ALFA) * frame[REGIAO]
+    return np.rint(frame).astype(np.uint8)
+
+
+@pytest.fixture
+def cenas():
+    return [fundo(numero) for numero in range(40)]
+
+
+def test_mascara_cobre_a_marca(cenas):
+    mascara = mascara_por_gradiente([sobrepor(cena) for cena in cenas], 1.0)
+    linhas, colunas = np.nonzero(mascara)
+    # As bordas da marca, preenchidas por dentro, com no máximo 1 pixel de folga
+    assert abs(linhas.min() - 40) <= 1 and abs(linhas.max() - 79) <= 1
+    assert abs(colunas.min() - 50) <= 1 and abs(colunas.max() - 109) <= 1
+    assert mascara[REGIAO].all()
+
+
+def test_cena_parada_e_recusada():
+    parada = sobrepor(fundo(0))
+    parada[10:20, 10:150] = 0
+    parada[100:110, 10:150] = 0
+    parada[10:110, 10:20] = 0
+    parada[10:110, 140:150] = 0
+    with pytest.raises(ValueError, match="parada"):
+        mascara_por_gradiente([parada] * 10, 1.0)
+
+
+def test_alfa_e_cor_estimados_dentro_da_mascara(cenas):
+    recortes = np.stack([sobrepor(cena)[30:90, 40:120] for cena in cenas])
+    mascara = np.zeros((60, 80), dtype=bool)
+    mascara[9:51, 9:71] = True
+    alfa, marca, confiavel = estimar_alfa(recortes, mascara)
+
+    interior = (slice(12, 48), slice(12, 68))
+    assert np.median(alfa[interior]) == pytest.approx(ALFA, abs=0.02)
+    # marca = alfa * cor da marca
+    assert np.median(marca[interior]) == pytest.approx(ALFA * 255, abs=3)
+    assert confiavel[mascara].all()
+    assert not alfa[~mascara].any()
+
+
+def test_remove_a_marca_do_video(tmp_path, cenas):
+    frames = [sobrepor(cena) for cena in cenas]
+    caminho = str(tmp_path / "entrada.mp4")
+    writer = cv2.VideoWriter(caminho, cv2.VideoWriter_fourcc(*"mp4v"), 10, (160, 120))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+    processador = RemoverMarcaVideo()
+    estimativa = processador.estimar(caminho)
+    assert estimativa.modo == MODO_INVERSAO
+    assert estimativa.alfa_mediano == pytest.approx(ALFA, abs=0.03)
+    # A estimativa é feita uma vez por vídeo
+    assert processador.estimar(caminho) is estimativa
+
+    limpo = processador.remover_marca_frame(frames[5].copy(), estimativa)
+    antes = np.abs(frames[5].astype(int) - np.rint(cenas[5]))[REGIAO].mean()
+    depois = np.abs(limpo.astype(int) - np.rint(cenas[5]))[REGIAO].mean()
+    assert antes > 30
+    assert depois < 6
+
+
+def test_inicializa_os_atributos_da_classe_base():
+    processador = RemoverMarcaVideo()
+    assert processador.marca_dagua is None and processador.marca_dagua_path is None
+    assert processador.cache_saida is None
+    assert processador.perfil is PERFIL_INATIVO
@@ -0,0 +1,109 @@
+import pytest
+from PIL import Image
+from pypdf import PdfReader
+
+from bovigenese.paginas_pdf import CODIFICACAO_BINARIA, salvar_paginas_trabalho
+from bovigenese.trabalho_pdf import (TrabalhoIncompativel, TrabalhoIncompleto, TrabalhoPDF, intervalo_paginas,
+                                     juntar_trabalhos)
+
+PROCESSAMENTO = ("remover_cinza", 200, "auto")
+
+
+@pytest.fixture
+def entrada(tmp_path):
+    # O trabalho só confere o conteúdo da entrada; não precisa ser renderizada
+    caminho = tmp_path / "entrada.pdf"
+    caminho.write_bytes(b"%PDF-1.4 conteudo qualquer")
+    return str(caminho)
+
+
+def pagina(modo="RGB"):
+    return Image.new(modo, (40, 30), 255 if modo != "RGB" else (255, 255, 255))
+
+
+def test_grava_paginas_de_1_bit_com_qualidade(tmp_path, entrada):
+    trabalho = TrabalhoPDF(str(tmp_path / "trabalho"), entrada, 3, PROCESSAMENTO)
+    trabalho.gravar_pagina(1, pagina("1"), 60, {"pagina": 1})
+    trabalho.gravar_pagina(2, pagina("L"), 60, {"pagina": 2})
+
+    assert trabalho.pendentes([1, 2, 3]) == [3]
+    assert trabalho.relatorio([1])[0]["bytes"] > 0
+    assert len(PdfReader(trabalho.caminho_pagina(1)).pages) == 1
+
+
+def test_retoma_do_estado_e_recusa_outro_processamento(tmp_path, entrada):
+    diretorio = str(tmp_path / "trabalho")
+    TrabalhoPDF(diretorio, entrada, 2, PROCESSAMENTO).gravar_pagina(1, pagina(), 75, {"pagina": 1})
+
+    retomado = TrabalhoPDF(diretorio, entrada, 2, PROCESSAMENTO)
+    assert retomado.pendentes([1, 2]) == [2]
+    with pytest.raises(TrabalhoIncompativel):
+        TrabalhoPDF(diretorio, entrada, 2, PROCESSAMENTO + ("outro",))
+
+
+def test_juntar_exige_todas_as_paginas(tmp_path, entrada):
+    trabalho = TrabalhoPDF(str(tmp_path / "trabalho"), entrada, 2, PROCESSAMENTO)
+    trabalho.gravar_pagina(1, pagina(), 75, {"pagina": 1})
+    saida = tmp_path / "saida.pdf"
+    with pytest.raises(TrabalhoIncompleto):
+        trabalho.juntar(str(saida), [1, 2])
+    assert not saida.exists()
+
+    trabalho.gravar_pagina(2, pagina("1"), 75, {"pagina": 2})
+    assert trabalho.juntar(str(saida), [1, 2]) == 2
+    assert len(PdfReader(str(saida)).pages) == 2
+
+
+def test_juntar_trabalhos_de_intervalos_diferentes(tmp_path, entrada):
+    primeiro = TrabalhoPDF(str(tmp_path / "maquina1"), entrada, 3, PROCESSAMENTO)
+    segundo = TrabalhoPDF(str(tmp_path / "maquina2"), entrada, 3, PROCESSAMENTO)
+    for numero in (1, 2):
+        primeiro.gravar_pagina(numero, pagina(), 75, {"pagina": numero})
+    for numero in (2, 3):
+        segundo.gravar_pagina(numero, pagina("1"), 75, {"pagina": numero})
+
+    saida = str(tmp_path / "saida.pdf")
+    paginas = juntar_trabalhos([primeiro.diretorio, segundo.diretorio], saida)
+    assert [registro["pagina"] for registro in paginas] == [1, 2, 3]
+    assert len(PdfReader(saida).pages) == 3
+
+
+def test_relatorio_sem_qualidade_nas_paginas_binarias(tmp_path, entrada):
+    trabalho = TrabalhoPDF(str(tmp_path / "trabalho"), entrada, 2, PROCESSAMENTO)
+    salvar_paginas_trabalho([pagina(), pagina()], [1, 2], trabalho, codificacao=CODIFICACAO_BINARIA,
+                            qualidade=60)
+
+    for registro in trabalho.relatorio([1, 2]):
+        assert registro["qualidade_jpeg"] is None
+        assert registro["bytes"] > 0
+
+
+def test_intervalo_com_pagina_zero_e_invalido():
+    assert intervalo_paginas(3) == [1, 2, 3]
+    assert intervalo_paginas(3, None, 2) == [1, 2]
+    # 0 é um número de página explícito (e inválido), não "desde o início"
+    with pytest.raises(ValueError):
+        intervalo_paginas(3, 0)
+    with pytest.raises(ValueError):
+        intervalo_paginas(3, 0, 2)
+
+
+def test_juntar_copia_as_imagens_sem_recodificar(tmp_path, entrada):
+    trabalho = TrabalhoPDF(str(tmp_path / "trabalho"), entrada, 3, PROCESSAMENTO)
+    paginas = {1: Image.new("1", (40, 30), 1), 2: Image.new("L", (50, 20), 128),
+               3: Image.effect_noise((30, 60), 40).convert("RGB")}
+    for numero, imagem in paginas.items():
+        trabalho.gravar_pagina(numero, imagem, 60, {"pagina": numero})
+    saida = str(tmp_path / "saida.pdf")
+    trabalho.juntar(saida, [1, 2, 3])
+
+    juntadas = PdfReader(saida).pages
+    assert len(juntadas) == 3
+    for numero, juntada in enumerate(juntadas, 1):
+        original = PdfReader(trabalho.caminho_pagina(numero)).pages[0]
+        imagem = juntada["/Resources"]["/XObject"]["/image"].get_object()
+        imagem_original = original["/Resources"]["/XObject"]["/image"].get_object()
+        assert imagem._data == imagem_original._data
+        assert {chave: valor for chave, valor in imagem.items()} == dict(imagem_original.items())
+        assert list(juntada.mediabox) == list(original.mediabox)
+        assert juntada.images[0].image.size == paginas[numero].size
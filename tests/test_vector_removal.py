@@ -0,0 +1,96 @@
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, NameObject
+
+import vector_removal
+from vector_removal import PATH_RASTER, PATH_UNCHANGED, PATH_VECTOR, process_pdf_vector
+
+TEXTO = b"BT /F1 12 Tf 72 700 Td (Texto do documento) Tj ET"
+# Marca cinza clara (0.88 = 225) em diagonal
+MARCA = b"q 0.88 g 0.7 0.7 -0.7 0.7 200 300 cm 0 0 m 300 0 l 300 40 l 0 40 l h f Q"
+
+
+def criar_pdf(caminho, conteudos):
+    writer = PdfWriter()
+    for conteudo in conteudos:
+        pagina = writer.add_blank_page(612, 792)
+        stream = DecodedStreamObject()
+        stream.set_data(conteudo)
+        pagina[NameObject("/Contents")] = writer._add_object(stream)
+    with open(caminho, "wb") as f:
+        writer.write(f)
+
+
+def operadores(caminho, pagina=0):
+    return [operator for _, operator in PdfReader(str(caminho)).pages[pagina].get_contents().operations]
+
+
+def processar(tmp_path, conteudos):
+    entrada, saida = str(tmp_path / "entrada.pdf"), str(tmp_path / "saida.pdf")
+    criar_pdf(entrada, conteudos)
+    return process_pdf_vector(entrada, saida, poppler_path=""), saida
+
+
+def test_marca_dentro_de_q_externo(tmp_path):
+    # A página inteira envolvida por um q/Q: antes o bloco externo era mantido por inteiro
+    conteudo = b"q 1 0 0 1 0 0 cm " + TEXTO + b" " + MARCA + b" Q"
+    relatorio, saida = processar(tmp_path, [conteudo] * 3)
+    assert [r["caminho"] for r in relatorio] == [PATH_VECTOR] * 3
+    ops = operadores(saida)
+    assert b"Tj" in ops
+    assert b"f" not in ops
+
+
+def test_cor_herdada_do_bloco_externo(tmp_path):
+    conteudo = b"q 0.88 g q 0 0 m 300 0 l 300 40 l 0 40 l h f Q Q " + TEXTO
+    relatorio, saida = processar(tmp_path, [conteudo] * 2)
+    assert relatorio[0]["objetos_removidos"] == 1
+    assert b"f" not in operadores(saida)
+    assert b"Tj" in operadores(saida)
+
+
+def test_bloco_com_texto_e_marca_e_mantido(tmp_path):
+    # O mesmo q/Q pinta o texto preto e a marca: remover o bloco apagaria o texto
+    conteudo = b"q 0 g " + TEXTO + b" 0.88 g 0.7 0.7 -0.7 0.7 200 300 cm 0 0 m 300 0 l 300 40 l h f Q"
+    relatorio, saida = processar(tmp_path, [conteudo] * 2)
+    assert [r["caminho"] for r in relatorio] == [PATH_UNCHANGED] * 2
+    assert b"Tj" in operadores(saida)
+
+
+def test_texto_preto_repetido_e_mantido(tmp_path):
+    relatorio, _ = processar(tmp_path, [b"q " + TEXTO + b" Q"] * 4)
+    assert all(r["caminho"] == PATH_UNCHANGED for r in relatorio)
+
+
+def test_artefato_watermark(tmp_path):
+    conteudo = (b"q /Artifact <</Subtype /Watermark>> BDC q 0 g 0 0 m 10 0 l 10 10 l h f Q EMC " +
+                TEXTO + b" Q")
+    relatorio, saida = processar(tmp_path, [conteudo])
+    assert relatorio[0]["objetos_removidos"] == 1
+    ops = operadores(saida)
+    assert b"f" not in ops and b"BDC" not in ops
+    assert b"Tj" in ops
+
+
+# Imagem de 1 pixel esticada sobre a página inteira (fundo ou página digitalizada)
+FUNDO = b"q 612 0 0 792 0 0 cm BI /W 1 /H 1 /BPC 8 /CS /G ID \xff EI Q"
+
+
+def test_fundo_de_pagina_inteira_mantem_a_edicao_vetorial(tmp_path):
+    relatorio, saida = processar(tmp_path, [FUNDO + b" " + TEXTO + b" " + MARCA] * 2)
+    assert [(r["caminho"], r["objetos_removidos"]) for r in relatorio] == [(PATH_VECTOR, 1)] * 2
+    ops = operadores(saida)
+    assert b"INLINE IMAGE" in ops and b"Tj" in ops
+    assert b"f" not in ops
+
+
+def test_imagem_de_pagina_inteira_sem_marca_vetorial_vai_para_o_raster(tmp_path, monkeypatch):
+    rasterizadas = []
+
+    def rasterizar(pdf_path, numero, *args):
+        rasterizadas.append(numero)
+        return PdfReader(pdf_path).pages[numero - 1]
+    monkeypatch.setattr(vector_removal, "_render_raster_page", rasterizar)
+
+    relatorio, _ = processar(tmp_path, [FUNDO + b" " + TEXTO] * 2)
+    assert [(r["caminho"], r["objetos_removidos"]) for r in relatorio] == [(PATH_RASTER, 0)] * 2
+    assert rasterizadas == [1, 2]
@@ -0,0 +1,62 @@
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from bovigenese import paginas_pdf
+from bovigenese.instrumentacao import Perfil
+from watermark_remover import clean_page, process_pdf, remove_gray_watermark
+
+
+def referencia(rgb, lower_gray, upper_gray):
+    """Limpeza original: RGB -> BGR, máscara com inRange, pixels da máscara em branco, BGR -> RGB"""
+    bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    mascara = cv2.inRange(cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY), lower_gray, upper_gray)
+    bgr[mascara > 0] = [255, 255, 255]
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+def pagina_aleatoria(forma):
+    return np.random.default_rng(7).integers(0, 256, size=forma, dtype=np.uint8)
+
+
+def test_clean_page_rgb_identica_a_limpeza_original():
+    pixels = pagina_aleatoria((120, 90, 3))
+    for faixa in ((180, 250), (0, 255), (200, 200)):
+        limpa = clean_page(Image.fromarray(pixels), *faixa)
+        assert limpa.mode == "RGB"
+        assert np.array_equal(np.asarray(limpa), referencia(pixels, *faixa))
+
+
+def test_clean_page_cinza_identica_a_limpeza_original():
+    pixels = pagina_aleatoria((120, 90))
+    esperado = referencia(cv2.cvtColor(pixels, cv2.COLOR_GRAY2RGB), 180, 250)[:, :, 0]
+    limpa = clean_page(Image.fromarray(pixels), 180, 250)
+    assert limpa.mode == "L"
+    assert np.array_equal(np.asarray(limpa), esperado)
+
+
+def test_kernel_bgr_identico_a_limpeza_original():
+    pixels = pagina_aleatoria((64, 48, 3))
+    bgr = cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+    limpa = cv2.cvtColor(remove_gray_watermark(bgr, 180, 250), cv2.COLOR_BGR2RGB)
+    assert np.array_equal(limpa, referencia(pixels, 180, 250))
+
+
+def test_clean_page_altera_a_propria_imagem():
+    imagem = Image.fromarray(pagina_aleatoria((40, 30, 3)))
+    assert clean_page(imagem) is imagem
+
+
+def test_process_pdf_conta_os_bytes_uma_vez(tmp_path, monkeypatch):
+    monkeypatch.setattr(paginas_pdf, "pdfinfo_from_path", lambda caminho, poppler_path=None: {"Pages": 3})
+    monkeypatch.setattr(paginas_pdf, "convert_from_path",
+                        lambda caminho, first_page, last_page, **kwargs:
+                        [Image.fromarray(pagina_aleatoria((140, 100, 3))) for _ in range(first_page, last_page + 1)])
+    entrada, saida = tmp_path / "entrada.pdf", tmp_path / "saida.pdf"
+    Image.new("RGB", (100, 140), "white").save(entrada)
+    perfil = Perfil()
+
+    process_pdf(str(entrada), str(saida), profile=perfil)
+    assert perfil.bytes == {"lidos": os.path.getsize(entrada), "gravados": os.path.getsize(saida)}
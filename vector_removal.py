@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Remoção de marcas d'água preservando o conteúdo vetorial do PDF.
+
+Em vez de rasterizar as páginas, o conteúdo de cada página é analisado e os objetos que
+formam a marca d'água (preenchimento cinza claro, transparência via ExtGState, Form XObject
+ou padrão repetido em várias páginas, artefatos marcados como /Watermark) são descartados.
+Somente páginas em que a marca está embutida em uma imagem (ex.: páginas digitalizadas, em que
+uma imagem cobre a página e nenhum objeto vetorial é reconhecido como marca) passam pelo
+caminho rasterizado de process_pdf.
+"""
+import io
+import json
+import sys
+from collections import Counter
+from hashlib import sha1
+
+from pdf2image import convert_from_path
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ContentStream, IndirectObject
+
+from watermark_remover import LOWER_GRAY, UPPER_GRAY, clean_page, default_poppler_path
+
+PATH_VECTOR = "vetorial"
+PATH_RASTER = "raster"
+PATH_UNCHANGED = "inalterada"
+
+ALPHA_LIMIT = 0.8          # Opacidade abaixo deste valor é tratada como marca d'água
+REPEAT_RATIO = 0.5         # Fração de páginas em que um objeto precisa se repetir
+IMAGE_AREA_RATIO = 0.5     # Fração da página coberta por uma imagem para considerá-la "digitalizada"
+
+PAINT_OPS = {b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*", b"S", b"s", b"sh",
+             b"Tj", b"TJ", b"'", b'"', b"Do", b"INLINE IMAGE"}
+PATH_OPS = {b"m", b"l", b"c", b"v", b"y", b"h", b"re"}
+PATH_END_OPS = {b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*", b"S", b"s", b"n"}
+OPENERS = {b"q": b"Q", b"BT": b"ET", b"BDC": b"EMC", b"BMC": b"EMC"}
+MARKED_OPS = {b"BDC", b"BMC", b"EMC", b"MP", b"DP"}
+
+
+def _resolve(obj):
+    return obj.get_object() if isinstance(obj, IndirectObject) else obj
+
+
+def _object_key(obj):
+    """Identificador estável de um objeto indireto, usado para detectar repetição entre páginas"""
+    if isinstance(obj, IndirectObject):
+        return ("obj", obj.idnum)
+    return None
+
+
+def _split_blocks(operations):
+    """
+    Agrupa as operações do conteúdo da página em blocos de nível superior:
+    pares q/Q, BT/ET, conteúdo marcado BDC/EMC, caminhos até o operador de pintura
+    e operadores isolados (mudanças de estado, Do).
+    """
+    blocks = []
+    current = []
+    closing = []
+    for operands, operator in operations:
+        current.append((operands, operator))
+        if closing:
+            if operator in OPENERS:
+                closing.append(OPENERS[operator])
+            elif operator == closing[-1]:
+                closing.pop()
+            if not closing:
+                blocks.append(current)
+                current = []
+            continue
+        if operator in OPENERS:
+            closing.append(OPENERS[operator])
+        elif operator in PATH_OPS:
+            # Construção de caminho: continua até o operador que o pinta
+            continue
+        else:
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def _closed(block):
+    """Indica se o bloco aberto por q, BT ou BDC/BMC termina com o operador que o fecha"""
+    closing = []
+    for _, operator in block:
+        if operator in OPENERS:
+            closing.append(OPENERS[operator])
+        elif closing and operator == closing[-1]:
+            closing.pop()
+    return not closing
+
+
+def _drop_block(block):
+    """
+    Descarta a parte visível de um bloco. Blocos entre q/Q são removidos por completo; nos
+    demais, as mudanças de estado (cor, fonte, ExtGState) são mantidas, pois continuam
+    valendo para o conteúdo seguinte.
+    """
+    if block[0][1] == b"q" and _closed(block):
+        return []
+    skipped = PAINT_OPS | PATH_OPS | PATH_END_OPS | MARKED_OPS
+    return [(operands, operator) for operands, operator in block if operator not in skipped]
+
+
+def _is_light_gray(components, lower_gray, upper_gray):
+    """Verifica se a cor de preenchimento (g, rg ou k) é um cinza dentro da faixa da marca d'água"""
+    try:
+        values = [float(c) for c in components]
+    except (TypeError, ValueError):
+        return False
+    if len(values) == 1:
+        level = values[0]
+    elif len(values) == 3:
+        if max(values) - min(values) > 0.04:
+            return False
+        level = sum(values) / 3
+    elif len(values) == 4:
+        c, m, y, k = values
+        if max(c, m, y) > 0.04:
+            return False
+        level = 1 - k
+    else:
+        return False
+    return lower_gray <= level * 255 <= upper_gray
+
+
+def _is_watermark_artifact(operands, resources):
+    """Verifica se o BDC abre um artefato marcado como /Watermark"""
+    if len(operands) != 2 or operands[0] != "/Artifact":
+        return False
+    props = operands[1]
+    if isinstance(props, str):
+        props = _resolve(_resolve(resources.get("/Properties") or {}).get(props)) or {}
+    props = _resolve(props) or {}
+    return "/Watermark" in (props.get("/Subtype"), props.get("/Type"))
+
+
+class _GraphicsState:
+    """Parte do estado gráfico que decide se o que é pintado parece marca d'água"""
+
+    def __init__(self):
+        self.fill = [0.0]
+        self.stroke = [0.0]
+        self.low_alpha = False
+        self.matrix = (1.0, 0.0, 0.0, 1.0)
+
+    def copy(self):
+        state = _GraphicsState()
+        state.restore(self)
+        return state
+
+    def restore(self, other):
+        self.__dict__.update(other.__dict__)
+
+    def concat(self, operands):
+        """Aplica o cm à matriz atual (só a parte linear, que define área e rotação)"""
+        a1, b1, c1, d1 = (float(v) for v in operands[:4])
+        a0, b0, c0, d0 = self.matrix
+        self.matrix = (a1 * a0 + b1 * c0, a1 * b0 + b1 * d0, c1 * a0 + d1 * c0, c1 * b0 + d1 * d0)
+
+    @property
+    def rotated(self):
+        return abs(self.matrix[1]) > 1e-3 or abs(self.matrix[2]) > 1e-3
+
+
+class _BlockFeatures:
+    """Características de um bloco de conteúdo relevantes para identificar a marca d'água"""
+
+    def __init__(self):
+        self.marks = []  # (cor, transparente) de cada pintura; imagens e sombreamentos não têm cor
+        self.rotated = False
+        self.artifact = False
+        self.images = []
+        self.signature = sha1()
+
+    def paint(self, color, state):
+        self.marks.append((color, state.low_alpha))
+        if state.rotated:
+            self.rotated = True
+
+    @property
+    def paints(self):
+        return bool(self.marks)
+
+    @property
+    def low_alpha(self):
+        return self.paints and all(low_alpha for _, low_alpha in self.marks)
+
+    def light_gray(self, lower_gray, upper_gray):
+        return self.paints and all(color is not None and _is_light_gray(color, lower_gray, upper_gray)
+                                   for color, _ in self.marks)
+
+
+FILL_OPS = {b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*", b"Tj", b"TJ", b"'", b'"'}
+STROKE_OPS = {b"S", b"s", b"B", b"B*", b"b", b"b*"}
+
+
+def _color(operands):
+    numbers = [o for o in operands if not isinstance(o, str)]
+    return numbers if numbers and len(numbers) == len(operands) else None
+
+
+def _analyze(pdf, operations, resources, features, state, depth=0):
+    """
+    Percorre as operações (e Form XObjects referenciados) acumulando as características do bloco.
+    Cada pintura é registrada com a cor e a transparência em vigor, herdadas dos blocos externos.
+    """
+    resources = _resolve(resources) or {}
+    ext_gstates = _resolve(resources.get("/ExtGState")) or {}
+    xobjects = _resolve(resources.get("/XObject")) or {}
+    saved = []
+
+    for operands, operator in operations:
+        if operator == b"INLINE IMAGE":
+            features.paint(None, state)
+            features.images.append(state.matrix)
+            features.signature.update(b"BI")
+            continue
+
+        features.signature.update(operator)
+        for operand in operands:
+            features.signature.update(repr(operand).encode("utf-8", "replace"))
+
+        if operator in FILL_OPS:
+            features.paint(state.fill, state)
+        if operator in STROKE_OPS:
+            features.paint(state.stroke, state)
+        if operator == b"sh":
+            features.paint(None, state)
+        elif operator == b"q":
+            saved.append(state.copy())
+        elif operator == b"Q":
+            if saved:
+                state.restore(saved.pop())
+        elif operator in (b"g", b"rg", b"k", b"sc", b"scn"):
+            state.fill = _color(operands)
+        elif operator in (b"G", b"RG", b"K", b"SC", b"SCN"):
+            state.stroke = _color(operands)
+        elif operator == b"gs" and operands:
+            ext_state = _resolve(ext_gstates.get(operands[0])) or {}
+            alphas = [float(ext_state[key]) for key in ("/ca", "/CA") if key in ext_state]
+            if alphas:
+                state.low_alpha = any(alpha < ALPHA_LIMIT for alpha in alphas)
+        elif operator == b"cm" and len(operands) == 6:
+            state.concat(operands)
+        elif operator == b"Tm" and len(operands) == 6:
+            if abs(float(operands[1])) > 1e-3 or abs(float(operands[2])) > 1e-3:
+                features.rotated = True
+        elif operator == b"BDC" and _is_watermark_artifact(operands, resources):
+            features.artifact = True
+        elif operator == b"Do" and operands:
+            ref = xobjects.get(operands[0])
+            key = _object_key(ref)
+            if key is not None:
+                features.signature.update(repr(key).encode())
+            xobject = _resolve(ref)
+            if xobject is None:
+                continue
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                features.paint(None, state)
+                features.images.append(state.matrix)
+            elif subtype == "/Form" and depth < 4:
+                form = ContentStream(xobject, pdf)
+                _analyze(pdf, form.operations, xobject.get("/Resources", resources), features,
+                         state.copy(), depth + 1)
+
+
+def _image_covers_page(features, page_area):
+    """Indica se alguma imagem desenhada no bloco cobre boa parte da página"""
+    for a, b, c, d in features.images:
+        if abs(a * d - b * c) >= IMAGE_AREA_RATIO * page_area:
+            return True
+    return False
+
+
+class _Leaf:
+    """Bloco classificado como um todo: removido inteiro ou mantido"""
+
+    def __init__(self, operations):
+        self.operations = operations
+        self.features = _BlockFeatures()
+        self.drop = False
+
+
+class _Group:
+    """Bloco q/Q ou BDC/EMC que contém outros blocos; só os blocos internos são classificados"""
+
+    def __init__(self, opener, children, closer):
+        self.opener = opener
+        self.children = children
+        self.closer = closer
+
+
+def _splittable(block, resources):
+    """
+    Indica se o bloco deve ser dividido: q/Q ou conteúdo marcado com outros blocos q/Q ou
+    marcados dentro. Uma página inteira costuma vir envolvida por um q/Q externo, e classificá-lo
+    como um todo misturaria a marca com o texto. Artefatos /Watermark são removidos inteiros.
+    """
+    operands, opener = block[0]
+    if opener not in (b"q", b"BDC", b"BMC") or len(block) < 3:
+        return False
+    if opener == b"BDC" and _is_watermark_artifact(operands, resources):
+        return False
+    return any(operator in (b"q", b"BDC", b"BMC") for _, operator in block[1:])
+
+
+def _build(pdf, operations, resources, state, leaves):
+    """
+    Divide as operações em blocos, descendo nos q/Q aninhados até os blocos mais internos.
+    Cada bloco folha é analisado com o estado gráfico herdado e acrescentado a leaves.
+    """
+    nodes = []
+    for block in _split_blocks(operations):
+        if not _splittable(block, resources):
+            leaf = _Leaf(block)
+            _analyze(pdf, block, resources, leaf.features, state)
+            leaves.append(leaf)
+            nodes.append(leaf)
+            continue
+        closed = _closed(block)
+        end = len(block) - 1 if closed else len(block)
+        saved = state.copy()
+        children = _build(pdf, block[1:end], resources, state, leaves)
+        if closed and block[0][1] == b"q":
+            state.restore(saved)
+        nodes.append(_Group(block[0], children, block[end:]))
+    return nodes
+
+
+def _flatten(nodes):
+    """Remonta as operações da página, descartando a parte visível das folhas marcadas"""
+    operations = []
+    for node in nodes:
+        if isinstance(node, _Group):
+            operations.append(node.opener)
+            operations.extend(_flatten(node.children))
+            operations.extend(node.closer)
+        elif node.drop:
+            operations.extend(_drop_block(node.operations))
+        else:
+            operations.extend(node.operations)
+    return operations
+
+
+def _analyze_page(pdf, page):
+    """
+    Divide o conteúdo da página em blocos e calcula as características de cada um
+    :return: (árvore de blocos, lista das folhas na ordem do conteúdo)
+    """
+    contents = page.get_contents()
+    if contents is None:
+        return [], []
+    leaves = []
+    nodes = _build(pdf, contents.operations, page.get("/Resources") or {}, _GraphicsState(), leaves)
+    return nodes, leaves
+
+
+def _render_raster_page(pdf_path, page_number, dpi, poppler_path, lower_gray, upper_gray):
+    """Caminho rasterizado para uma única página: renderiza, limpa e devolve como página PDF"""
+    image = convert_from_path(pdf_path, dpi=dpi, first_page=page_number,
+                              last_page=page_number, poppler_path=poppler_path)[0]
+    buffer = io.BytesIO()
+    clean_page(image, lower_gray, upper_gray).save(buffer, format="PDF", resolution=dpi)
+    return PdfReader(buffer).pages[0]
+
+
+def process_pdf_vector(pdf_path, output_pdf, dpi=300, poppler_path=None,
+                       lower_gray=LOWER_GRAY, upper_gray=UPPER_GRAY):
+    """
+    Remove a marca d'água editando o conteúdo das páginas, sem rasterizar o documento.
+    Páginas cuja marca está embutida em uma imagem seguem pelo caminho rasterizado.
+    :return: Lista com o caminho seguido por cada página e quantos objetos foram removidos
+    """
+    if poppler_path is None:
+        poppler_path = default_poppler_path()
+    reader = PdfReader(pdf_path)
+    analyzed = [_analyze_page(reader, page) for page in reader.pages]
+
+    # Objetos que se repetem em várias páginas (mesmo conteúdo ou mesmo XObject) são candidatos
+    repeats = Counter()
+    for _, leaves in analyzed:
+        repeats.update({leaf.features.signature.digest() for leaf in leaves if leaf.features.paints})
+    min_repeats = max(2, int(len(reader.pages) * REPEAT_RATIO))
+
+    writer = PdfWriter()
+    report = []
+    for index, (page, (nodes, leaves)) in enumerate(zip(reader.pages, analyzed)):
+        page_area = float(page.mediabox.width) * float(page.mediabox.height)
+        removed = 0
+        covering_image = False
+        for leaf in leaves:
+            block_features = leaf.features
+            if block_features.paints and _image_covers_page(block_features, page_area):
+                covering_image = True
+            suspicious = block_features.low_alpha or block_features.light_gray(lower_gray, upper_gray)
+            repeated = repeats[block_features.signature.digest()] >= min_repeats
+            leaf.drop = block_features.paints and (
+                block_features.artifact or
+                (suspicious and (repeated or block_features.rotated or
+                                 (block_features.low_alpha and block_features.light_gray(lower_gray, upper_gray))))
+            )
+            removed += leaf.drop
+
+        # Uma imagem de página inteira só indica marca embutida nela (página digitalizada) quando
+        # nenhum objeto vetorial foi reconhecido como marca; senão, a imagem é só o fundo da página
+        if covering_image and not removed:
+            writer.add_page(_render_raster_page(pdf_path, index + 1, dpi, poppler_path,
+                                                lower_gray, upper_gray))
+            report.append({"pagina": index + 1, "caminho": PATH_RASTER, "objetos_removidos": removed})
+            continue
+
+        new_page = writer.add_page(page)
+        if removed:
+            content = ContentStream(None, reader)
+            content.operations = _flatten(nodes)
+            new_page.replace_contents(content)
+        report.append({"pagina": index + 1,
+                       "caminho": PATH_VECTOR if removed else PATH_UNCHANGED,
+                       "objetos_removidos": removed})
+
+    with open(output_pdf, "wb") as f:
+        writer.write(f)
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Uso: python vector_removal.py arquivo_entrada.pdf arquivo_saida.pdf")
+        sys.exit(1)
+    print(json.dumps(process_pdf_vector(sys.argv[1], sys.argv[2]), indent=2, ensure_ascii=False))
@@ -0,0 +1,210 @@
+import os
+import sys
+from functools import lru_cache, partial
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from bovigenese.paginas_pdf import ProcessamentoCancelado, processar_paginas_pdf
+
+# Exceção levantada quando o cancelamento é pedido durante o processamento
+ProcessingCancelled = ProcessamentoCancelado
+
+LOWER_GRAY = 180  # Valor mínimo para detecção de cinza (ajuste se necessário)
+UPPER_GRAY = 250  # Valor máximo para detecção de cinza (ajuste se necessário)
+DEFAULT_DPI = 300
+# Versão do kernel de limpeza; altere quando o resultado da limpeza mudar para invalidar o cache de páginas
+KERNEL_VERSION = 2
+# Abaixo desta fração da densidade de cinza esperada, a página não tem a marca na região e é limpa inteira
+REGION_MIN_DENSITY = 0.5
+
+class PDFProcessingError(Exception):
+    """Falha ao remover a marca d'água de um PDF (conversão, limpeza ou gravação)."""
+
+def default_poppler_path():
+    """
+    Caminho do poppler incluído junto ao programa no Windows (None usa o PATH do sistema).
+    Em um executável gerado pelo PyInstaller, usa sys._MEIPASS para localizar os arquivos adicionados.
+    """
+    if os.name != 'nt':
+        return None
+    base_path = getattr(sys, '_MEIPASS', os.path.abspath("."))
+    return os.path.join(base_path, "poppler", "bin")
+
+@lru_cache(maxsize=32)
+def _gray_luts(lower_gray, upper_gray):
+    """
+    Tabelas de consulta usadas pelo kernel de limpeza:
+    - máscara: 1 para tons dentro da faixa de cinza, 0 fora dela
+    - limpeza: tons dentro da faixa viram branco, os demais são mantidos
+    """
+    levels = np.arange(256, dtype=np.uint8)
+    in_band = (levels >= lower_gray) & (levels <= upper_gray)
+    mask_lut = in_band.astype(np.uint8)
+    clean_lut = np.where(in_band, 255, levels).astype(np.uint8)
+    return mask_lut, clean_lut
+
+def _clean_inplace(image, to_gray, lower_gray, upper_gray):
+    """
+    Remove a marca d'água diretamente no buffer da imagem, sem cópias intermediárias.
+    A única alocação é a imagem de luminância, que é reaproveitada como máscara.
+    """
+    mask_lut, clean_lut = _gray_luts(lower_gray, upper_gray)
+    if image.ndim == 2:
+        # Página já em escala de cinza: uma única passada pela tabela, sem alocações
+        cv2.LUT(image, clean_lut, dst=image)
+        return image
+    gray = cv2.cvtColor(image, to_gray)
+    cv2.LUT(gray, mask_lut, dst=gray)
+    np.copyto(image, 255, where=gray.view(np.bool_)[:, :, None])
+    return image
+
+def remove_gray_watermark(image, lower_gray=LOWER_GRAY, upper_gray=UPPER_GRAY):
+    """
+    Remove marcas d'água cinzentas substituindo por branco puro.
+    Converte a imagem (BGR) para escala de cinza, cria uma máscara para tons de cinza
+    e substitui as áreas detectadas por branco. A imagem é alterada no próprio buffer.
+    """
+    return _clean_inplace(image, cv2.COLOR_BGR2GRAY, lower_gray, upper_gray)
+
+def remove_gray_watermark_rgb(image, lower_gray=LOWER_GRAY, upper_gray=UPPER_GRAY):
+    """
+    Mesma limpeza de remove_gray_watermark, mas para o buffer RGB (ou em escala de cinza)
+    vindo direto do PIL, evitando as conversões RGB->BGR->RGB. O resultado é idêntico, byte a byte.
+    """
+    return _clean_inplace(image, cv2.COLOR_RGB2GRAY, lower_gray, upper_gray)
+
+def _watermark_mask(pixels, lower_gray, upper_gray):
+    """
+    Máscara (0 ou 255) dos pixels dentro da faixa de cinza, com a mesma luminância de
+    remove_gray_watermark_rgb, para que o resultado seja idêntico byte a byte
+    """
+    mask_lut, _ = _gray_luts(lower_gray, upper_gray)
+    gray = pixels if pixels.ndim == 2 else cv2.cvtColor(np.ascontiguousarray(pixels), cv2.COLOR_RGB2GRAY)
+    return cv2.LUT(gray, mask_lut * 255)
+
+def _region_box(pixels, region, lower_gray, upper_gray):
+    """
+    Região da marca d'água (calibration.locate_region) convertida para os pixels desta resolução,
+    como (x0, y0, x1, y1). Retorna None se a região estiver vazia ou se a densidade de cinza nela
+    ficar abaixo de REGION_MIN_DENSITY da esperada (a página não segue o padrão das amostras).
+    """
+    height, width = pixels.shape[:2]
+    x0, y0, x1, y1 = region["box"]
+    box = (int(x0 * width), int(y0 * height), min(width, int(np.ceil(x1 * width))),
+           min(height, int(np.ceil(y1 * height))))
+    area = pixels[box[1]:box[3], box[0]:box[2]]
+    if area.size == 0:
+        return None
+
+    # A verificação usa uma amostra de 1 a cada 4 pixels em cada direção
+    sample = area[::4, ::4]
+    if sample.ndim == 3:
+        sample = cv2.cvtColor(np.ascontiguousarray(sample), cv2.COLOR_RGB2GRAY)
+    density = np.count_nonzero((sample >= lower_gray) & (sample <= upper_gray)) / sample.size
+    if density < REGION_MIN_DENSITY * region["density"]:
+        return None
+    return box
+
+def clean_page(image, lower_gray=LOWER_GRAY, upper_gray=UPPER_GRAY, region=None):
+    """
+    Remove a marca d'água de uma página renderizada (PIL), pintando de branco no próprio buffer
+    da imagem, e retorna a mesma imagem. A única cópia da página é a leitura dos pixels para
+    calcular a máscara.
+    :param region: Região da marca d'água detectada na calibração; quando informada, só ela é limpa
+                   (com a página inteira como alternativa se a página não tiver a marca ali)
+    """
+    pixels = np.asarray(image)
+    box = _region_box(pixels, region, lower_gray, upper_gray) if region is not None else None
+    if box is not None:
+        pixels = pixels[box[1]:box[3], box[0]:box[2]]
+    mask = _watermark_mask(pixels, lower_gray, upper_gray)
+    image.paste("white", box[:2] if box is not None else (0, 0), Image.fromarray(mask))
+    return image
+
+def clean_page_banded(image, page_number, bands, lower_gray=LOWER_GRAY, upper_gray=UPPER_GRAY, region=None):
+    """
+    Como clean_page, mas usando a faixa de cinza calibrada para a página, quando houver.
+    :param bands: {número da página: (lower_gray, upper_gray)}
+    """
+    lower_gray, upper_gray = bands.get(page_number, (lower_gray, upper_gray))
+    return clean_page(image, lower_gray, upper_gray, region)
+
+def process_pdf(pdf_path, output_pdf, dpi=DEFAULT_DPI, lower_gray=LOWER_GRAY, upper_gray=UPPER_GRAY,
+                workers=1, grayscale=False, encoding="original", jpeg_quality=75, poppler_path=None,
+                progress=None, cancel_event=None, calibration=None, cache=None, profile=None,
+                first_page=None, last_page=None, job_dir=None):
+    """
+    Converte um PDF em imagens com 300 DPI, processa cada página para remover marcas d'água e
+    gera um novo PDF com as páginas processadas.
+    As páginas são renderizadas e gravadas em fluxo, então o consumo de memória não cresce
+    com o número de páginas.
+    :param dpi: Resolução da renderização das páginas
+    :param lower_gray, upper_gray: Faixa de tons de cinza tratada como marca d'água
+    :param workers: Processos usados para renderizar e limpar páginas em paralelo
+                    (1 = sequencial, None = todos os núcleos)
+    :param grayscale: Renderiza as páginas em escala de cinza (documentos monocromáticos),
+                      o que reduz a memória por página e dispensa a conversão de cores
+    :param encoding: Codificação das páginas de saída: "original", "auto" (escolhe por página),
+                     "binaria" (1 bit, G4), "cinza" ou "jpeg"
+    :param jpeg_quality: Qualidade JPEG das páginas em cinza ou coloridas
+    :param poppler_path: Pasta dos binários do poppler (None usa o poppler incluído no Windows)
+    :param progress: Função chamada como progress(paginas_gravadas, total) após cada página
+    :param cancel_event: threading.Event que interrompe o processamento quando sinalizado
+    :param calibration: Resultado de calibration.calibrate/load_or_calibrate; substitui
+                        lower_gray/upper_gray pela faixa detectada (por página, se houver) e,
+                        se a região da marca foi localizada, limita a limpeza a ela
+    :param cache: bovigenese.cache_paginas.CachePaginas; reaproveita páginas já renderizadas e limpas
+                  (mudar só a codificação, ou repetir o job, não chama o poppler de novo)
+    :param profile: bovigenese.instrumentacao.Perfil; recebe o tempo de renderização, limpeza e
+                    gravação de cada página e os bytes lidos e gravados
+    :param first_page, last_page: Intervalo de páginas (base 1, inclusivo) renderizado e gravado
+                                  na saída; o padrão é o documento inteiro
+    :param job_dir: Pasta de checkpoints por página; repetir o job com a mesma pasta e os mesmos
+                    parâmetros processa só as páginas que faltam (bovigenese.trabalho_pdf, que
+                    também junta pastas de intervalos processados em máquinas diferentes)
+    :return: Relatório com a codificação e o tamanho de cada página gravada
+    :raises PDFProcessingError: Se o PDF não puder ser convertido, limpo ou gravado
+    :raises ProcessingCancelled: Se cancel_event for sinalizado (a saída parcial é removida;
+                                 as páginas já gravadas em job_dir são mantidas)
+    """
+    if poppler_path is None:
+        poppler_path = default_poppler_path()
+
+    bands = {}
+    region = None
+    if calibration is not None:
+        lower_gray, upper_gray = calibration["lower_gray"], calibration["upper_gray"]
+        bands = {page["page"]: (page["lower_gray"], page["upper_gray"])
+                 for page in calibration.get("pages", []) if page["detected"]}
+        region = calibration.get("region")
+    if bands:
+        clean = partial(clean_page_banded, bands=bands, lower_gray=lower_gray, upper_gray=upper_gray,
+                        region=region)
+    else:
+        clean = partial(clean_page, lower_gray=lower_gray, upper_gray=upper_gray, region=region)
+
+    processing_key = ("remove_gray_watermark", KERNEL_VERSION, lower_gray, upper_gray, sorted(bands.items()))
+    if region is not None:
+        processing_key += (tuple(region["box"]), region["density"])
+
+    report = []
+    try:
+        # Renderiza, limpa e grava uma página por vez
+        processar_paginas_pdf(pdf_path, output_pdf, clean,
+                              dpi=dpi, poppler_path=poppler_path, workers=workers,
+                              grayscale=grayscale, codificacao=encoding,
+                              qualidade=jpeg_quality, relatorio=report,
+                              progresso=progress, cancelar=cancel_event,
+                              com_numero=bool(bands), cache=cache,
+                              chave_processamento=processing_key, perfil=profile,
+                              primeira_pagina=first_page, ultima_pagina=last_page,
+                              diretorio_trabalho=job_dir)
+    except ProcessingCancelled:
+        raise
+    except Exception as e:
+        raise PDFProcessingError(f"Erro ao processar o PDF {pdf_path}: {e}") from e
+    if profile is not None:
+        profile.contar_arquivos(pdf_path, output_pdf)
+    return report